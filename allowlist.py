@@ -0,0 +1,266 @@
+import os
+import re
+import mmap
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات القائمة المسموحة ==============
+
+ALLOWLIST_FILE = os.getenv('ALLOWLIST_FILE', '')
+# memory: مجموعة مفهرسة في الذاكرة | mmap: ملف مرتب مع بحث ثنائي للقوائم الكبيرة جداً
+ALLOWLIST_MODE = os.getenv('ALLOWLIST_MODE', 'memory')
+# عند التعطيل يُسجَّل الرقم غير الموجود فقط ويُسمح له (السلوك الحالي للتجربة)
+ALLOWLIST_ENFORCE = os.getenv('ALLOWLIST_ENFORCE', '').lower() in ('1', 'true', 'yes')
+ALLOWLIST_CHECK_INTERVAL = float(os.getenv('ALLOWLIST_CHECK_INTERVAL', 5.0))
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '966')
+
+# أقصر لاحقة تُقبل في مطابقة اللاحقة (أرقام E.164 لا تقل عن 7 أرقام بعد رمز الدولة)
+MIN_SUFFIX_DIGITS = 7
+MAX_E164_DIGITS = 15
+
+_NON_DIGITS = re.compile(r'[^\d]')
+
+
+def canonicalize(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """تحويل الرقم إلى صيغة E.164 (+ ثم الأرقام)، أو '' إذا لم يكن رقماً صالحاً"""
+    phone = phone.strip()
+    if phone.startswith('whatsapp:'):
+        phone = phone[len('whatsapp:'):]
+
+    international = phone.startswith('+')
+    digits = _NON_DIGITS.sub('', phone)
+    if not digits:
+        return ''
+
+    if not international:
+        if digits.startswith('00'):
+            # بادئة الاتصال الدولي
+            digits = digits[2:]
+        elif digits.startswith('0') and country_code:
+            # رقم محلي: استبدال الصفر برمز الدولة الافتراضي
+            digits = country_code + digits[1:]
+
+    return '+' + digits
+
+
+# ============== الفهرس في الذاكرة ==============
+
+class MemoryIndex:
+    """مجموعة مجزأة للمطابقة التامة + فهرس أرقام معكوسة لمطابقة اللاحقة"""
+
+    def __init__(self, numbers):
+        self._exact = set()
+        self._reversed = set()
+        lengths = set()
+        for number in numbers:
+            self._exact.add(number)
+            digits = number[1:]
+            if len(digits) >= MIN_SUFFIX_DIGITS:
+                self._reversed.add(digits[::-1])
+                lengths.add(len(digits))
+        # الأطوال مرتبة تنازلياً ليفحص البحث عدداً محدوداً من البادئات
+        self._lengths = sorted(lengths, reverse=True)
+
+    def __len__(self):
+        return len(self._exact)
+
+    def contains(self, number):
+        if number in self._exact:
+            return True
+        # الرقم ينتهي بأحد الأرقام المسموحة ⇔ معكوسه يبدأ بمعكوس ذلك الرقم
+        rev = number[1:][::-1]
+        for length in self._lengths:
+            if length <= len(rev) and rev[:length] in self._reversed:
+                return True
+        return False
+
+
+# ============== الفهرس المرتب على القرص (mmap) ==============
+
+RECORD_WIDTH = MAX_E164_DIGITS + 1   # الأرقام محشوة بمسافات + سطر جديد
+
+
+def _record(digits):
+    return digits.ljust(MAX_E164_DIGITS).encode('ascii') + b'\n'
+
+
+def compile_sorted(numbers, path):
+    """كتابة ملفين مرتبين بسجلات ثابتة العرض: الأرقام ومعكوساتها"""
+    digits = sorted({n[1:] for n in numbers if 0 < len(n) - 1 <= MAX_E164_DIGITS})
+    reversed_digits = sorted(d[::-1] for d in digits if len(d) >= MIN_SUFFIX_DIGITS)
+    for target, values in ((path + '.sorted', digits), (path + '.rsorted', reversed_digits)):
+        # ملف مؤقت لكل عملية: العمّال يعيدون الترجمة معاً عند تغيّر القائمة
+        tmp = f'{target}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                for value in values:
+                    f.write(_record(value))
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+class SortedFile:
+    """بحث ثنائي داخل ملف سجلات ثابتة العرض عبر mmap (بدون تحميله في الذاكرة)"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self.count = size // RECORD_WIDTH
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __contains__(self, digits):
+        if not self._map or len(digits) > MAX_E164_DIGITS:
+            return False
+        key = _record(digits)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = mid * RECORD_WIDTH
+            current = self._map[offset:offset + RECORD_WIDTH]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+
+class MmapIndex:
+    """نفس واجهة MemoryIndex لكن فوق ملفات مرتبة ومربوطة بالذاكرة"""
+
+    def __init__(self, path):
+        self._exact = SortedFile(path + '.sorted')
+        self._reversed = SortedFile(path + '.rsorted')
+
+    def __len__(self):
+        return self._exact.count
+
+    def contains(self, number):
+        digits = number[1:]
+        if digits in self._exact:
+            return True
+        rev = digits[::-1]
+        for length in range(min(len(rev), MAX_E164_DIGITS), MIN_SUFFIX_DIGITS - 1, -1):
+            if rev[:length] in self._reversed:
+                return True
+        return False
+
+    def close(self):
+        self._exact.close()
+        self._reversed.close()
+
+
+# ============== القائمة المسموحة ==============
+
+def read_numbers(path):
+    """قراءة ملف الأرقام: رقم في كل سطر، والأسطر التي تبدأ بـ # تعليقات"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                number = canonicalize(line)
+                if number:
+                    yield number
+
+
+class Allowlist:
+    """القائمة المسموحة: فهرس قابل لإعادة التحميل من ملف بدون إعادة تشغيل"""
+
+    def __init__(self, numbers=(), path=ALLOWLIST_FILE, mode=ALLOWLIST_MODE,
+                 enforce=ALLOWLIST_ENFORCE, check_interval=ALLOWLIST_CHECK_INTERVAL):
+        if mode not in ('memory', 'mmap'):
+            raise ValueError(f"وضع القائمة المسموحة غير معروف: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.enforce = enforce
+        self.check_interval = check_interval
+        self._seed = [canonicalize(n) for n in numbers]
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._mtime = None
+        self.loaded_at = None
+        self.lookups = 0
+        self.hits = 0
+        self._index = MemoryIndex(self._seed)
+        if path:
+            self.reload()
+        else:
+            self.loaded_at = datetime.now().isoformat()
+
+    def _build(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if self.mode == 'mmap':
+            compile_sorted(list(read_numbers(self.path)) + self._seed, self.path)
+            return MmapIndex(self.path), mtime
+        return MemoryIndex(list(read_numbers(self.path)) + self._seed), mtime
+
+    def reload(self):
+        """بناء فهرس جديد ثم استبداله بإسناد واحد"""
+        if not self.path or not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            index, mtime = self._build()
+            # الفهرس القديم يُغلق تلقائياً عند انتهاء آخر طلب يستخدمه
+            self._index = index
+            self._mtime = mtime
+            self.loaded_at = datetime.now().isoformat()
+            logger.info("🔄 تم تحميل القائمة المسموحة من %s (%s رقم)", self.path, len(index))
+            return True
+        except Exception as e:
+            logger.error("❌ خطأ في تحميل القائمة المسموحة من %s: %s", self.path, e)
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def contains(self, phone):
+        """هل الرقم (بأي صيغة) موجود في القائمة أو ينتهي برقم منها؟"""
+        if self.path:
+            self._maybe_reload()
+        number = canonicalize(phone)
+        self.lookups += 1
+        if number and self._index.contains(number):
+            self.hits += 1
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._index)
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'source': self.path or 'ALLOWED_NUMBERS',
+            'size': len(self._index),
+            'enforce': self.enforce,
+            'loaded_at': self.loaded_at,
+            'lookups': self.lookups,
+            'hits': self.hits,
+        }
@@ -1,13 +1,39 @@
-from flask import Flask, request, jsonify
-from twilio.twiml.messaging_response import MessagingResponse
+# قبل أي استيراد آخر: بداية قياس زمن الإقلاع
+from readiness import readiness
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 import os
+import re
+import time
+import atexit
 import logging
 from datetime import datetime
-import json
+from functools import partial
+from html import escape
+from itertools import islice
 
-# إعداد التسجيل
-logging.basicConfig(level=logging.INFO)
+from log_pipeline import setup_logging, count_dropped_logs, MESSAGE_LOGGER
+from message_archive import ARCHIVE_DIR, archive, message_store, read_day_reverse, day_exists
+from sqlite_store import parse_cursor
+from rules import registry
+from tenants import TenantUnavailable, create_tenant_router
+from allowlist import Allowlist, read_numbers
+from static_pages import pages, NOT_FOUND_BODY, INTERNAL_ERROR_BODY, JSON_CONTENT_TYPE
+from twiml import TWIML_CONTENT_TYPE, EMPTY_RESPONSE, twiml_cache
+from async_reply import create_reply_dispatcher
+from dedup import PENDING, create_dedup_cache
+from simulate_batch import NDJSON_CONTENT_TYPE, parse_workers, stream_batch
+from rate_limit import create_rate_limiter
+from log_compaction import start_scheduler as start_compaction_scheduler
+from profiler import profiler, check_token, ADMIN_TOKEN, ADMIN_TOKEN_HEADER, DEBUG_HEADER
+from live_stats import live_stats
+from broadcast import JobBusy, allowlist_numbers, broadcasts
+from metrics import REGISTRY as metrics_registry, PROMETHEUS_CONTENT_TYPE, Counter, Histogram
+
+# إعداد التسجيل: طابور + خيط كتابة خلفي، وأسطر كل رسالة تخضع لـ LOG_SAMPLE_RATE
+setup_logging()
 logger = logging.getLogger(__name__)
+message_logger = logging.getLogger(MESSAGE_LOGGER)
+readiness.mark('imports')
 
 app = Flask(__name__)
 
@@ -17,372 +43,601 @@ ALLOWED_NUMBERS = [
     '+966500000000',  # يمكنك إضافة أرقام أخرى
 ]
 
-# ============== دوال المساعدة ==============
+# القائمة المفهرسة (تُحمّل أيضاً من ALLOWLIST_FILE إن وُجد)
+allowlist = Allowlist(ALLOWED_NUMBERS)
 
-def is_allowed_number(phone):
-    """التحقق إذا كان الرقم مسموحاً"""
-    # تنظيف الرقم
-    if phone.startswith('whatsapp:'):
-        phone = phone.replace('whatsapp:', '')
-    
-    # التحقق من القائمة
-    for allowed in ALLOWED_NUMBERS:
-        if phone == allowed or phone.endswith(allowed.replace('+', '')):
-            return True
-    
-    logger.info(f"📞 رقم جديد: {phone} (غير موجود في القائمة المسموحة)")
-    return True  # إرجاع True للسماح بجميع الأرقام للتجربة
+# ذاكرة MessageSid لتجاهل إعادة محاولات Twilio
+dedup_cache = create_dedup_cache()
 
-def process_message(message):
-    """معالجة الرسالة وإعداد الرد"""
-    message_lower = message.lower().strip()
-    
-    # قائمة الأوامر والردود
-    responses = {
-        'مرحبا': 'أهلاً وسهلاً! 🌹\nكيف يمكنني مساعدتك اليوم؟',
-        'السلام عليكم': 'وعليكم السلام ورحمة الله وبركاته 🌺',
-        'اهلا': 'أهلاً بك! 😊',
-        'hello': 'Hello! 👋\nHow can I help you today?',
-        'hi': 'Hi there! 😊',
-        
-        # الأوامر العربية
-        'مساعده': '''🆘 *قائمة الأوامر المتاحة:*
-        
-• "مرحبا" - للترحيب
-• "مساعدة" - لعرض هذه القائمة
-• "حالة" - لعرض حالة النظام
-• "معلومات" - معلومات عن الخدمة
-• "وقت" - الوقت والتاريخ الحالي
-• "شكرا" - لإنهاء المحادثة
-
-*للتواصل المباشر:*
-📞 0500000000
-✉️ info@example.com''',
-        
-        'مساعدة': '''🆘 *قائمة الأوامر المتاحة:*
-        
-• "مرحبا" - للترحيب  
-• "مساعدة" - لعرض هذه القائمة
-• "حالة" - لعرض حالة النظام
-• "معلومات" - معلومات عن الخدمة
-• "وقت" - الوقت والتاريخ الحالي
-• "شكرا" - لإنهاء المحادثة
-
-*للتواصل المباشر:*
-📞 0500000000
-✉️ info@example.com''',
-        
-        'حالة': '✅ *حالة النظام:*\n\n🟢 الخدمة تعمل بشكل طبيعي\n📊 جميع الأنظمة نشطة\n🕒 آخر تحديث: ' + datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        
-        'معلومات': '''🤖 *معلومات النظام:*
-        
-- الاسم: WhatsApp Auto-Reply Bot
-- الإصدار: 2.0
-- المطور: فريق الدعم الفني
-- الوظيفة: الرد التلقائي على الرسائل
-- اللغة: العربية والإنجليزية
+# توجيه المستأجرين حسب رقم To (None بدون TENANTS_FILE: رقم واحد وقواعد عامة)
+tenants = create_tenant_router()
 
-📅 تم التحديث: 2024''',
-        
-        'وقت': '🕒 *التاريخ والوقت الحالي:*\n' + datetime.now().strftime("%Y-%m-%d %I:%M:%S %p"),
-        
-        'تاريخ': '📅 *التاريخ الهجري والميلادي:*\n' + datetime.now().strftime("%Y/%m/%d - %A"),
-        
-        'شكرا': 'العفو! 😊\nشكراً لتواصلك معنا.\nنتمنى لك يوماً سعيداً! 🌟',
-        
-        'شكر': 'العفو! 🌹\nلا تتردد في التواصل معنا لأي استفسار.',
-        
-        # الأوامر الإنجليزية
-        'help': '''🆘 *Available Commands:*
-        
-• "hello" - Greeting
-• "help" - Show this menu  
-• "status" - System status
-• "info" - Service information
-• "time" - Current time and date
-• "thanks" - End conversation
-
-*Contact us:*
-📞 +966500000000
-✉️ info@example.com''',
-        
-        'status': '✅ *System Status:*\n\n🟢 Service operational\n📊 All systems active\n🕒 Last update: ' + datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        
-        'info': '''🤖 *System Information:*
-        
-- Name: WhatsApp Auto-Reply Bot
-- Version: 2.0
-- Developer: Support Team
-- Function: Auto-reply to messages
-- Language: Arabic & English
+# حدود الرسائل لكل مرسل (None إذا لم يُضبط RATE_LIMIT_PER_MINUTE أو RATE_LIMITS_FILE)
+rate_limiter = create_rate_limiter()
 
-📅 Updated: 2024''',
-        
-        'time': '🕒 *Current Date & Time:*\n' + datetime.now().strftime("%Y-%m-%d %I:%M:%S %p"),
-        
-        'thanks': 'You\'re welcome! 😊\nThank you for contacting us.\nHave a great day! 🌟',
-    }
-    
-    # البحث عن تطابق كامل
-    for keyword in responses:
-        if keyword == message_lower:
-            return responses[keyword]
-    
-    # البحث عن تطابق جزئي
-    for keyword in responses:
-        if keyword in message_lower:
-            return responses[keyword]
-    
-    # الرد الافتراضي
-    return '''📱 *مرحباً بك في نظام الرد التلقائي!*
+# ضغط السجلات دورياً داخل التطبيق إذا ضُبط COMPACTION_INTERVAL
+start_compaction_scheduler()
 
-أنا بوت ذكي يمكنني مساعدتك في:
+# الردود الاحتياطية للويب هوك
+EMPTY_MESSAGE_REPLY = "لم أستلم أي رسالة. يرجى إعادة المحاولة."
+NOT_ALLOWED_REPLY = "عذراً، هذا الرقم غير مسموح به حاليًا."
+ERROR_REPLY = "⚠️ عذراً، حدث خطأ في النظام. يرجى المحاولة لاحقاً."
+THROTTLED_REPLY = "⏳ وصلتنا رسائل كثيرة منك، يرجى الانتظار قليلاً ثم المحاولة مجدداً."
 
-📞 *الاستفسارات الفورية*
-🔄 *متابعة الطلبات*  
-🛠️ *الدعم الفني*
-🔔 *الإشعارات*
+# ============== المقاييس ==============
 
-*للحصول على المساعدة، أرسل أحد هذه الأوامر:*
-• "مساعدة" أو "help" - لعرض جميع الأوامر
-• "حالة" أو "status" - حالة النظام
-• "معلومات" أو "info" - معلومات عن الخدمة
-• "وقت" أو "time" - الوقت الحالي
+REQUESTS = Counter('whatsapp_http_requests_total', 'HTTP requests by route and status', ['route', 'status'])
+REQUEST_SECONDS = Histogram('whatsapp_http_request_seconds', 'HTTP request latency by route', ['route'])
+MESSAGES = Counter('whatsapp_messages_total', 'Processed messages by matched keyword and match type',
+                   ['keyword', 'match_type'])
+STAGE_SECONDS = Histogram('whatsapp_webhook_stage_seconds',
+                          'Webhook latency by stage (parse, allowlist, match, archive, render)', ['stage'])
+DEDUP_LOOKUPS = Counter('whatsapp_dedup_lookups_total',
+                        'MessageSid dedup lookups (hit, miss, pending: retry while the original is processing)',
+                        ['result'])
+LOG_LINES_DROPPED = Counter('whatsapp_log_lines_dropped_total',
+                            'INFO log lines dropped because the log queue was full (stdout too slow)')
+count_dropped_logs(LOG_LINES_DROPPED.inc)
 
-*للتواصل المباشر مع ممثل خدمة العملاء:*
-📞 0500000000
-🕒 من 8 صباحاً حتى 10 مساءً
+# ============== دوال المساعدة ==============
+
+def is_allowed_number(phone, numbers=None):
+    """التحقق إذا كان الرقم مسموحاً (numbers: قائمة المستأجر بدلاً من القائمة العامة)"""
+    if numbers is None:
+        numbers = allowlist
+    if numbers.contains(phone):
+        return True
+    
+    message_logger.info("📞 رقم جديد: %s (غير موجود في القائمة المسموحة)", phone)
+    # بدون ALLOWLIST_ENFORCE يُسمح بجميع الأرقام للتجربة
+    return not numbers.enforce
 
-شكراً لاختيارك لنا! 🌟'''
+def resolve_message(message, rules=None):
+    """مطابقة الرسالة: (الكلمة، نوع التطابق، نص الرد)؛ rules: قواعد المستأجر"""
+    return (rules or registry).current.resolve(message)
 
-def save_message_log(sender, message, response):
+def process_message(message):
+    """معالجة الرسالة وإعداد الرد"""
+    return resolve_message(message)[2]
+
+def prerender_replies(snapshot):
+    """توليد TwiML مسبقاً لجميع الردود الثابتة (عند البدء وبعد كل إعادة تحميل)"""
+    twiml_cache.rebuild(snapshot.static_replies() + [EMPTY_MESSAGE_REPLY, NOT_ALLOWED_REPLY, ERROR_REPLY, THROTTLED_REPLY])
+
+prerender_replies(registry.current)
+registry.on_reload(prerender_replies)
+
+def save_message_log(sender, message, response, keyword=None, match_type=None, directory=None):
     """حفظ سجل الرسائل"""
     try:
         log_entry = {
             'sender': sender,
             'message': message,
             'response': response,
-            'timestamp': datetime.now().isoformat(),
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'time': datetime.now().strftime("%H:%M:%S")
+            'keyword': keyword,
+            'match_type': match_type,
         }
         
-        # إنشاء مجلد السجلات
-        os.makedirs('message_logs', exist_ok=True)
+        # إضافة السجل إلى طابور الأرشيف (يُكتب على دفعات من خيط خلفي)؛ الكاتب يضيف
+        # timestamp وdate وtime لحظة الإضافة حتى يبقى كل جزء مرتباً زمنياً
+        archive.append(log_entry, directory)
         
-        # اسم الملف بالتاريخ
-        log_file = f'message_logs/messages_{datetime.now().strftime("%Y-%m-%d")}.json'
-        
-        # قراءة السجلات الموجودة
-        logs = []
-        if os.path.exists(log_file):
-            try:
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if content.strip():
-                        logs = json.loads(content)
-            except:
-                logs = []
-        
-        # إضافة السجل الجديد
-        logs.append(log_entry)
-        
-        # حفظ الملف
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"💾 تم حفظ الرسالة من {sender}")
+        message_logger.info("💾 تمت إضافة الرسالة من %s إلى الأرشيف", sender)
         
     except Exception as e:
-        logger.error(f"❌ خطأ في حفظ السجل: {e}")
+        logger.error("❌ خطأ في حفظ السجل: %s", e)
 
 # ============== نقطة النهاية الرئيسية ==============
 
-@app.route('/whatsapp', methods=['POST'])
-def whatsapp_webhook():
-    """نقطة استقبال رسائل WhatsApp من Twilio"""
+def route_tenant(to, save=save_message_log):
+    """(جداول المستأجر أو None، دالة الحفظ في أرشيفه)؛ TenantUnavailable إذا تعذر تحميل ملفاته
+
+    الجداول لقطة من load() يستخدمها الطلب كاملاً حتى لو فُرّغ المستأجر الخامل أثناءه.
+    """
+    tenant = tenants.route(to) if tenants is not None else None
+    if tenant is None:
+        return None, save
+    return tenant.load(), partial(save, directory=tenant.archive_dir)
+
+def handle_incoming(sender, incoming_msg, save=save_message_log, tenant=None):
+    """منطق الويب هوك المشترك بين Flask وواجهة ASGI؛ إرجاع نص الرد (tenant: لقطة TenantTables)"""
     try:
-        # الحصول على البيانات من الطلب
-        sender = request.values.get('From', '')
-        incoming_msg = request.values.get('Body', '').strip()
-        
-        logger.info(f"📩 رسالة واردة من: {sender}")
-        logger.info(f"📝 محتوى الرسالة: {incoming_msg}")
+        message_logger.info("📩 رسالة واردة من: %s", sender)
+        message_logger.info("📝 محتوى الرسالة: %s", incoming_msg)
         
         # التحقق من وجود الرسالة
         if not incoming_msg:
             logger.warning("⚠️ رسالة فارغة مستلمة")
-            resp = MessagingResponse()
-            resp.message("لم أستلم أي رسالة. يرجى إعادة المحاولة.")
-            return str(resp)
+            live_stats.record(sender, 'empty')
+            return EMPTY_MESSAGE_REPLY
         
         # التحقق من الرقم (اختياري)
-        if not is_allowed_number(sender):
-            logger.warning(f"⛔ رقم غير مسموح: {sender}")
-            resp = MessagingResponse()
-            resp.message("عذراً، هذا الرقم غير مسموح به حاليًا.")
-            return str(resp)
+        started = time.perf_counter()
+        allowed = is_allowed_number(sender, tenant.allowlist if tenant is not None else None)
+        checked = time.perf_counter()
+        STAGE_SECONDS.observe(checked - started, 'allowlist')
+        if not allowed:
+            logger.warning("⛔ رقم غير مسموح: %s", sender)
+            live_stats.record(sender, 'not_allowed')
+            return NOT_ALLOWED_REPLY
         
         # معالجة الرسالة وإعداد الرد
-        response_text = process_message(incoming_msg)
+        keyword, match_type, response_text = resolve_message(incoming_msg, tenant.rules if tenant is not None else None)
+        matched = time.perf_counter()
+        STAGE_SECONDS.observe(matched - checked, 'match')
+        MESSAGES.inc(keyword or '', match_type)
+        live_stats.record(sender, match_type, keyword)
         
         # حفظ السجل
-        save_message_log(sender, incoming_msg, response_text)
-        
-        # إعداد الرد
-        resp = MessagingResponse()
-        resp.message(response_text)
+        save(sender, incoming_msg, response_text, keyword, match_type)
+        STAGE_SECONDS.observe(time.perf_counter() - matched, 'archive')
         
-        logger.info(f"📤 تم إرسال الرد إلى: {sender}")
-        logger.info(f"💬 محتوى الرد: {response_text[:100]}...")
+        message_logger.info("📤 تم إرسال الرد إلى: %s", sender)
+        message_logger.info("💬 محتوى الرد: %s...", response_text[:100])
         
-        return str(resp)
+        return response_text
         
     except Exception as e:
-        logger.error(f"❌ خطأ في معالجة الرسالة: {str(e)}")
-        resp = MessagingResponse()
-        resp.message("⚠️ عذراً، حدث خطأ في النظام. يرجى المحاولة لاحقاً.")
-        return str(resp)
+        logger.error("❌ خطأ في معالجة الرسالة: %s", e)
+        live_stats.record(sender, 'error')
+        return ERROR_REPLY
+
+def handle_routed(sender, incoming_msg, to=''):
+    """handle_incoming بعد التوجيه حسب رقم To (لعمّال الرد غير المتزامن)"""
+    try:
+        tenant, save = route_tenant(to)
+    except TenantUnavailable:
+        return ERROR_REPLY
+    return handle_incoming(sender, incoming_msg, save, tenant)
+
+# عمّال الرد غير المتزامن (None إذا لم يُفعّل ASYNC_REPLY)
+reply_dispatcher = create_reply_dispatcher(handle_routed)
+if reply_dispatcher is not None:
+    atexit.register(reply_dispatcher.close)
+
+def handle_webhook(values, save=save_message_log):
+    """الويب هوك كاملاً مع منع التكرار بـ MessageSid؛ إرجاع بايتات TwiML"""
+    message_sid = values.get('MessageSid', '')
+    claimed = False
+    
+    # إعادة محاولة من Twilio: نفس الرد المحفوظ بدون معالجة أو تسجيل جديد. المعرّف يُحجز قبل
+    # المعالجة، فإعادة محاولة تصل والأصل ما زال يُعالج تنتظر رده ولا تُعالج مرة ثانية
+    if message_sid:
+        try:
+            cached = dedup_cache.claim(message_sid)
+            if cached is PENDING:
+                DEDUP_LOOKUPS.inc('pending')
+                message_logger.info("⏳ رسالة مكررة %s قيد المعالجة، انتظار الرد المحفوظ", message_sid)
+                # بعد المهلة: استلام فارغ، والرسالة لا تُعالج مرتين
+                cached = dedup_cache.wait(message_sid) or EMPTY_RESPONSE
+            else:
+                DEDUP_LOOKUPS.inc('miss' if cached is None else 'hit')
+        except Exception as e:
+            logger.error("❌ خطأ في ذاكرة منع التكرار: %s", e)
+            cached = None
+        else:
+            claimed = cached is None
+        if cached is not None:
+            message_logger.info("🔁 رسالة مكررة %s، إرجاع الرد المحفوظ", message_sid)
+            return cached
+    
+    body = None
+    try:
+        body, cacheable = process_webhook(values, save)
+    finally:
+        if claimed:
+            try:
+                if body is not None and cacheable:
+                    dedup_cache.put(message_sid, body)
+                else:
+                    # رد لا يُحفظ (خطأ أو تقييد) أو استثناء: إعادة المحاولة تُعالج من جديد
+                    dedup_cache.release(message_sid)
+            except Exception as e:
+                logger.error("❌ خطأ في ذاكرة منع التكرار: %s", e)
+    return body
+
+def process_webhook(values, save=save_message_log):
+    """معالجة رسالة الويب هوك؛ (بايتات TwiML، هل يُحفظ الرد لإعادة المحاولة)"""
+    # الحصول على البيانات من الطلب
+    sender = values.get('From', '')
+    incoming_msg = values.get('Body', '').strip()
+    
+    to = values.get('To', '')
+    try:
+        tenant, save = route_tenant(to, save)
+    except TenantUnavailable:
+        # رد خطأ بصيغة TwiML (لا 500) ولا يُحفظ في ذاكرة التكرار
+        return twiml_cache.render(ERROR_REPLY), False
+    numbers = tenant.allowlist if tenant is not None else None
+    if numbers is None:
+        numbers = allowlist
+    
+    # مرسل تجاوز حده: رد ثابت بدون معالجة أو أرشفة
+    if rate_limiter is not None and not rate_limiter.allow(sender, numbers.contains):
+        logger.warning("⏳ تم تقييد المرسل: %s", sender)
+        return twiml_cache.render(THROTTLED_REPLY), False
+    
+    # وضع الرد غير المتزامن: استلام فوري والرد يُحسب ويُرسل من عمّال REST
+    # (إذا امتلأ الطابور تُعالج الرسالة مباشرة كالمعتاد)
+    if reply_dispatcher is not None and reply_dispatcher.submit(sender, to, incoming_msg):
+        return EMPTY_RESPONSE, True
+    
+    response_text = handle_incoming(sender, incoming_msg, save, tenant)
+    started = time.perf_counter()
+    body = (tenant.twiml if tenant is not None else twiml_cache).render(response_text)
+    STAGE_SECONDS.observe(time.perf_counter() - started, 'render')
+    # لا نحفظ رد الخطأ حتى تُعالج إعادة المحاولة من جديد
+    return body, response_text != ERROR_REPLY
+
+@app.route('/whatsapp', methods=['POST'])
+def whatsapp_webhook():
+    """نقطة استقبال رسائل WhatsApp من Twilio"""
+    started = time.perf_counter()
+    values = request.values
+    STAGE_SECONDS.observe(time.perf_counter() - started, 'parse')
+    return Response(handle_webhook(values), content_type=TWIML_CONTENT_TYPE)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """عدّ الطلب وزمنه حسب المسار، ثم تحديث لقطة العملية عند الحاجة"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(route, str(response.status_code))
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+    metrics_registry.maybe_write_snapshot()
+    live_stats.maybe_write_snapshot()
+    return response
 
 # ============== نقاط نهاية إضافية ==============
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """المقاييس بصيغة Prometheus (مجمعة من جميع العمّال)"""
+    return Response(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """إحصاءات حية مجمعة من جميع العمّال (رسائل بالدقيقة والساعة، مرسلون فريدون، أكثر الكلمات)"""
+    return jsonify(live_stats.collect())
+
+# ============== تحليل الأداء ==============
+
+def require_admin():
+    """None إذا كان الطلب يحمل رمز الإدارة الصحيح، وإلا رد الخطأ"""
+    if not ADMIN_TOKEN:
+        return Response(NOT_FOUND_BODY, 404, content_type=JSON_CONTENT_TYPE)
+    if not check_token(request.headers.get(ADMIN_TOKEN_HEADER, '')):
+        return jsonify({'error': 'رمز الإدارة غير صحيح'}), 403
+    return None
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_process():
+    """تحليل جميع خيوط هذا العامل لمدة ?seconds= وإرجاع المكادس المطوية"""
+    denied = require_admin()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 0)) / 1000 or None
+    except ValueError:
+        return jsonify({'error': 'seconds وinterval_ms يجب أن تكون أرقاماً'}), 400
+    
+    result = profiler.profile(seconds, interval)
+    if result is None:
+        return jsonify({'error': 'يوجد تحليل جارٍ بالفعل'}), 409
+    return Response(result, content_type='text/plain; charset=utf-8')
+
+@app.route('/admin/profile/requests', methods=['GET'])
+def profile_requests():
+    """العينات المتراكمة من الطلبات التي حملت ترويسة X-Debug-Profile (?reset=1 للتصفير)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    result = profiler.request_profile(reset=request.args.get('reset') == '1')
+    return Response(result, content_type='text/plain; charset=utf-8')
+
+# ============== الإرسال الجماعي ==============
+
+@app.route('/admin/broadcasts', methods=['GET'])
+def list_broadcasts():
+    """جميع مهام الإرسال الجماعي وحالتها (من أي عامل أو من سطر الأوامر)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    return jsonify({'jobs': broadcasts.list()})
+
+@app.route('/admin/broadcasts', methods=['POST'])
+def start_broadcast():
+    """إنشاء مهمة وتشغيلها في الخلفية: template مع numbers أو recipients_file أو allowlist=true،
+    وrate وworkers اختيارياً (تُقلّص إلى BROADCAST_MAX_RATE وBROADCAST_MAX_WORKERS)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    template = data.get('template', '')
+    if not template:
+        return jsonify({'error': 'template مطلوب'}), 400
+    try:
+        if data.get('allowlist'):
+            recipients = allowlist_numbers(ALLOWED_NUMBERS)
+        elif data.get('recipients_file'):
+            recipients = read_numbers(data['recipients_file'])
+        else:
+            recipients = data.get('numbers') or []
+        options = {key: data[key] for key in ('rate', 'workers') if key in data}
+        if data.get('from'):
+            options['from_number'] = data['from']
+        job = broadcasts.create(template, recipients, **options)
+    except (OSError, ValueError, TypeError, KeyError, IndexError) as e:
+        return jsonify({'error': f'تعذر إنشاء المهمة: {e}'}), 400
+    broadcasts.start(job)
+    return jsonify(job.status()), 202
+
+@app.route('/admin/broadcasts/<job_id>', methods=['GET'])
+def broadcast_status(job_id):
+    """تقدم مهمة واحدة (مرسلة، فاشلة، غير مؤكدة، متبقية، المعدل الفعلي)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    try:
+        return jsonify(broadcasts.load(job_id).status())
+    except FileNotFoundError:
+        return Response(NOT_FOUND_BODY, 404, content_type=JSON_CONTENT_TYPE)
+
+@app.route('/admin/broadcasts/<job_id>/<action>', methods=['POST'])
+def control_broadcast(job_id, action):
+    """resume (مع ?resend_uncertain=1 اختيارياً) أو stop لمهمة تعمل في هذا العامل"""
+    denied = require_admin()
+    if denied:
+        return denied
+    try:
+        job = broadcasts.load(job_id)
+    except FileNotFoundError:
+        return Response(NOT_FOUND_BODY, 404, content_type=JSON_CONTENT_TYPE)
+    if action == 'stop':
+        if not broadcasts.stop(job_id):
+            return jsonify({'error': 'المهمة لا تعمل في هذا العامل'}), 409
+        return jsonify({'id': job_id, 'stopping': True}), 202
+    if action != 'resume':
+        return Response(NOT_FOUND_BODY, 404, content_type=JSON_CONTENT_TYPE)
+    try:
+        broadcasts.start(job, resend_uncertain=request.args.get('resend_uncertain') == '1')
+    except JobBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(job.status()), 202
+
+if ADMIN_TOKEN:
+    # الخطافات تُسجل فقط عند تفعيل الإدارة، فلا كلفة على الطلبات بدونها
+    @app.before_request
+    def start_debug_profile():
+        if check_token(request.headers.get(DEBUG_HEADER, '')):
+            g.debug_profile = True
+            profiler.begin_request()
+
+    @app.teardown_request
+    def stop_debug_profile(error=None):
+        if g.get('debug_profile'):
+            profiler.end_request()
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """فحص حالة الخادم"""
-    return jsonify({
+    return jsonify(health_payload())
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """العملية حية وتستجيب (بدون أي فحص آخر)"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """جاهزية استقبال الطلبات: انتهى الإحماء، لا إغلاق جارٍ، والأرشيف قابل للكتابة"""
+    payload = readiness.payload()
+    return jsonify(payload), 200 if payload['ready'] else 503
+
+def health_payload():
+    return {
         'status': 'healthy',
         'service': 'whatsapp-auto-reply',
         'timestamp': datetime.now().isoformat(),
-        'allowed_numbers': ALLOWED_NUMBERS,
+        'allowlist': allowlist.stats(),
+        'dedup': dedup_cache.stats(),
+        'rate_limit': rate_limiter.stats() if rate_limiter is not None else None,
+        'async_reply': reply_dispatcher.stats() if reply_dispatcher is not None else None,
+        'tenants': tenants.stats() if tenants is not None else None,
+        'readiness': readiness.payload(),
         'message': '✅ النظام يعمل بشكل طبيعي'
-    })
+    }
 
-@app.route('/logs', methods=['GET'])
-def view_logs():
-    """عرض سجلات الرسائل"""
-    try:
-        today = datetime.now().strftime("%Y-%m-%d")
-        log_file = f'message_logs/messages_{today}.json'
-        
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-            
-            # تنسيق HTML للعرض
-            html = '''
+LOGS_PAGE_SIZE = 50
+LOGS_MAX_PAGE_SIZE = 500
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+# رقم (مقطع/ملف قديم) أو إزاحة كل جزء: m<الجزء>:<الإزاحة>,...
+CURSOR_PATTERN = re.compile(r'^([scl]?\d+|[mc][\w-]+:\d+(,[\w-]+:\d+)*)$', re.ASCII)
+
+def render_log_entry(log):
+    """سجل واحد كـ HTML (مع تهريب جميع الحقول)"""
+    return f'''
+                <div class="message incoming">
+                    <strong>📞 من:</strong> {escape(str(log.get('sender', '')))}<br>
+                    <strong>📩 الرسالة:</strong> {escape(str(log.get('message', '')))}<br>
+                    <strong>💬 الرد:</strong> {escape(str(log.get('response', ''))[:200])}...<br>
+                    <span class="time">⏰ {escape(str(log.get('time', '')))}</span>
+                </div>
+                '''
+
+def stream_logs_html(date, records, limit):
+    """توليد صفحة السجلات أثناء قراءتها بدلاً من بنائها كاملة في الذاكرة"""
+    yield f'''
             <!DOCTYPE html>
             <html dir="rtl">
             <head>
                 <meta charset="UTF-8">
                 <title>سجلات الرسائل</title>
                 <style>
-                    body { font-family: Arial; padding: 20px; }
-                    .message { border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }
-                    .incoming { background: #e3f2fd; }
-                    .time { color: #666; font-size: 0.9em; }
+                    body {{ font-family: Arial; padding: 20px; }}
+                    .message {{ border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px; }}
+                    .incoming {{ background: #e3f2fd; }}
+                    .time {{ color: #666; font-size: 0.9em; }}
                 </style>
             </head>
             <body>
-                <h2>📋 سجلات رسائل اليوم ({date})</h2>
-                <p>عدد الرسائل: {count}</p>
-            '''.format(date=today, count=len(logs))
-            
-            for log in reversed(logs):  # عرض أحدث الرسائل أولاً
-                html += f'''
-                <div class="message incoming">
-                    <strong>📞 من:</strong> {log.get('sender', '')}<br>
-                    <strong>📩 الرسالة:</strong> {log.get('message', '')}<br>
-                    <strong>💬 الرد:</strong> {log.get('response', '')[:200]}...<br>
-                    <span class="time">⏰ {log.get('time', '')}</span>
-                </div>
-                '''
-            
-            html += '''
+                <h2>📋 سجلات رسائل اليوم ({escape(date)})</h2>
+            '''
+    
+    cursor = None
+    for count, (record_cursor, log) in enumerate(records):  # أحدث الرسائل أولاً
+        if count == limit:
+            # يوجد سجل أقدم: رابط الصفحة التالية يبدأ بعد آخر سجل معروض
+            yield f'''
+                <a href="/logs?date={escape(date)}&before={escape(cursor)}&limit={limit}">الرسائل الأقدم ←</a><br>'''
+            break
+        cursor = record_cursor
+        yield render_log_entry(log)
+    
+    yield '''
                 <br>
                 <a href="/">العودة للصفحة الرئيسية</a>
             </body>
             </html>
             '''
-            
-            return html
-        else:
+
+def parse_logs_query(args):
+    """قراءة date/before/limit من معاملات الطلب؛ ValueError برسالة الخطأ"""
+    date = args.get('date') or datetime.now().strftime("%Y-%m-%d")
+    before = args.get('before') or None
+    try:
+        limit = int(args.get('limit') or LOGS_PAGE_SIZE)
+    except ValueError:
+        limit = LOGS_PAGE_SIZE
+    
+    if not DATE_PATTERN.match(date):
+        raise ValueError('صيغة التاريخ غير صحيحة (YYYY-MM-DD)')
+    if before is not None and not CURSOR_PATTERN.match(before):
+        raise ValueError('مؤشر الصفحة غير صحيح')
+    return date, before, max(1, min(limit, LOGS_MAX_PAGE_SIZE))
+
+def logs_page_json(date, records, limit):
+    """صفحة سجلات بصيغة JSON مع مؤشر الصفحة التالية"""
+    page = list(islice(records, limit + 1))
+    next_cursor = page[limit - 1][0] if len(page) > limit else None
+    page = page[:limit]
+    return {
+        'date': date,
+        'count': len(page),
+        'next_cursor': next_cursor,
+        'logs': [log for _, log in page]
+    }
+
+@app.route('/logs', methods=['GET'])
+def view_logs():
+    """عرض سجلات الرسائل (?date=&before=&limit=&format=json)"""
+    try:
+        try:
+            date, before, limit = parse_logs_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not day_exists(date):
             return jsonify({
                 'message': 'لا توجد سجلات لهذا اليوم',
-                'date': today
+                'date': date
             })
+        
+        # القراءة تبدأ من نهاية الملف، مع سجل إضافي لمعرفة وجود صفحة تالية
+        records = read_day_reverse(date, before)
+        
+        if request.args.get('format') == 'json':
+            return jsonify(logs_page_json(date, records, limit))
+        
+        return Response(stream_logs_html(date, records, limit), mimetype='text/html')
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def require_message_store():
+    """استجابة خطأ إذا لم يكن مخزن SQLite مفعلاً"""
+    if message_store is None:
+        return jsonify({'error': 'البحث يتطلب تفعيل ARCHIVE_SQLITE'}), 503
+    return None
+
+def read_date_range():
+    """قراءة from/to من الطلب (تاريخ YYYY-MM-DD أو طابع زمني ISO)"""
+    date_from = request.args.get('from') or None
+    date_to = request.args.get('to') or None
+    for value in (date_from, date_to):
+        if value is not None:
+            datetime.fromisoformat(value)
+    return date_from, date_to
+
+@app.route('/logs/search', methods=['GET'])
+def search_logs():
+    """البحث في السجلات (?sender=&q=&keyword=&from=&to=&before=&limit=)"""
+    error = require_message_store()
+    if error:
+        return error
+    try:
+        try:
+            date_from, date_to = read_date_range()
+        except ValueError:
+            return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+        before = request.args.get('before') or None
+        if before:
+            try:
+                parse_cursor(before)
+            except ValueError:
+                return jsonify({'error': 'مؤشر before غير صالح (استخدم next_cursor من الصفحة السابقة)'}), 400
+        limit = max(1, min(request.args.get('limit', LOGS_PAGE_SIZE, type=int) or LOGS_PAGE_SIZE, LOGS_MAX_PAGE_SIZE))
+        
+        results, next_cursor = message_store.search(
+            sender=request.args.get('sender') or None,
+            text=request.args.get('q') or None,
+            keyword=request.args.get('keyword') or None,
+            date_from=date_from,
+            date_to=date_to,
+            before=before,
+            limit=limit
+        )
+        return jsonify({
+            'count': len(results),
+            'next_cursor': next_cursor,
+            'results': results
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/logs/export', methods=['GET'])
+def export_logs():
+    """تصدير متدفق للسجلات (?from=&to=&format=ndjson|csv)"""
+    error = require_message_store()
+    if error:
+        return error
+    try:
+        date_from, date_to = read_date_range()
+    except ValueError:
+        return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'الصيغة المدعومة: ndjson أو csv'}), 400
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        message_store.export(date_from, date_to, fmt),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=messages.{fmt}'}
+    )
+
 @app.route('/send-test', methods=['GET'])
 def send_test_form():
     """نموذج لإرسال رسالة تجريبية"""
-    return '''
-    <!DOCTYPE html>
-    <html dir="rtl">
-    <head>
-        <meta charset="UTF-8">
-        <title>اختبار الرد التلقائي</title>
-        <style>
-            body { font-family: Arial; padding: 20px; max-width: 600px; margin: auto; }
-            input, textarea, button { width: 100%; padding: 12px; margin: 8px 0; }
-            button { background: #25D366; color: white; border: none; cursor: pointer; }
-            .info { background: #e8f5e9; padding: 15px; border-radius: 5px; margin: 15px 0; }
-        </style>
-    </head>
-    <body>
-        <h2>🧪 اختبار نظام الرد التلقائي</h2>
-        
-        <div class="info">
-            <strong>ℹ️ معلومات:</strong><br>
-            هذا النموذج يحاكي استقبال رسالة من WhatsApp.
-            أدخل رسالة لترى كيف سيرد النظام.
-        </div>
-        
-        <input type="text" id="message" placeholder="اكتب رسالتك هنا (مثال: مرحبا)" value="مرحبا">
-        <button onclick="simulateMessage()">اختبار الرد</button>
-        
-        <div id="result" style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 5px; display: none;">
-            <h3>📨 نتيجة الاختبار:</h3>
-            <div id="response"></div>
-        </div>
-        
-        <script>
-        async function simulateMessage() {
-            const message = document.getElementById('message').value;
-            
-            if (!message) {
-                alert('يرجى إدخال رسالة');
-                return;
-            }
-            
-            // إرسال طلب محاكاة
-            const response = await fetch('/simulate', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: message })
-            });
-            
-            const result = await response.json();
-            const resultDiv = document.getElementById('result');
-            const responseDiv = document.getElementById('response');
-            
-            resultDiv.style.display = 'block';
-            
-            if (response.ok) {
-                responseDiv.innerHTML = `
-                    <p><strong>📩 الرسالة الأصلية:</strong> ${result.original_message}</p>
-                    <p><strong>💬 الرد التلقائي:</strong><br>${result.response.replace(/\\n/g, '<br>')}</p>
-                    <p><strong>⏰ الوقت:</strong> ${result.timestamp}</p>
-                `;
-            } else {
-                responseDiv.innerHTML = `<p style="color: red;">❌ خطأ: ${result.error}</p>`;
-            }
-        }
-        </script>
-    </body>
-    </html>
-    '''
+    return serve_page('send_test')
 
 @app.route('/simulate', methods=['POST'])
 def simulate_message():
@@ -394,308 +649,102 @@ def simulate_message():
         if not message:
             return jsonify({'error': 'الرسالة مطلوبة'}), 400
         
-        # معالجة الرسالة
-        response = process_message(message)
-        
-        return jsonify({
-            'success': True,
-            'original_message': message,
-            'response': response,
-            'timestamp': datetime.now().isoformat()
-        })
+        return jsonify(simulate_payload(message, data.get('to', '')))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def simulate_payload(message, to=''):
+    """نتيجة محاكاة رسالة واحدة (to: رقم المستأجر لاختبار قواعده)"""
+    # معالجة الرسالة
+    try:
+        tenant = route_tenant(to)[0] if to else None
+        response = resolve_message(message, tenant.rules)[2] if tenant is not None else process_message(message)
+    except TenantUnavailable:
+        response = ERROR_REPLY
+    
+    return {
+        'success': True,
+        'original_message': message,
+        'response': response,
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.route('/simulate/batch', methods=['POST'])
+def simulate_batch():
+    """محاكاة مجموعة رسائل (مصفوفة JSON أو NDJSON) وبث النتائج NDJSON (?workers=N)"""
+    try:
+        workers = parse_workers(request.args.get('workers'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # قراءة الجسم على أجزاء حتى لا يُحمّل كاملاً في الذاكرة
+    chunks = iter(lambda: request.stream.read(64 * 1024), b'')
+    results = stream_batch(chunks, resolve_message, workers)
+    return Response(stream_with_context(results), content_type=NDJSON_CONTENT_TYPE)
+
 @app.route('/')
 def home():
     """الصفحة الرئيسية"""
-    return '''
-    <!DOCTYPE html>
-    <html dir="rtl">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>نظام الرد التلقائي على WhatsApp</title>
-        <style>
-            * {
-                box-sizing: border-box;
-                margin: 0;
-                padding: 0;
-            }
-            
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                padding: 20px;
-            }
-            
-            .container {
-                max-width: 1200px;
-                margin: 0 auto;
-                background: white;
-                border-radius: 20px;
-                box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-                overflow: hidden;
-            }
-            
-            header {
-                background: linear-gradient(135deg, #25D366 0%, #128C7E 100%);
-                color: white;
-                padding: 40px;
-                text-align: center;
-            }
-            
-            header h1 {
-                font-size: 2.5em;
-                margin-bottom: 10px;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                gap: 15px;
-            }
-            
-            .status-badge {
-                background: rgba(255,255,255,0.2);
-                padding: 10px 20px;
-                border-radius: 50px;
-                display: inline-block;
-                font-weight: bold;
-                margin-top: 15px;
-            }
-            
-            .main-content {
-                padding: 40px;
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-                gap: 30px;
-            }
-            
-            .card {
-                background: #f8f9fa;
-                padding: 30px;
-                border-radius: 15px;
-                border-left: 5px solid #25D366;
-                transition: transform 0.3s ease;
-            }
-            
-            .card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            }
-            
-            .card h3 {
-                color: #128C7E;
-                margin-bottom: 20px;
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }
-            
-            .btn {
-                display: inline-flex;
-                align-items: center;
-                gap: 10px;
-                background: #25D366;
-                color: white;
-                padding: 15px 25px;
-                text-decoration: none;
-                border-radius: 10px;
-                font-weight: bold;
-                margin: 10px 5px;
-                transition: all 0.3s ease;
-            }
-            
-            .btn:hover {
-                background: #128C7E;
-                transform: translateY(-2px);
-            }
-            
-            .instructions {
-                background: #e8f5e9;
-                padding: 25px;
-                border-radius: 10px;
-                margin: 20px 0;
-            }
-            
-            .instructions ol {
-                margin-right: 20px;
-                margin-top: 15px;
-            }
-            
-            .instructions li {
-                margin-bottom: 10px;
-            }
-            
-            footer {
-                text-align: center;
-                padding: 30px;
-                background: #f8f9fa;
-                color: #666;
-                border-top: 1px solid #e0e0e0;
-            }
-            
-            .stats {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-                gap: 20px;
-                margin-top: 30px;
-            }
-            
-            .stat-box {
-                background: white;
-                padding: 20px;
-                border-radius: 10px;
-                text-align: center;
-                box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-            }
-            
-            .stat-box .number {
-                font-size: 2em;
-                font-weight: bold;
-                color: #25D366;
-                margin: 10px 0;
-            }
-            
-            @media (max-width: 768px) {
-                .main-content {
-                    grid-template-columns: 1fr;
-                }
-                
-                header h1 {
-                    font-size: 1.8em;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>
-                    <span>🤖</span>
-                    نظام الرد التلقائي على WhatsApp
-                </h1>
-                <p>نظام آلي متكامل للرد الفوري على رسائل واتساب</p>
-                <div class="status-badge">
-                    ✅ النظام نشط وجاهز للاستقبال
-                </div>
-            </header>
-            
-            <div class="main-content">
-                <div class="card">
-                    <h3>🚀 بدء الاستخدام</h3>
-                    <div class="instructions">
-                        <strong>لبدء الاستخدام:</strong>
-                        <ol>
-                            <li>أرسل رسالة إلى رقم Sandbox</li>
-                            <li>سيرد النظام تلقائياً</li>
-                            <li>جرب الأوامر المختلفة</li>
-                        </ol>
-                    </div>
-                    
-                    <div style="margin-top: 20px;">
-                        <a href="/send-test" class="btn">
-                            <span>🧪</span> اختبار النظام
-                        </a>
-                        <a href="/health" class="btn">
-                            <span>✅</span> فحص الحالة
-                        </a>
-                    </div>
-                </div>
-                
-                <div class="card">
-                    <h3>📋 الأوامر المتاحة</h3>
-                    <ul style="list-style: none; margin-right: 10px;">
-                        <li>• "مرحبا" - للترحيب</li>
-                        <li>• "مساعدة" - عرض الأوامر</li>
-                        <li>• "حالة" - حالة النظام</li>
-                        <li>• "معلومات" - معلومات الخدمة</li>
-                        <li>• "وقت" - الوقت الحالي</li>
-                        <li>• "شكرا" - إنهاء المحادثة</li>
-                    </ul>
-                    
-                    <div style="margin-top: 20px;">
-                        <a href="/logs" class="btn">
-                            <span>📊</span> عرض السجلات
-                        </a>
-                    </div>
-                </div>
-                
-                <div class="card">
-                    <h3>📊 إحصائيات النظام</h3>
-                    <div class="stats">
-                        <div class="stat-box">
-                            <div class="number">24/7</div>
-                            <div>التشغيل</div>
-                        </div>
-                        <div class="stat-box">
-                            <div class="number">⚡</div>
-                            <div>رد فوري</div>
-                        </div>
-                        <div class="stat-box">
-                            <div class="number">📱</div>
-                            <div>واتساب</div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div style="padding: 0 40px;">
-                <div class="instructions">
-                    <h3>🔧 معلومات تقنية</h3>
-                    <p><strong>نقطة الاستقبال:</strong> POST /whatsapp</p>
-                    <p><strong>رقم Sandbox:</strong> +14155238886</p>
-                    <p><strong>الأرقام المسموحة:</strong> جميع الأرقام مفعلة للتجربة</p>
-                    <p><strong>حالة الويب هوك:</strong> <span style="color: green;">✅ مفعل</span></p>
-                </div>
-            </div>
-            
-            <footer>
-                <p>🤖 نظام الرد التلقائي على WhatsApp | الإصدار 2.0</p>
-                <p>تم النشر على Render.com | {timestamp}</p>
-            </footer>
-        </div>
-        
-        <script>
-            // عرض التاريخ والوقت
-            const now = new Date();
-            const options = {
-                weekday: 'long',
-                year: 'numeric', 
-                month: 'long',
-                day: 'numeric',
-                hour: '2-digit',
-                minute: '2-digit',
-                timeZone: 'Asia/Riyadh'
-            };
-            const timestamp = new Intl.DateTimeFormat('ar-SA', options).format(now);
-            document.body.innerHTML = document.body.innerHTML.replace('{timestamp}', timestamp);
-        </script>
-    </body>
-    </html>
-    '''
+    return serve_page('home')
+
+def serve_page(name):
+    """صفحة مبنية مسبقاً (templates/) مع gzip/br وETag و304"""
+    status, headers, body = pages.serve(
+        name, request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', ''))
+    return Response(body, status, headers)
 
 # معالجة الأخطاء
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({'error': 'Not found', 'message': 'الصفحة غير موجودة'}), 404
+    return Response(NOT_FOUND_BODY, 404, content_type=JSON_CONTENT_TYPE)
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"❌ Internal server error: {error}")
-    return jsonify({'error': 'Internal server error', 'message': 'حدث خطأ داخلي'}), 500
+    logger.error("❌ Internal server error: %s", error)
+    return Response(INTERNAL_ERROR_BODY, 500, content_type=JSON_CONTENT_TYPE)
+
+# ============== الإحماء قبل استقبال الطلبات ==============
+
+def archive_writable():
+    directory = ARCHIVE_DIR if os.path.isdir(ARCHIVE_DIR) else os.path.dirname(os.path.abspath(ARCHIVE_DIR))
+    return os.access(directory, os.W_OK)
+
+def warm_up():
+    """تجهيز ما يُبنى كسولاً قبل أول طلب
+
+    مع preload في gunicorn يحدث هذا مرة واحدة في العملية الرئيسية ويرثه العمّال عبر fork.
+    """
+    readiness.mark('init')
+    
+    # جداول المطابقة (Aho-Corasick والفهرس التقريبي) ومسار المطابقة والردود المولدة مسبقاً
+    snapshot = registry.current
+    for message in [*snapshot.replies, 'رسالة بدون تطابق', 'helo']:
+        twiml_cache.render(resolve_message(message)[2])
+    
+    # الصفحات الثابتة بنسخها المضغوطة، وجدول التوجيه في Werkzeug (يُبنى عند أول مطابقة)
+    for name in pages.pages:
+        pages.serve(name, 'br, gzip')
+    app.url_map.bind('localhost').match('/health')
+    
+    readiness.mark('warmup')
+    readiness.add_check('archive_writable', archive_writable)
+    readiness.set_ready()
+
+warm_up()
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 10000))
     debug = os.getenv('FLASK_ENV') == 'development'
+    # عملية واحدة: لقطات المقاييس والإحصاءات الموجودة تخص تشغيلاً سابقاً
+    metrics_registry.clear_snapshots()
+    live_stats.clear_snapshots()
     
     logger.info("=" * 50)
     logger.info("🚀 بدء تشغيل نظام الرد التلقائي على WhatsApp")
-    logger.info(f"🌐 البورت: {port}")
-    logger.info(f"📞 الأرقام المسموحة: {ALLOWED_NUMBERS}")
+    logger.info("🌐 البورت: %s", port)
+    logger.info("📞 الأرقام المسموحة: %s (%s)", len(allowlist), allowlist.mode)
+    logger.info("⏱️ زمن الإقلاع: %ss (للإنتاج: python serve.py)", readiness.cold_start)
     logger.info("=" * 50)
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,373 @@
+"""واجهة ASGI أصلية للويب هوك (asyncio)
+
+تخدم /whatsapp و/simulate و/health و/logs والصفحات الثابتة بنفس سلوك تطبيق Flask، مع نقل
+عمليات الأرشيف والقراءة من القرص إلى خيوط منفصلة حتى لا تعطل حلقة الأحداث.
+
+التشغيل:
+    uvicorn asgi:app --host 0.0.0.0 --port 10000 --workers 4
+    hypercorn asgi:app --bind 0.0.0.0:10000 --workers 4
+"""
+import json
+import time
+import queue
+import asyncio
+import logging
+from urllib.parse import parse_qsl
+
+from app import (
+    archive, reply_dispatcher, handle_webhook, health_payload, simulate_payload, resolve_message,
+    metrics_registry, REQUESTS, REQUEST_SECONDS, STAGE_SECONDS,
+    parse_logs_query, logs_page_json, stream_logs_html, day_exists, read_day_reverse,
+)
+from twiml import TWIML_CONTENT_TYPE
+from static_pages import pages, NOT_FOUND_BODY, INTERNAL_ERROR_BODY, JSON_CONTENT_TYPE, HTML_CONTENT_TYPE
+from metrics import PROMETHEUS_CONTENT_TYPE
+from live_stats import live_stats
+from readiness import readiness
+from profiler import profiler, check_token, ADMIN_TOKEN, ADMIN_TOKEN_HEADER
+from simulate_batch import NDJSON_CONTENT_TYPE, parse_workers, stream_batch
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+# ============== أدوات HTTP ==============
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_body(receive):
+    """قراءة جسم الطلب كاملاً (بحد أقصى MAX_BODY_SIZE)"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def start_response(send, status, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode('latin-1'))],
+    })
+
+
+async def send_response(send, status, body, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode('latin-1')),
+            (b'content-length', str(len(body)).encode('latin-1')),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, payload, status=200):
+    # نفس إعدادات jsonify في Flask: مفاتيح مرتبة ومخرجات مضغوطة
+    body = (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+    await send_response(send, status, body, JSON_CONTENT_TYPE)
+
+
+def query_params(scope):
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+
+
+def header(scope, name):
+    name = name.lower().encode('latin-1')
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+# ============== نقاط النهاية ==============
+
+async def whatsapp(scope, receive, send):
+    """نقطة استقبال رسائل WhatsApp من Twilio"""
+    body = await read_body(receive)
+    started = time.perf_counter()
+    # مثل request.values في Flask: معاملات الرابط لها الأولوية على النموذج
+    values = dict(parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+    values.update(query_params(scope))
+    STAGE_SECONDS.observe(time.perf_counter() - started, 'parse')
+
+    # منع التكرار (SQLite)، وقفل حدود المعدل، وإعادة تحميل القواعد والقائمة، والحفظ في طابور
+    # الأرشيف المحدود قد تحجب كلها؛ تُنفذ في خيط حتى لا تعطل حلقة الأحداث، وامتلاء الطابور
+    # يبطئ هذا الطلب فقط (ضغط عكسي) بدلاً من تراكم عمليات حفظ بلا حد
+    body = await asyncio.to_thread(handle_webhook, values)
+    await send_response(send, 200, body, TWIML_CONTENT_TYPE)
+
+
+async def simulate(scope, receive, send):
+    """محاكاة استقبال رسالة (للتجربة)"""
+    try:
+        data = json.loads(await read_body(receive))
+        message = data.get('message', '')
+
+        if not message:
+            return await send_json(send, {'error': 'الرسالة مطلوبة'}, 400)
+
+        await send_json(send, simulate_payload(message, data.get('to', '')))
+
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def simulate_batch(scope, receive, send):
+    """محاكاة مجموعة رسائل (مصفوفة JSON أو NDJSON) وبث النتائج NDJSON (?workers=N)"""
+    try:
+        workers = parse_workers(query_params(scope).get('workers'))
+    except ValueError as e:
+        return await send_json(send, {'error': str(e)}, 400)
+
+    # نفس مولّد Flask في خيط منفصل: حلقة الأحداث تغذيه بأجزاء الجسم عبر طابور محدود
+    chunks = queue.Queue(maxsize=4)
+    results = stream_batch(iter(chunks.get, None), resolve_message, workers)
+    finished = asyncio.Event()
+
+    async def put(item):
+        # المولّد قد يتوقف مبكراً (مدخل غير صالح) فلا يبقى من يفرغ الطابور
+        while not finished.is_set():
+            try:
+                chunks.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.005)
+
+    async def feed():
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    break
+                await put(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+        finally:
+            await put(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        await start_response(send, 200, NDJSON_CONTENT_TYPE)
+        while True:
+            chunk = await asyncio.to_thread(next, results, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        finished.set()
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+        await asyncio.to_thread(results.close)
+
+
+async def metrics(scope, receive, send):
+    """المقاييس بصيغة Prometheus (مجمعة من جميع العمّال)"""
+    body = await asyncio.to_thread(metrics_registry.render)
+    await send_response(send, 200, body.encode('utf-8'), PROMETHEUS_CONTENT_TYPE)
+
+
+async def stats(scope, receive, send):
+    """إحصاءات حية مجمعة من جميع العمّال"""
+    await send_json(send, await asyncio.to_thread(live_stats.collect))
+
+
+async def require_admin(scope, send):
+    """True إذا كان الطلب يحمل رمز الإدارة الصحيح، وإلا يُرسل رد الخطأ"""
+    if not ADMIN_TOKEN:
+        await send_response(send, 404, NOT_FOUND_BODY, JSON_CONTENT_TYPE)
+        return False
+    if not check_token(header(scope, ADMIN_TOKEN_HEADER)):
+        await send_json(send, {'error': 'رمز الإدارة غير صحيح'}, 403)
+        return False
+    return True
+
+
+async def profile_process(scope, receive, send):
+    """تحليل جميع خيوط هذا العامل (بما فيها حلقة الأحداث) لمدة ?seconds="""
+    if not await require_admin(scope, send):
+        return
+    args = query_params(scope)
+    try:
+        seconds = float(args.get('seconds', 10))
+        interval = float(args.get('interval_ms', 0)) / 1000 or None
+    except ValueError:
+        return await send_json(send, {'error': 'seconds وinterval_ms يجب أن تكون أرقاماً'}, 400)
+
+    result = await asyncio.to_thread(profiler.profile, seconds, interval)
+    if result is None:
+        return await send_json(send, {'error': 'يوجد تحليل جارٍ بالفعل'}, 409)
+    await send_response(send, 200, result.encode('utf-8'), 'text/plain; charset=utf-8')
+
+
+async def profile_requests(scope, receive, send):
+    """العينات المتراكمة من طلبات X-Debug-Profile (تُجمع في عمّال Flask فقط)"""
+    if not await require_admin(scope, send):
+        return
+    result = profiler.request_profile(reset=query_params(scope).get('reset') == '1')
+    await send_response(send, 200, result.encode('utf-8'), 'text/plain; charset=utf-8')
+
+
+async def health(scope, receive, send):
+    """فحص حالة الخادم (يقرأ SQLite وحالة الملفات، لذا في خيط)"""
+    await send_json(send, await asyncio.to_thread(health_payload))
+
+
+async def liveness(scope, receive, send):
+    await send_json(send, {'status': 'alive'})
+
+
+async def readiness_check(scope, receive, send):
+    payload = readiness.payload()
+    await send_json(send, payload, 200 if payload['ready'] else 503)
+
+
+async def logs(scope, receive, send):
+    """عرض سجلات الرسائل (?date=&before=&limit=&format=json)"""
+    args = query_params(scope)
+    try:
+        date, before, limit = parse_logs_query(args)
+    except ValueError as e:
+        return await send_json(send, {'error': str(e)}, 400)
+
+    try:
+        if not await asyncio.to_thread(day_exists, date):
+            return await send_json(send, {
+                'message': 'لا توجد سجلات لهذا اليوم',
+                'date': date
+            })
+
+        records = read_day_reverse(date, before)
+        if args.get('format') == 'json':
+            payload = await asyncio.to_thread(logs_page_json, date, records, limit)
+            return await send_json(send, payload)
+    except Exception as e:
+        return await send_json(send, {'error': str(e)}, 500)
+
+    # بث الصفحة: كل جزء يُقرأ من القرص في خيط منفصل ثم يُرسل فوراً
+    chunks = stream_logs_html(date, records, limit)
+    await start_response(send, 200, HTML_CONTENT_TYPE)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def home(scope, receive, send):
+    await send_page(scope, send, 'home')
+
+
+async def send_test_form(scope, receive, send):
+    await send_page(scope, send, 'send_test')
+
+
+async def send_page(scope, send, name):
+    """صفحة مبنية مسبقاً مع التفاوض على الترميز و304 (نفس serve_page في Flask)"""
+    status, headers, body = pages.serve(name, header(scope, 'accept-encoding'), header(scope, 'if-none-match'))
+    headers.append(('Content-Length', str(len(body))))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+ROUTES = {
+    '/': ('GET', home),
+    '/send-test': ('GET', send_test_form),
+    '/whatsapp': ('POST', whatsapp),
+    '/simulate': ('POST', simulate),
+    '/simulate/batch': ('POST', simulate_batch),
+    '/health': ('GET', health),
+    '/health/live': ('GET', liveness),
+    '/health/ready': ('GET', readiness_check),
+    '/metrics': ('GET', metrics),
+    '/stats': ('GET', stats),
+    '/admin/profile': ('GET', profile_process),
+    '/admin/profile/requests': ('GET', profile_requests),
+    '/logs': ('GET', logs),
+}
+
+
+# ============== تطبيق ASGI ==============
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # لا خطاف للعملية الرئيسية في uvicorn/hypercorn: كل عامل يحذف لقطات العمليات
+            # المنتهية (من تشغيل سابق) ويترك لقطات العمّال الأحياء
+            await asyncio.to_thread(metrics_registry.clear_snapshots, True)
+            await asyncio.to_thread(live_stats.clear_snapshots, True)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # إرسال الردود المعلقة ثم تفريغ طابور الأرشيف قبل الخروج
+            readiness.set_draining()
+            if reply_dispatcher is not None:
+                await asyncio.to_thread(reply_dispatcher.close)
+            await asyncio.to_thread(archive.close)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    route = ROUTES.get(scope['path'])
+    status = 500
+
+    async def send_tracked(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+
+    try:
+        await dispatch(route, scope, receive, send_tracked)
+    finally:
+        name = scope['path'] if route is not None else 'unmatched'
+        REQUESTS.inc(name, str(status))
+        REQUEST_SECONDS.observe(time.perf_counter() - started, name)
+        # كتابة اللقطة (مرة كل interval) في خيط بعد إرسال الرد، لا على حلقة الأحداث
+        for snapshots in (metrics_registry.snapshots, live_stats.snapshots):
+            if snapshots.due():
+                await asyncio.to_thread(snapshots.maybe_write)
+
+
+async def dispatch(route, scope, receive, send):
+    if route is None:
+        return await send_response(send, 404, NOT_FOUND_BODY, JSON_CONTENT_TYPE)
+
+    method, handler = route
+    if scope['method'] != method:
+        return await send_json(send, {'error': 'Method not allowed'}, 405)
+
+    try:
+        await handler(scope, receive, send)
+    except BodyTooLarge:
+        await send_json(send, {'error': 'Request too large'}, 413)
+    except Exception as e:
+        logger.error("❌ Internal server error: %s", e)
+        await send_response(send, 500, INTERNAL_ERROR_BODY, JSON_CONTENT_TYPE)
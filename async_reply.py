@@ -0,0 +1,135 @@
+import os
+import queue
+import logging
+import threading
+
+from twilio_rest import TransportError, TWILIO_WHATSAPP_FROM, create_transport, send_with_retry
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الرد غير المتزامن ==============
+
+# عند التفعيل يرد الويب هوك فوراً بـ TwiML فارغ ويُرسل الرد لاحقاً عبر REST
+ASYNC_REPLY = os.getenv('ASYNC_REPLY', '').lower() in ('1', 'true', 'yes')
+ASYNC_REPLY_WORKERS = int(os.getenv('ASYNC_REPLY_WORKERS', 4))
+ASYNC_REPLY_QUEUE_SIZE = int(os.getenv('ASYNC_REPLY_QUEUE_SIZE', 1000))
+
+_STOP = object()
+
+
+class ReplyDispatcher:
+    """طابور محدود + خيوط عمّال تحسب الرد ثم ترسله عبر الناقل
+
+    handler(sender, message, to) يحسب نص الرد ويؤرشفه (handle_routed في app.py).
+    """
+
+    def __init__(self, handler, transport, workers=ASYNC_REPLY_WORKERS,
+                 queue_size=ASYNC_REPLY_QUEUE_SIZE, from_number=TWILIO_WHATSAPP_FROM):
+        self.handler = handler
+        self.transport = transport
+        self.workers = max(1, workers)
+        self.from_number = from_number
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self.accepted = 0
+        self.rejected = 0
+        self.sent = 0
+        self.failed = 0
+        self.uncertain = 0
+        self.retries = 0
+
+    def _ensure_started(self):
+        """تشغيل العمّال مرة واحدة لكل عملية (بما في ذلك بعد fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._threads = [
+                threading.Thread(target=self._run, name=f'reply-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, sender, to, message):
+        """إضافة رسالة إلى الطابور؛ False إذا كان ممتلئاً (ليُعالجها المستدعي مباشرة)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((sender, to, message))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def _run(self):
+        q = self._queue
+        while True:
+            job = q.get()
+            try:
+                if job is _STOP:
+                    return
+                self._process(*job)
+            finally:
+                q.task_done()
+
+    def _process(self, sender, to, message):
+        response_text = self.handler(sender, message, to)
+        from_number = self.from_number or to
+        try:
+            _, retries = send_with_retry(self.transport, sender, from_number, response_text)
+            self.retries += retries
+            self.sent += 1
+        except TransportError as e:
+            if e.uncertain:
+                # ربما وصل الرد: لا يُعاد إرساله حتى لا يتكرر
+                self.uncertain += 1
+                logger.warning("⚠️ نتيجة إرسال الرد إلى %s غير معروفة: %s", sender, e)
+            else:
+                self.failed += 1
+                logger.error("❌ فشل إرسال الرد إلى %s: %s", sender, e)
+        except Exception as e:
+            self.failed += 1
+            logger.error("❌ خطأ في عامل الرد: %s", e)
+
+    def join(self):
+        """الانتظار حتى تُرسل جميع الردود الموجودة في الطابور"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._pid = None
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            close()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'sent': self.sent,
+            'failed': self.failed,
+            'uncertain': self.uncertain,
+            'retries': self.retries,
+        }
+
+
+def create_reply_dispatcher(handler):
+    """المرسل غير المتزامن إذا كان ASYNC_REPLY مفعلاً، وإلا None"""
+    if not ASYNC_REPLY:
+        return None
+    return ReplyDispatcher(handler, create_transport())
@@ -0,0 +1,107 @@
+"""زمن الويب هوك في وضع الرد المباشر مقابل وضع الرد غير المتزامن
+
+يشغّل خادم Twilio بديلاً محلياً (twilio_stub.py)، ثم يرسل نفس الطلبات إلى
+/whatsapp عبر عميل اختبار Flask في الوضعين. في الوضع غير المتزامن يُقاس أيضاً
+زمن تسليم جميع الردود إلى الخادم البديل وعدد الاتصالات المفتوحة (keep-alive).
+
+التشغيل:
+    python benchmarks/bench_async_reply.py [--requests 2000] [--processing-delay-ms 5] [--stub-delay-ms 20]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+os.environ.pop('ASYNC_REPLY', None)
+
+logging.disable(logging.CRITICAL)
+
+import app
+from async_reply import ReplyDispatcher
+from twilio_rest import TwilioRestTransport
+from twilio_stub import start_stub
+
+MESSAGES = ['مرحبا', 'hello', 'help', 'ما هي حالة الطلب؟', 'random text here']
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+    return pct(0.50), pct(0.99)
+
+
+def run(client, count):
+    latencies = []
+    for i in range(count):
+        form = {'From': f'whatsapp:+9665{i:08d}', 'To': 'whatsapp:+14155238886',
+                'Body': MESSAGES[i % len(MESSAGES)], 'MessageSid': f'SM{time.time_ns()}{i}'}
+        started = time.perf_counter()
+        response = client.post('/whatsapp', data=form)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--processing-delay-ms', type=float, default=0,
+                        help='تأخير مصطنع في المطابقة لمحاكاة معالجة بطيئة')
+    parser.add_argument('--stub-delay-ms', type=float, default=0, help='زمن استجابة Twilio المحاكى')
+    args = parser.parse_args()
+
+    if args.processing_delay_ms:
+        resolve = app.resolve_message
+
+        def slow_resolve(*resolve_args):
+            time.sleep(args.processing_delay_ms / 1000)
+            return resolve(*resolve_args)
+
+        app.resolve_message = slow_resolve
+
+    server, state, url = start_stub(delay=args.stub_delay_ms / 1000)
+    client = app.app.test_client()
+    try:
+        app.reply_dispatcher = None
+        inline = run(client, args.requests)
+
+        transport = TwilioRestTransport(account_sid='ACbench', auth_token='bench', base_url=url)
+        app.reply_dispatcher = ReplyDispatcher(app.handle_routed, transport, workers=args.workers,
+                                               queue_size=args.requests)
+        started = time.perf_counter()
+        queued = run(client, args.requests)
+        acknowledged = time.perf_counter() - started
+        app.reply_dispatcher.join()
+        delivered = time.perf_counter() - started
+        stats = app.reply_dispatcher.stats()
+        app.reply_dispatcher.close()
+        app.archive.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    print(f"{'mode':<10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, samples in (('inline', inline), ('async', queued)):
+        p50, p99 = percentiles(samples)
+        print(f"{name:<10} {p50:>9.3f} {p99:>9.3f}")
+    print(f"\nasync: استلام {args.requests} طلب في {acknowledged:.2f}s، تسليم جميع الردود بعد {delivered:.2f}s "
+          f"({args.requests / delivered:.0f} رد/ث)")
+    print(f"الخادم البديل: {len(state.messages)} رسالة عبر {state.connections} اتصال، {stats}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
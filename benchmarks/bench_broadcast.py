@@ -0,0 +1,128 @@
+"""الإرسال الجماعي مقابل خادم Twilio البديل: الالتزام بحد المعدل، والاستئناف بدون تكرار بعد انقطاع
+
+1. مهمة كاملة بعمّال متعددين وتأخير في الخادم البديل: المعدل الفعلي لا يتجاوز --rate،
+   وعدد الاتصالات لا يتجاوز عدد العمّال.
+2. مهمة ثانية تُشغّل في عملية فرعية تُقتل (SIGKILL) في منتصفها، ثم تُستأنف هنا:
+   لا يصل أي مستلم مرتين، ومن لم يصله شيء هو فقط من سُجّل "غير مؤكد" لحظة الانقطاع.
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/bench_broadcast.py [--recipients 400] [--rate 100] [--workers 8] [--stub-delay-ms 20]
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ.pop('REPLY_TRANSPORT', None)
+
+logging.disable(logging.CRITICAL)
+
+from broadcast import BroadcastJob
+from twilio_rest import TwilioRestTransport
+from twilio_stub import start_stub
+
+FROM = 'whatsapp:+14155238886'
+
+
+def numbers(count, offset=0):
+    return [f'+9665{offset + i:08d}' for i in range(count)]
+
+
+def transport(url, workers):
+    return TwilioRestTransport('ACbench', 'token', url, pool_size=workers)
+
+
+def run_child(job_id, directory, url, workers):
+    BroadcastJob(job_id, directory).run(transport(url, workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=400)
+    parser.add_argument('--rate', type=float, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--stub-delay-ms', type=float, default=20)
+    args = parser.parse_args()
+    directory = os.path.join(TMP, 'broadcasts')
+    failures = []
+
+    server, state, url = start_stub(delay=args.stub_delay_ms / 1000)
+    # اتصالات العملية المقتولة تنقطع أثناء الرد: متوقع، بدون طباعة المكدس
+    server.handle_error = lambda request, client_address: None
+    try:
+        # ---------- 1. المعدل ----------
+        job = BroadcastJob.create('عرض خاص لـ {number}', numbers(args.recipients), FROM,
+                                  rate=args.rate, workers=args.workers, directory=directory)
+        started = time.perf_counter()
+        status = job.run(transport(url, args.workers))
+        elapsed = time.perf_counter() - started
+        achieved = status['sent'] / elapsed
+        print(f"📣 {status['sent']}/{status['total']} خلال {elapsed:.2f}s: {achieved:.1f} رسالة/ث "
+              f"(الحد {args.rate:g})، {state.connections} اتصال")
+        if status['sent'] != args.recipients or len(state.messages) != args.recipients:
+            failures.append('لم تصل جميع الرسائل')
+        # أول فترة تبدأ فوراً، فالمعدل الفعلي لـ N رسالة هو N / ((N-1) / rate) كحد أقصى
+        if achieved > args.rate * args.recipients / (args.recipients - 1) * 1.02:
+            failures.append('المعدل الفعلي تجاوز الحد')
+        if state.connections > args.workers:
+            failures.append('اتصالات أكثر من عدد العمّال')
+
+        # ---------- 2. الانقطاع والاستئناف ----------
+        state.messages.clear()
+        recipients = numbers(args.recipients, offset=args.recipients)
+        job = BroadcastJob.create('تذكير لـ {number}', recipients, FROM,
+                                  rate=args.rate, workers=args.workers, directory=directory)
+        child = multiprocessing.get_context('fork').Process(
+            target=run_child, args=(job.id, directory, url, args.workers))
+        child.start()
+        while len(state.messages) < args.recipients // 2:
+            time.sleep(0.005)
+        os.kill(child.pid, signal.SIGKILL)
+        child.join()
+        before = len(state.messages)
+        interrupted = job.status()
+        print(f"💥 قُتلت العملية بعد {before} رسالة (الحالة: {interrupted['state']})")
+        if interrupted['state'] != 'interrupted':
+            failures.append('حالة المهمة المقتولة ليست interrupted')
+
+        status = job.run(transport(url, args.workers))
+        done, failed, started_set = job.read_progress()
+        uncertain = {recipients[i] for i in started_set - done - failed}
+        received = Counter(message['To'].replace('whatsapp:', '') for message in state.messages)
+        duplicates = [number for number, count in received.items() if count > 1]
+        missing = set(recipients) - set(received)
+        print(f"▶️ الاستئناف: {len(state.messages) - before} رسالة إضافية، {status['sent']} مرسلة، "
+              f"{status['uncertain']} غير مؤكدة، {len(duplicates)} مكررة، {len(missing)} لم تصل")
+        if duplicates:
+            failures.append(f'رسائل مكررة: {duplicates[:5]}')
+        if not missing <= uncertain:
+            failures.append(f'مستلمون لم تصلهم رسالة وليسوا غير مؤكدين: {sorted(missing - uncertain)[:5]}')
+        if status['sent'] + status['uncertain'] != args.recipients:
+            failures.append('مجموع المرسلة وغير المؤكدة لا يساوي عدد المستلمين')
+    finally:
+        server.shutdown()
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ المعدل ضمن الحد والاستئناف بدون إرسال مكرر")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
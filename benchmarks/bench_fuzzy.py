@@ -0,0 +1,108 @@
+"""زمن المرحلة التقريبية (FuzzyIndex) مع 1000 كلمة مفتاحية مقابل ميزانية لكل رسالة
+
+يقيس زمن بناء الفهرس وحجمه، ثم زمن البحث التقريبي وحده لكل رسالة (رسائل بخطأ
+إملائي، ورسائل بدون أي تطابق وهي الحالة الأسوأ لأن كل كلماتها تُفحص)، ونسبة
+تصحيح الأخطاء الإملائية. يخرج بكود 1 إذا تجاوز أي زمن الميزانية.
+
+التشغيل:
+    python benchmarks/bench_fuzzy.py [--keywords 1000] [--budget-us 500] [--max-distance 2]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import FuzzyIndex, KeywordMatcher, normalize
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+ENGLISH_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def make_keywords(count, rng):
+    keywords = {}
+    while len(keywords) < count:
+        letters = ARABIC_LETTERS if len(keywords) % 2 else ENGLISH_LETTERS
+        word = ''.join(rng.choice(letters) for _ in range(rng.randint(4, 10)))
+        keywords[word] = word
+    return list(keywords)
+
+
+def typo(word, rng):
+    """خطأ إملائي واحد: حذف أو استبدال أو إدراج أو تبديل حرفين متجاورين"""
+    letters = ARABIC_LETTERS if word[0] in ARABIC_LETTERS else ENGLISH_LETTERS
+    i = rng.randrange(len(word))
+    kind = rng.randrange(4)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice(letters) + word[i + 1:]
+    if kind == 2:
+        return word[:i] + rng.choice(letters) + word[i:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def per_message_us(function, messages):
+    elapsed = min(timeit.repeat(lambda: [function(m) for m in messages], number=3, repeat=3))
+    return elapsed / (3 * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keywords', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--budget-us', type=float, default=500, help='الحد الأقصى لزمن المرحلة التقريبية لكل رسالة')
+    parser.add_argument('--max-distance', type=int, default=2)
+    parser.add_argument('--min-similarity', type=float, default=0.75)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    keywords = make_keywords(args.keywords, rng)
+    settings = {'max_distance': args.max_distance, 'min_similarity': args.min_similarity, 'min_length': 3}
+
+    started = time.perf_counter()
+    index = FuzzyIndex(keywords, **settings)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"الفهرس: {args.keywords} كلمة، {len(index)} شكل حذف، البناء {build_ms:.1f} ms")
+
+    # رسائل قصيرة بخطأ إملائي، وجمل بخطأ في آخرها، وجمل بدون أي تطابق
+    targets = [rng.choice(keywords) for _ in range(args.messages)]
+    typos = [typo(word, rng) for word in targets]
+    # 12 كلمة: أطول من FUZZY_MAX_TOKENS لقياس الحالة الأسوأ المحدودة
+    filler = [' '.join(''.join(rng.choice(ENGLISH_LETTERS) for _ in range(6)) for _ in range(12))
+              for _ in range(args.messages)]
+    sentences = [' '.join(f.split()[:5] + [t]) for f, t in zip(filler, typos)]
+
+    corrected = sum(index.search(normalize(t)) == keywords.index(w) for t, w in zip(typos, targets))
+    found = sum(index.search(normalize(s)) is not None for s in sentences)
+    print(f"تصحيح الأخطاء: {corrected}/{len(typos)} ({corrected / len(typos):.0%})، داخل جملة: {found}/{len(sentences)}")
+
+    matcher = KeywordMatcher(keywords, fuzzy=settings)
+    plain = KeywordMatcher(keywords)
+    rows = [
+        ('typo word', per_message_us(index.search, [normalize(t) for t in typos])),
+        ('typo sentence', per_message_us(index.search, [normalize(s) for s in sentences])),
+        ('no match (12 words)', per_message_us(index.search, [normalize(f) for f in filler])),
+    ]
+    print(f"\n{'fuzzy stage':<22} {'µs/msg':>9}")
+    for name, value in rows:
+        print(f"{name:<22} {value:>9.1f}")
+
+    print(f"\n{'full match()':<22} {'µs/msg':>9}")
+    print(f"{'without fuzzy':<22} {per_message_us(plain.match, filler):>9.1f}")
+    print(f"{'with fuzzy':<22} {per_message_us(matcher.match, filler):>9.1f}")
+
+    worst = max(value for _, value in rows)
+    if worst > args.budget_us:
+        print(f"\n❌ تجاوز الميزانية: {worst:.1f} µs > {args.budget_us:.0f} µs")
+        return 1
+    print(f"\n✅ ضمن الميزانية ({worst:.1f} µs ≤ {args.budget_us:.0f} µs)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""مقارنة مطابق Aho-Corasick مع الحلقة القديمة في process_message
+
+التشغيل:
+    python benchmarks/bench_matcher.py
+"""
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+ENGLISH_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def legacy_match(responses, message):
+    """الخوارزمية القديمة: مرور للتطابق الكامل ثم مرور للتطابق الجزئي"""
+    message_lower = message.lower().strip()
+    for keyword in responses:
+        if keyword == message_lower:
+            return keyword
+    for keyword in responses:
+        if keyword in message_lower:
+            return keyword
+    return None
+
+
+def make_keywords(count, rng):
+    keywords = {}
+    while len(keywords) < count:
+        letters = ARABIC_LETTERS if len(keywords) % 2 else ENGLISH_LETTERS
+        word = ''.join(rng.choice(letters) for _ in range(rng.randint(5, 10)))
+        keywords[word] = word
+    return keywords
+
+
+def make_messages(keywords, rng, count=200):
+    words = list(keywords)
+    messages = []
+    for i in range(count):
+        filler = ' '.join(''.join(rng.choice(ENGLISH_LETTERS) for _ in range(6)) for _ in range(6))
+        if i % 3 == 0:
+            messages.append(rng.choice(words))                    # تطابق كامل
+        elif i % 3 == 1:
+            messages.append(filler + ' ' + rng.choice(words))     # تطابق جزئي
+        else:
+            messages.append(filler)                               # بدون تطابق
+    return messages
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'keywords':>10} {'legacy µs/msg':>15} {'matcher µs/msg':>15} {'speedup':>9}")
+    for count in (10, 100, 1000):
+        responses = make_keywords(count, rng)
+        messages = make_messages(responses, rng)
+        matcher = KeywordMatcher(responses)
+
+        legacy = min(timeit.repeat(lambda: [legacy_match(responses, m) for m in messages], number=5, repeat=3))
+        compiled = min(timeit.repeat(lambda: [matcher.match(m) for m in messages], number=5, repeat=3))
+
+        per_legacy = legacy / (5 * len(messages)) * 1e6
+        per_compiled = compiled / (5 * len(messages)) * 1e6
+        print(f"{count:>10} {per_legacy:>15.2f} {per_compiled:>15.2f} {per_legacy / per_compiled:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""كلفة فحص حد المعدل مقارنة بكلفة طلب الويب هوك كاملاً
+
+يقيس RateLimiter.allow على جدول mmap مشترك (مع قفل الملف) وعلى جدول خاص
+بالعملية، ثم handle_webhook بدون تحديد للمقارنة.
+
+التشغيل:
+    python benchmarks/bench_rate_limit.py [--senders 10000] [--checks 200000]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# الأرشيف وجدول المعدل في مجلد مؤقت بدلاً من message_logs
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+
+from rate_limit import Limit, RateLimiter
+
+
+def per_call_us(fn, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--senders', type=int, default=10000)
+    parser.add_argument('--checks', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    senders = [f'whatsapp:+9665{rng.randrange(10 ** 8):08d}' for _ in range(args.senders)]
+    calls = [(rng.choice(senders),) for _ in range(args.checks)]
+    limit = Limit(per_minute=60, burst=10)
+
+    try:
+        shared = RateLimiter(path=os.path.join(TMP, '.ratelimit'), default=limit)
+        private = RateLimiter(path='', default=limit)
+        shared_us = per_call_us(shared.allow, calls)
+        private_us = per_call_us(private.allow, calls)
+
+        # الطلب كاملاً بدون تحديد المعدل
+        logging.disable(logging.CRITICAL)
+        import app
+        app.rate_limiter = None
+        values = [({'From': sender, 'Body': rng.choice(['hello', 'مرحبا', 'help', 'random text'])},)
+                  for (sender,) in calls[:20000]]
+        webhook_us = per_call_us(app.handle_webhook, values)
+        app.archive.close()
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    print(f"{'':<28} {'us/call':>9}")
+    print(f"{'allow (mmap + lockf)':<28} {shared_us:>9.2f}")
+    print(f"{'allow (private table)':<28} {private_us:>9.2f}")
+    print(f"{'handle_webhook (no limit)':<28} {webhook_us:>9.2f}")
+    print(f"\nنسبة الفحص المشترك من زمن الطلب: {shared_us / webhook_us * 100:.1f}%")
+    print(f"مقيّد: {shared.throttled} من {args.checks}، إخراج: {shared.evictions}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
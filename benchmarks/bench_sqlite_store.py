@@ -0,0 +1,96 @@
+"""زمن الاستعلامات المفهرسة في مخزن SQLite
+
+التشغيل (10 ملايين سجل افتراضياً؛ يستغرق الإدراج عدة دقائق):
+    python benchmarks/bench_sqlite_store.py --rows 10000000 --db /tmp/messages_bench.db
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_store import SQLiteStore
+
+KEYWORDS = ['مرحبا', 'hello', 'help', 'مساعدة', 'حالة', 'status', 'وقت', 'time', 'شكرا', None]
+WORDS = ['hello', 'مرحبا', 'order', 'طلب', 'help', 'price', 'سعر', 'time', 'thanks', 'شكرا']
+
+
+def populate(store, rows, senders, batch_size=50000):
+    rng = random.Random(7)
+    start = datetime(2026, 1, 1)
+    step = 90 * 24 * 3600 / rows          # توزيع السجلات على 90 يوماً
+    inserted = 0
+    began = time.perf_counter()
+    while inserted < rows:
+        batch = []
+        for i in range(inserted, min(rows, inserted + batch_size)):
+            keyword = rng.choice(KEYWORDS)
+            batch.append({
+                'timestamp': (start + timedelta(seconds=i * step)).isoformat(),
+                'sender': f'whatsapp:+9665{rng.randrange(senders):08d}',
+                'message': ' '.join(rng.choice(WORDS) for _ in range(4)),
+                'response': 'reply',
+                'keyword': keyword,
+                'match_type': 'exact' if keyword else 'default',
+            })
+        store.insert_many(batch)
+        inserted += len(batch)
+    elapsed = time.perf_counter() - began
+    print(f"inserted {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+def measure(name, fn, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - began) * 1000)
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<40} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--senders', type=int, default=200_000)
+    parser.add_argument('--db', default='/tmp/messages_bench.db')
+    parser.add_argument('--reuse', action='store_true', help='استخدام قاعدة بيانات موجودة بدون إعادة الملء')
+    args = parser.parse_args()
+
+    if not args.reuse:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    store = SQLiteStore(args.db)
+    if not args.reuse:
+        populate(store, args.rows, args.senders)
+    print(f"rows in store: {store.count():,}")
+
+    rng = random.Random(11)
+
+    def sender():
+        return f'+9665{rng.randrange(args.senders):08d}'
+
+    measure('sender, newest page', lambda: store.search(sender=sender(), limit=50))
+    measure('sender + date range', lambda: store.search(sender=sender(), date_from='2026-02-01', date_to='2026-02-07'))
+    measure('keyword, newest page', lambda: store.search(keyword=rng.choice(KEYWORDS[:-1]), limit=50))
+    measure('keyword + one day', lambda: store.search(keyword='help', date_from='2026-03-01', date_to='2026-03-01'))
+    measure('one day, newest page', lambda: store.search(date_from='2026-02-15', date_to='2026-02-15'))
+    measure('text contains + one day', lambda: store.search(text='price', date_from='2026-02-15', date_to='2026-02-15'))
+
+    # الصفحة العاشرة عبر المؤشر
+    def tenth_page():
+        cursor = None
+        for _ in range(10):
+            _, cursor = store.search(keyword='hello', before=cursor, limit=50)
+    measure('keyword, 10 pages via cursor', tenth_page, repeat=10)
+
+
+if __name__ == '__main__':
+    main()
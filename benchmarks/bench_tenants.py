@@ -0,0 +1,119 @@
+"""زمن الويب هوك مع 1 إلى 500 مستأجر (رقم مرسل لكل علامة تجارية)
+
+لكل عدد من المستأجرين: ملف قواعد لكل مستأجر في مجلد مؤقت، ثم قياس
+- زمن التحميل الكسول لأول رسالة وذاكرة المستأجر المحمّل (tracemalloc)
+- زمن handle_webhook لكل طلب مع توزيع الرسائل على جميع المستأجرين
+مقارنةً بالتطبيق بدون مستأجرين. يخرج بكود 1 إذا زاد زمن الطلب مع 500 مستأجر
+عن --max-ratio ضعف زمنه مع مستأجر واحد.
+
+التشغيل:
+    python benchmarks/bench_tenants.py [--counts 1,10,100,500] [--requests 20000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = os.path.join(TMP, 'logs')
+os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+os.environ.pop('TENANTS_FILE', None)
+os.environ.pop('ASYNC_REPLY', None)
+
+logging.disable(logging.CRITICAL)
+
+import app
+from tenants import Tenant, TenantRouter
+
+WORDS = ['price', 'hours', 'menu', 'order', 'status', 'delivery', 'refund', 'support', 'location', 'offers',
+         'مرحبا', 'الاسعار', 'الطلب', 'التوصيل', 'العروض', 'الدعم', 'الموقع', 'الحجز', 'الفروع', 'شكرا']
+
+
+def no_save(*args, **kwargs):
+    pass
+
+
+def make_tenants(count, directory):
+    tenants = []
+    for i in range(count):
+        path = os.path.join(directory, f'tenant_{i}.json')
+        rules = [{'keyword': f'{word}', 'reply': f'Brand {i}: {word} reply ' * 5} for word in WORDS]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'default': f'Brand {i} default reply', 'rules': rules}, f, ensure_ascii=False)
+        tenants.append(Tenant(f'brand-{i}', f'+1555{i:07d}', path))
+    return tenants
+
+
+def make_requests(numbers, count, rng):
+    return [{'From': f'whatsapp:+9665{rng.randrange(10 ** 8):08d}', 'To': f'whatsapp:{rng.choice(numbers)}',
+             'Body': rng.choice(WORDS + ['random question here'])} for _ in range(count)]
+
+
+def per_request_us(requests):
+    started = time.perf_counter()
+    for values in requests:
+        app.handle_webhook(values, no_save)
+    return (time.perf_counter() - started) / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', default='1,10,100,500')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--max-ratio', type=float, default=1.5)
+    args = parser.parse_args()
+    counts = [int(c) for c in args.counts.split(',')]
+    rng = random.Random(42)
+
+    try:
+        app.tenants = None
+        baseline = per_request_us(make_requests(['+14155238886'], args.requests, rng))
+        print(f"{'tenants':>8} {'load ms':>9} {'KB/tenant':>10} {'µs/request':>11}")
+        print(f"{'none':>8} {'-':>9} {'-':>10} {baseline:>11.2f}")
+
+        results = {}
+        for count in counts:
+            directory = os.path.join(TMP, f'tenants_{count}')
+            os.makedirs(directory)
+            router = TenantRouter(make_tenants(count, directory), idle_seconds=0)
+            app.tenants = router
+
+            # التحميل الكسول: أول رسالة لكل مستأجر
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            for tenant in router.tenants.values():
+                app.handle_webhook({'From': 'whatsapp:+966500000000', 'To': 'whatsapp:' + tenant.number,
+                                    'Body': 'price'}, no_save)
+            load_ms = (time.perf_counter() - started) / count * 1000
+            kb = (tracemalloc.get_traced_memory()[0] - before) / count / 1024
+            tracemalloc.stop()
+
+            requests = make_requests(list(router.tenants), args.requests, rng)
+            per_request_us(requests[:1000])
+            results[count] = per_request_us(requests)
+            print(f"{count:>8} {load_ms:>9.2f} {kb:>10.1f} {results[count]:>11.2f}")
+    finally:
+        app.archive.close()
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    ratio = results[counts[-1]] / results[counts[0]]
+    print(f"\nالنسبة ({counts[-1]} ÷ {counts[0]}): {ratio:.2f}")
+    if ratio > args.max_ratio:
+        print(f"❌ زمن الطلب يزداد مع عدد المستأجرين (الحد {args.max_ratio})")
+        return 1
+    print("✅ زمن الطلب ثابت تقريباً مع عدد المستأجرين")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""مجموعة قياس لمسار /whatsapp: أين يذهب وقت الطلب؟
+
+المراحل: is_allowed_number، process_message (تام/جزئي/افتراضي، عربي وإنجليزي)،
+save_message_log عند أحجام يوم 0 و10k و100k، توليد TwiML (MessagingResponse
+والذاكرة المسبقة)، ثم الطلب كاملاً عبر عميل اختبار Flask أو خادم gunicorn محلي.
+
+التشغيل:
+    python benchmarks/bench_webhook.py --output results.json
+    python benchmarks/bench_webhook.py --baseline results.json --threshold 15
+    python benchmarks/bench_webhook.py --url http://127.0.0.1:10000 --only end_to_end
+
+مع --baseline يفشل الأمر (رمز خروج 1) إذا تباطأت أي مرحلة أكثر من النسبة المحددة.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import http.client
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# الأرشيف في مجلد مؤقت، وبدون تحديد معدل حتى لا يُقيَّد المرسل المتكرر
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+os.environ.pop('RATE_LIMITS_FILE', None)
+os.environ.pop('DEDUP_SHARED_PATH', None)
+
+logging.disable(logging.CRITICAL)
+
+import app
+from message_archive import day_path
+from twilio.twiml.messaging_response import MessagingResponse
+
+ALLOWED_SENDER = 'whatsapp:+966500000000'
+UNKNOWN_SENDER = 'whatsapp:+966511111111'
+
+MESSAGES = {
+    'exact_ar': 'مرحبا',
+    'exact_en': 'hello',
+    'partial_ar': 'السلام عليكم، ما هي حالة الطلب؟',
+    'partial_en': 'hi, I need some help with my order',
+    'default_ar': 'رسالة لا تطابق أي كلمة مفتاحية',
+    'default_en': 'this message matches no keyword at all',
+}
+
+DAY_SIZES = (0, 10_000, 100_000)
+
+
+# ============== القياس ==============
+
+def measure(fn, iterations, warmup):
+    """زمن كل استدعاء بالنانوثانية بعد جولة تسخين"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        started = clock()
+        fn()
+        samples.append(clock() - started)
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    count = len(samples)
+
+    def pct(p):
+        return samples[min(count - 1, int(count * p))] / 1000
+
+    total = sum(samples)
+    return {
+        'iterations': count,
+        'p50_us': pct(0.50),
+        'p95_us': pct(0.95),
+        'p99_us': pct(0.99),
+        'mean_us': total / count / 1000,
+        'ops_per_sec': count / (total / 1e9) if total else float('inf'),
+    }
+
+
+def seed_day(size):
+    """جزء هذه العملية من ملف اليوم الحالي بعدد سجلات محدد قبل قياس الحفظ"""
+    app.archive.flush()
+    path = day_path(datetime.now().strftime('%Y-%m-%d'), TMP, app.archive.shard)
+    record = json.dumps({
+        'sender': ALLOWED_SENDER, 'message': 'مرحبا', 'response': 'أهلاً وسهلاً!',
+        'keyword': 'مرحبا', 'match_type': 'exact', 'timestamp': datetime.now().isoformat(),
+    }, ensure_ascii=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(size):
+            f.write(record + '\n')
+
+
+# ============== المراحل ==============
+
+def stage_allowlist(iterations, warmup):
+    yield 'is_allowed_number/listed', measure(lambda: app.is_allowed_number(ALLOWED_SENDER), iterations, warmup)
+    yield 'is_allowed_number/unknown', measure(lambda: app.is_allowed_number(UNKNOWN_SENDER), iterations, warmup)
+
+
+def stage_match(iterations, warmup):
+    for name, message in MESSAGES.items():
+        yield f'process_message/{name}', measure(lambda: app.process_message(message), iterations, warmup)
+
+
+def stage_save(iterations, warmup):
+    args = (ALLOWED_SENDER, 'مرحبا', 'أهلاً وسهلاً!', 'مرحبا', 'exact')
+
+    def save_and_flush():
+        app.save_message_log(*args)
+        app.archive.flush()
+
+    for size in DAY_SIZES:
+        seed_day(size)
+        # الإضافة إلى الطابور (ما يدفعه الطلب) ثم الكتابة الفعلية إلى القرص
+        yield f'save_message_log/day_{size}', measure(lambda: app.save_message_log(*args), iterations, warmup)
+        seed_day(size)
+        yield f'save_message_log+flush/day_{size}', measure(save_and_flush, iterations // 4 or 1, warmup // 4)
+
+
+def stage_render(iterations, warmup):
+    text = app.process_message('hello')
+
+    def messaging_response():
+        resp = MessagingResponse()
+        resp.message(text)
+        return str(resp)
+
+    yield 'twiml/MessagingResponse', measure(messaging_response, iterations, warmup)
+    yield 'twiml/cache', measure(lambda: app.twiml_cache.render(text), iterations, warmup)
+
+
+def stage_end_to_end(iterations, warmup, url=None):
+    forms = [{'From': ALLOWED_SENDER, 'Body': message} for message in MESSAGES.values()]
+    counter = iter(range(10 ** 12))
+
+    if url is None:
+        client = app.app.test_client()
+
+        def request():
+            response = client.post('/whatsapp', data=forms[next(counter) % len(forms)])
+            assert response.status_code == 200
+
+        yield 'end_to_end/test_client', measure(request, iterations, warmup)
+        return
+
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+    def request():
+        conn.request('POST', '/whatsapp', urlencode(forms[next(counter) % len(forms)]), headers)
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200
+        # العمّال المتزامنة في gunicorn تغلق الاتصال بعد كل رد
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+
+    yield 'end_to_end/http', measure(request, iterations, warmup)
+
+
+STAGES = {
+    'allowlist': stage_allowlist,
+    'match': stage_match,
+    'save': stage_save,
+    'render': stage_render,
+    'end_to_end': stage_end_to_end,
+}
+
+
+# ============== المقارنة ==============
+
+def compare(results, baseline, threshold, metric):
+    """المراحل التي تباطأت أكثر من threshold% مقارنة بالأساس"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get(metric):
+            continue
+        change = (result[metric] - base[metric]) / base[metric] * 100
+        if change > threshold:
+            regressions.append((name, base[metric], result[metric], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--only', action='append', choices=list(STAGES), help='تشغيل مراحل محددة فقط')
+    parser.add_argument('--url', help='قياس الطلب الكامل ضد خادم يعمل (مثل gunicorn) بدلاً من عميل الاختبار')
+    parser.add_argument('--output', help='حفظ النتائج JSON')
+    parser.add_argument('--baseline', help='نتائج سابقة JSON للمقارنة')
+    parser.add_argument('--threshold', type=float, default=10.0, help='نسبة التباطؤ المسموحة %%')
+    parser.add_argument('--metric', default='p50_us', choices=['p50_us', 'p95_us', 'p99_us', 'mean_us'])
+    args = parser.parse_args()
+
+    results = {}
+    try:
+        print(f"{'stage':<34} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'ops/s':>11}")
+        for stage, run in STAGES.items():
+            if args.only and stage not in args.only:
+                continue
+            extra = {'url': args.url} if stage == 'end_to_end' else {}
+            for name, result in run(args.iterations, args.warmup, **extra):
+                results[name] = result
+                print(f"{name:<34} {result['p50_us']:>9.2f} {result['p95_us']:>9.2f} "
+                      f"{result['p99_us']:>9.2f} {result['ops_per_sec']:>11.0f}")
+        app.archive.close()
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 تم حفظ النتائج في {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.metric)
+        for name, before, after, change in regressions:
+            print(f"❌ {name}: {before:.2f} → {after:.2f} us ({change:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"✅ لا تباطؤ أكثر من {args.threshold:g}% في {args.metric}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
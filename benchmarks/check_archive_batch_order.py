@@ -0,0 +1,122 @@
+"""فحص ترتيب أجزاء الأرشيف عبر الدفعات: خيوط متزامنة تضيف والدفعات صغيرة ومتداخلة
+
+كاتبان (عقدتان) على نفس المجلد، ولكل منهما --threads خيوط تضيف السجلات بأقصى سرعة مع
+تبديل خيوط متكرر (sys.setswitchinterval) ودفعات من --batch-size سجلات، وجزء من السجلات
+لأرشيف مستأجر في مجلد آخر داخل نفس الدفعات. بعد الانتهاء يُتحقق أن:
+- كل ملف جزء مرتب زمنياً سطراً بسطر (وليس داخل كل دفعة فقط)
+- read_day مرتبة زمنياً بلا فقد ولا تكرار
+- الصفحات العكسية عبر المؤشرات (بعدة أحجام) تساوي عكس القراءة الأمامية
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/check_archive_batch_order.py [--threads 6] [--records 400] [--batch-size 3]
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ.pop('ARCHIVE_SQLITE', None)
+
+logging.disable(logging.CRITICAL)
+
+from message_archive import ArchiveWriter, day_shards, read_day, read_day_reverse
+
+DAY = '2024-05-20'
+PAGE_SIZES = (1, 13, 100)
+
+
+def write_concurrently(writers, tenant_dir, threads, records):
+    def worker(writer, number):
+        for seq in range(records):
+            directory = tenant_dir if seq % 5 == 0 else None
+            writer.append({'sender': f'+9665{number:08d}', 'message': f'رسالة {seq}', 'worker': number,
+                           'seq': seq, 'date': DAY}, directory)
+
+    pool = [threading.Thread(target=worker, args=(writer, i * threads + t))
+            for i, writer in enumerate(writers) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    for writer in writers:
+        writer.close()
+
+
+def paged_reverse(directory, page_size):
+    records, cursor = [], None
+    while True:
+        page = []
+        for item in read_day_reverse(DAY, cursor, directory):
+            page.append(item)
+            if len(page) == page_size:
+                break
+        if not page:
+            return records
+        records.extend(record for _, record in page)
+        cursor = page[-1][0]
+
+
+def check_directory(label, directory, expected, failures):
+    live, _ = day_shards(DAY, directory)
+    for shard, path in live.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            stamps = [json.loads(line)['timestamp'] for line in f]
+        if any(a > b for a, b in zip(stamps, stamps[1:])):
+            failures.append(f'{label}: الجزء {shard} غير مرتب زمنياً عبر الدفعات')
+
+    forward = list(read_day(DAY, directory))
+    ids = {(record['worker'], record['seq']) for record in forward}
+    print(f"📖 {label}: {len(forward)} سجل في {len(live)} جزء")
+    if len(forward) != expected or len(ids) != expected:
+        failures.append(f'{label}: {len(forward)} قراءة، {len(ids)} فريد من {expected}')
+    if any(a['timestamp'] > b['timestamp'] for a, b in zip(forward, forward[1:])):
+        failures.append(f'{label}: read_day غير مرتبة زمنياً')
+    for size in PAGE_SIZES:
+        if paged_reverse(directory, size) != forward[::-1]:
+            failures.append(f'{label}: الصفحات العكسية بحجم {size} لا تساوي عكس القراءة الأمامية')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=6, help='خيوط لكل كاتب')
+    parser.add_argument('--records', type=int, default=400, help='سجلات لكل خيط')
+    parser.add_argument('--batch-size', type=int, default=3)
+    args = parser.parse_args()
+    failures = []
+
+    sys.setswitchinterval(1e-6)
+    try:
+        tenant_dir = os.path.join(TMP, 'tenant')
+        writers = [ArchiveWriter(TMP, batch_size=args.batch_size, flush_interval=0.001, fsync='never', node=node)
+                   for node in ('node-a', 'node-b')]
+        write_concurrently(writers, tenant_dir, args.threads, args.records)
+        batches = sum(writer.batches for writer in writers)
+        print(f"✍️ {len(writers)} كاتب × {args.threads} خيوط × {args.records} سجل في {batches} دفعة")
+
+        total = len(writers) * args.threads * args.records
+        tenant = len(writers) * args.threads * len(range(0, args.records, 5))
+        check_directory('الأرشيف الرئيسي', TMP, total - tenant, failures)
+        check_directory('أرشيف المستأجر', tenant_dir, tenant, failures)
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ كل جزء مرتب زمنياً عبر الدفعات، والدمج والمؤشرات العكسية متطابقة")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""فحص ذاتي للضغط: اليوم يُقرأ بعد الضغط كما كان قبله تماماً (بدون الاعتماد على message_logs/)
+
+يُنشئ سجلات اختبار في مجلد مؤقت لكل ترميز متوفر (gzip، وzstd إذا ثُبّت zstandard):
+- يوم كامل: ملف قديم (مصفوفة JSON) + عدة أجزاء متداخلة زمنياً من عقدتين، وجزء آخره سطر
+  غير مكتمل (انقطاع أثناء الكتابة)، وعدد سجلات لا يملأ الكتلة الأخيرة (--block-records)
+- يوم بأجزاء فقط، ويوم بملف قديم فقط
+ثم يضغط كل يوم ويقارن read_day والصفحات العكسية عبر المؤشرات (بعدة أحجام صفحات) قبل الضغط
+وبعده، ثم بعد كتابة متأخرة في جزء حي جديد، ثم بعد إعادة الضغط بالترميز الآخر.
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/check_compaction_roundtrip.py [--records 500] [--block-records 64]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+
+logging.disable(logging.CRITICAL)
+
+from message_archive import day_path, legacy_day_path, read_day, read_day_reverse
+from log_compaction import compact_day
+from segments import available_codecs, find_segment
+
+DAYS = ('2024-03-01', '2024-03-02', '2024-03-03')
+SHARDS = ('node-a-101', 'node-a-102', 'node-b-201')
+PAGE_SIZES = (1, 7, 50)
+
+
+def record(day, moment, source, seq):
+    return {'sender': f'+9665{seq:08d}', 'message': f'رسالة {seq} من {source}', 'response': 'رد "تجريبي" <&>',
+            'keyword': None, 'match_type': 'default', 'timestamp': moment.isoformat(), 'date': day,
+            'time': moment.strftime('%H:%M:%S')}
+
+
+def write_fixture(directory, records, rng, legacy=True, shards=True):
+    """ملفات يوم واحد أو أكثر؛ الطوابع الزمنية متزايدة داخل كل جزء ومتداخلة بين الأجزاء"""
+    os.makedirs(directory, exist_ok=True)
+    for day in DAYS:
+        start = datetime.fromisoformat(day + 'T08:00:00')
+        day_legacy = legacy and day != DAYS[1]
+        day_shards = shards and day != DAYS[2]
+        if day_legacy:
+            entries = [record(day, start + timedelta(seconds=i), 'legacy', i) for i in range(records // 4)]
+            with open(legacy_day_path(day, directory), 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+        if not day_shards:
+            continue
+        moment = start + timedelta(hours=1)
+        lines = {shard: [] for shard in SHARDS}
+        for seq in range(records):
+            moment += timedelta(milliseconds=rng.randint(0, 900))
+            shard = rng.choice(SHARDS)
+            lines[shard].append(json.dumps(record(day, moment, shard, seq), ensure_ascii=False))
+        for shard, shard_lines in lines.items():
+            with open(day_path(day, directory, shard), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(shard_lines) + '\n')
+        # آخر سطر في الجزء الأخير قُطع أثناء الكتابة
+        with open(day_path(day, directory, SHARDS[-1]), 'a', encoding='utf-8') as f:
+            f.write('{"sender": "+96650000", "message": "غير مكت')
+
+
+def paged_reverse(day, directory, page_size):
+    records, cursor = [], None
+    while True:
+        page = []
+        for item in read_day_reverse(day, cursor, directory):
+            page.append(item)
+            if len(page) == page_size:
+                break
+        if not page:
+            return records
+        records.extend(item for _, item in page)
+        cursor = page[-1][0]
+
+
+def compare(label, directory, expected, failures):
+    """read_day والصفحات العكسية لكل يوم مقابل القراءة المتوقعة"""
+    for day in DAYS:
+        forward = list(read_day(day, directory))
+        problems = []
+        if forward != expected[day]:
+            problems.append(f'read_day {len(forward)}≠{len(expected[day])}')
+        for size in PAGE_SIZES:
+            if paged_reverse(day, directory, size) != expected[day][::-1]:
+                problems.append(f'صفحات عكسية بحجم {size}')
+        print(f"{'❌' if problems else '✅'} {label} {day}: {len(forward)} سجل {'، '.join(problems)}")
+        failures.extend(f'{label} {day}: {problem}' for problem in problems)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--block-records', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    if args.records % args.block_records == 0:
+        # الكتلة الأخيرة يجب أن تكون ناقصة
+        args.records += 1
+    codecs = available_codecs()
+    if 'zstd' not in codecs:
+        print("ℹ️ zstandard غير مثبت: يُفحص gzip فقط")
+    failures = []
+
+    try:
+        for codec in codecs:
+            directory = os.path.join(TMP, codec)
+            write_fixture(directory, args.records, random.Random(args.seed))
+            expected = {day: list(read_day(day, directory)) for day in DAYS}
+            if any(not records for records in expected.values()):
+                failures.append('سجلات الاختبار فارغة')
+            compare(f'{codec} قبل الضغط', directory, expected, failures)
+
+            for day in DAYS:
+                compact_day(day, directory, codec, args.block_records)
+                if find_segment(day, directory)[1] != codec:
+                    failures.append(f'{codec} {day}: لم يُنشأ المقطع')
+            compare(f'{codec} بعد الضغط', directory, expected, failures)
+
+            # كتابة متأخرة بعد الضغط: جزء حي جديد يُقرأ بعد المقطع
+            late = datetime.fromisoformat(DAYS[0] + 'T23:00:00')
+            late_records = [record(DAYS[0], late + timedelta(seconds=i), 'late', i) for i in range(5)]
+            with open(day_path(DAYS[0], directory, 'node-c-301'), 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(r, ensure_ascii=False) + '\n' for r in late_records)
+            expected[DAYS[0]] = expected[DAYS[0]] + late_records
+            compare(f'{codec} + كتابة متأخرة', directory, expected, failures)
+
+            for other in codecs:
+                if other == codec:
+                    continue
+                for day in DAYS:
+                    compact_day(day, directory, other, args.block_records)
+                compare(f'{codec}→{other}', directory, expected, failures)
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ القراءة قبل الضغط وبعده متطابقة")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""فحص منع التكرار أثناء المعالجة: إعادة محاولة Twilio تصل والرسالة الأصلية ما زالت تُعالج
+
+لكل من الذاكرة المحلية وملف SQLite المشترك: طلب أصلي بطيء (معالجة مصطنعة بطول --slow-ms)
+ومعه --retries إعادة محاولة بنفس MessageSid في خيوط متزامنة. يجب أن:
+- تُعالج الرسالة وتُؤرشف مرة واحدة فقط
+- تأخذ إعادات المحاولة نفس بايتات الرد (تنتظر الرد المحفوظ)، أو استلاماً فارغاً بعد المهلة
+- يظهر العدّ في whatsapp_dedup_lookups_total على /metrics
+- يُلغى الحجز عند رد لا يُحفظ (رد خطأ)، فتُعالج إعادة المحاولة التالية من جديد
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/check_dedup_inflight.py [--retries 5] [--slow-ms 300]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ.pop('ASYNC_REPLY', None)
+os.environ.pop('RATE_LIMIT_PER_MINUTE', None)
+
+logging.disable(logging.CRITICAL)
+
+import app
+from dedup import DedupCache, SharedDedupCache
+from twiml import EMPTY_RESPONSE
+
+real_handle_incoming = app.handle_incoming
+
+
+def run_case(cache, retries, slow, sid):
+    app.dedup_cache = cache
+    processed = []
+
+    def slow_handle_incoming(sender, message, save=None, tenant=None):
+        processed.append(message)
+        time.sleep(slow)
+        return real_handle_incoming(sender, message, lambda *args, **kwargs: None, tenant)
+
+    app.handle_incoming = slow_handle_incoming
+    values = {'MessageSid': sid, 'From': 'whatsapp:+966500000000', 'Body': 'hello', 'To': ''}
+    results = [None] * (retries + 1)
+
+    def request(i):
+        results[i] = app.handle_webhook(values)
+
+    original = threading.Thread(target=request, args=(0,))
+    original.start()
+    time.sleep(slow / 5)
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(1, retries + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in [original, *threads]:
+        thread.join()
+    app.handle_incoming = real_handle_incoming
+    return processed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--slow-ms', type=float, default=300)
+    args = parser.parse_args()
+    slow = args.slow_ms / 1000
+    failures = []
+
+    try:
+        shared_path = os.path.join(TMP, 'dedup.db')
+        caches = [('memory', lambda wait=slow * 4: DedupCache(wait_seconds=wait)),
+                  ('shared', lambda wait=slow * 4: SharedDedupCache(shared_path, wait_seconds=wait))]
+        for mode, factory in caches:
+            processed, results = run_case(factory(), args.retries, slow, sid=f'SM-{mode}-1')
+            same = sum(result == results[0] for result in results[1:])
+            print(f"🔁 {mode}: معالجة {len(processed)} مرة، {same}/{args.retries} إعادة أخذت نفس الرد")
+            if len(processed) != 1:
+                failures.append(f'{mode}: الرسالة عولجت {len(processed)} مرات')
+            if same != args.retries:
+                failures.append(f'{mode}: إعادات المحاولة لم تأخذ الرد المحفوظ')
+
+            processed, results = run_case(factory(slow / 10), args.retries, slow, sid=f'SM-{mode}-2')
+            empty = sum(result == EMPTY_RESPONSE for result in results[1:])
+            print(f"⌛ {mode} بعد انتهاء المهلة: معالجة {len(processed)} مرة، {empty}/{args.retries} استلام فارغ")
+            if len(processed) != 1 or empty != args.retries:
+                failures.append(f'{mode}: انتهاء مهلة الانتظار أعاد المعالجة أو لم يرجع استلاماً فارغاً')
+
+            cache = factory()
+            app.dedup_cache = cache
+            app.handle_incoming = lambda *args, **kwargs: app.ERROR_REPLY
+            app.handle_webhook({'MessageSid': f'SM-{mode}-3', 'From': 'whatsapp:+966500000000', 'Body': 'x'})
+            app.handle_incoming = real_handle_incoming
+            released = cache.claim(f'SM-{mode}-3') is None
+            print(f"🔓 {mode}: الحجز {'أُلغي' if released else 'بقي'} بعد رد الخطأ")
+            if not released:
+                failures.append(f'{mode}: رد الخطأ لم يُلغِ الحجز')
+
+        metrics = app.metrics_registry.render()
+        lines = [line for line in metrics.splitlines() if line.startswith('whatsapp_dedup_lookups_total{')]
+        print('📈 ' + ' | '.join(lines))
+        if not any('result="pending"' in line for line in lines):
+            failures.append('whatsapp_dedup_lookups_total لا يعرض الحالة pending')
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ إعادة المحاولة أثناء المعالجة لا تعيد معالجة الرسالة")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""فحص إعادة المحاولة في twilio_rest: لا إعادة إرسال بعد وصول الطلب إلى الخادم
+
+خادم محلي بسيط بأربعة سلوكيات (حسب المسار):
+- /drop:   يقرأ الطلب كاملاً ثم يغلق الاتصال بدون رد → uncertain، محاولة واحدة فقط
+- /flaky:  503 في أول طلب ثم 201 → إعادة محاولة واحدة ناجحة
+- /idle:   201 ثم يغلق الاتصال بعد الرد → الطلب التالي على اتصال جديد بدون خطأ أو تكرار
+- ثم منفذ مغلق: فشل قبل الإرسال → قابل للإعادة وليس uncertain
+وأخيراً مهمة إرسال جماعي على /drop: المستلمون "غير مؤكدين" وليسوا فاشلين، ولا يُعادون عند الاستئناف.
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/check_send_retry.py
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import logging
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ.pop('REPLY_TRANSPORT', None)
+
+logging.disable(logging.CRITICAL)
+
+from broadcast import BroadcastJob
+from twilio_rest import TransportError, TwilioRestTransport, send_with_retry
+
+FROM = 'whatsapp:+14155238886'
+
+
+def start_server():
+    received = Counter()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            mode = self.path.split('/')[1]
+            with lock:
+                received[mode] += 1
+                count = received[mode]
+            if mode == 'drop':
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            if mode == 'flaky' and count == 1:
+                return self._reply(503)
+            self._reply(201)
+            if mode == 'idle':
+                self.close_connection = True
+
+        def _reply(self, status):
+            body = json.dumps({'sid': 'SM1'}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def transport(url, mode):
+    sender = TwilioRestTransport('ACcheck', 'token', url, pool_size=2, timeout=5)
+    sender.path = f'/{mode}/Messages.json'
+    return sender
+
+
+def attempt(sender):
+    try:
+        return send_with_retry(sender, 'whatsapp:+966500000001', FROM, 'مرحبا', retries=3, backoff=0.01), None
+    except TransportError as e:
+        return None, e
+
+
+def main():
+    server, received, url = start_server()
+    failures = []
+    try:
+        result, error = attempt(transport(url, 'drop'))
+        print(f"📵 انقطاع بعد الإرسال: {received['drop']} طلب، uncertain={getattr(error, 'uncertain', None)}")
+        if error is None or not error.uncertain or received['drop'] != 1:
+            failures.append('انقطاع بعد الإرسال أُعيد أو لم يُعلَّم uncertain')
+
+        result, error = attempt(transport(url, 'flaky'))
+        print(f"🔁 503 ثم 201: {received['flaky']} طلب، محاولات إضافية={result and result[1]}")
+        if error is not None or received['flaky'] != 2:
+            failures.append('رد 503 لم يُعَد مرة واحدة')
+
+        sender = transport(url, 'idle')
+        results = []
+        for _ in range(3):
+            results.append(attempt(sender))
+            # مهلة خمول: إغلاق الخادم يصل قبل الطلب التالي (كمهلة keep-alive في الخادم الحقيقي)
+            time.sleep(0.1)
+        print(f"💤 اتصال خامل أغلقه الخادم: {received['idle']} طلب لـ 3 رسائل")
+        if any(error for _, error in results) or received['idle'] != 3:
+            failures.append('الاتصال الخامل المغلق سبب خطأً أو تكراراً')
+
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+        closed.close()
+        try:
+            transport(f'http://127.0.0.1:{port}', 'refused').send('whatsapp:+966500000001', FROM, 'x')
+            error = None
+        except TransportError as e:
+            error = e
+        print(f"🚫 منفذ مغلق: retryable={getattr(error, 'retryable', None)}، uncertain={getattr(error, 'uncertain', None)}")
+        if error is None or not error.retryable or error.uncertain:
+            failures.append('فشل الاتصال قبل الإرسال ليس قابلاً للإعادة')
+
+        directory = os.path.join(TMP, 'broadcasts')
+        recipients = [f'+9665{i:08d}' for i in range(5)]
+        job = BroadcastJob.create('تذكير {number}', recipients, FROM, rate=100, workers=2, directory=directory)
+        before = received['drop']
+        status = job.run(transport(url, 'drop'))
+        first = received['drop'] - before
+        resumed = job.run(transport(url, 'drop'))
+        print(f"📣 مهمة على /drop: {first} طلب، {status['uncertain']} غير مؤكدة، {status['failed']} فاشلة؛ "
+              f"الاستئناف: {received['drop'] - before - first} طلب إضافي")
+        if status['uncertain'] != len(recipients) or status['failed'] or first != len(recipients):
+            failures.append('المهمة لم تسجل المستلمين كغير مؤكدين')
+        if received['drop'] - before != first or resumed['uncertain'] != len(recipients):
+            failures.append('الاستئناف أعاد إرسال رسائل غير مؤكدة')
+    finally:
+        server.shutdown()
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ لا إعادة إرسال بعد وصول الطلب، وإعادة المحاولة للأخطاء الآمنة فقط")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
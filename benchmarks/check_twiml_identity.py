@@ -0,0 +1,85 @@
+"""فحص تطابق TwiML: بايتات TwimlCache.render مطابقة تماماً لـ str(MessagingResponse())
+
+لكل نص: المسار المخزن (بعد rebuild) والمسار السريع غير المخزن (render_message) مقابل
+MessagingResponse().message(text) من مكتبة twilio. النصوص تشمل:
+- نصاً عادياً ومسافات وأسطراً متعددة
+- محارف XML الخاصة (& و < و > و " و ') ونصاً مُهرباً مسبقاً (&amp;)
+- العربية والرموز التعبيرية، والنص الفارغ
+- جميع ردود التطبيق المولدة مسبقاً وردوده الديناميكية كما تُحسب الآن
+وأخيراً EMPTY_RESPONSE مقابل str(MessagingResponse()) بدون رسائل.
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/check_twiml_identity.py
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+
+logging.disable(logging.CRITICAL)
+
+from twilio.twiml.messaging_response import MessagingResponse
+
+from twiml import EMPTY_RESPONSE, TwimlCache, render_message, verify
+
+CASES = {
+    'نص عادي': ['hello', 'Hello, World!', ' ', '  مسافات  ', 'line one\nline two', 'سطر\r\nثانٍ\tبعد مسافة'],
+    'محارف XML': ['a & b', '<b>bold</b>', 'x > y', '"quoted"', "it's", 'a & b <c> "d" \'e\'',
+                  '&amp; &lt; مُهرب مسبقاً', ']]>', '<?xml version="1.0"?>'],
+    'العربية': ['مرحباً بك! كيف يمكنني مساعدتك؟', 'السعر: ١٠٠ ريال & التوصيل مجاني',
+                'عذراً، حدث خطأ <مؤقت>', 'نص عربي مع English مختلط'],
+    'رموز تعبيرية': ['🌟', '⏳ انتظر قليلاً', '👍🏽 تم', '⚠️ تحذير & تنبيه'],
+    'فارغ': [''],
+}
+
+
+def check(label, texts, failures):
+    cache = TwimlCache()
+    cache.rebuild(texts)
+    cached = verify(texts, cache)
+    uncached = verify(texts, TwimlCache())
+    direct = [text for text in texts if render_message(text) != cache.render(text)]
+    problems = len(set(cached) | set(uncached) | set(direct))
+    print(f"{'❌' if problems else '✅'} {label}: {len(texts) - problems}/{len(texts)} مطابق")
+    failures.extend(f'{label} (مخزن): {text!r}' for text in cached)
+    failures.extend(f'{label} (غير مخزن): {text!r}' for text in uncached)
+    failures.extend(f'{label} (render_message ≠ المخزن): {text!r}' for text in direct)
+
+
+def main():
+    failures = []
+    try:
+        for label, texts in CASES.items():
+            check(label, texts, failures)
+
+        # ردود التطبيق كما يولدها مسبقاً، والديناميكية كما تُحسب الآن
+        from app import registry, twiml_cache as app_cache
+        texts = list(app_cache)
+        texts += [reply() for reply in registry.current.replies.values() if callable(reply)]
+        failed = verify(texts, app_cache)
+        print(f"{'❌' if failed else '✅'} ردود التطبيق: {len(texts) - len(failed)}/{len(texts)} مطابق")
+        failures.extend(f'ردود التطبيق: {text!r}' for text in failed)
+
+        if EMPTY_RESPONSE != str(MessagingResponse()).encode('utf-8'):
+            failures.append('EMPTY_RESPONSE يختلف عن MessagingResponse بدون رسائل')
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ TwiML مطابق لـ MessagingResponse بايتاً ببايت")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""فحص معالجات الإشارات في عمّال gunicorn بعد fork (serve.py مع preload_app)
+
+يشغّل الخادم بعامل واحد، ثم يرسل إلى العامل:
+- SIGUSR2: يجب أن يبقى العامل حياً ويُكتب ملف تحليل في PROFILE_DIR
+- SIGHUP:  يجب أن يبقى العامل حياً (إعادة تحميل القواعد وليس إنهاء العامل)
+يخرج بكود 1 إذا أُنهي العامل أو لم يُكتب التحليل.
+
+التشغيل:
+    python benchmarks/check_worker_signals.py [--port 18090]
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_pid(url, timeout=20.0):
+    """pid العامل الذي يجيب على /health (بعد أن يصبح جاهزاً)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=2) as response:
+                return json.load(response)['readiness']['pid']
+        except OSError:
+            time.sleep(0.2)
+    return None
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=18090)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, ARCHIVE_DIR=tmp, PROFILE_SIGNAL_SECONDS='0.5', RATE_LIMIT_PER_MINUTE='0')
+    server = subprocess.Popen([sys.executable, 'serve.py', '--workers', '1', '--bind', f'127.0.0.1:{args.port}'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{args.port}'
+    failures = []
+    try:
+        pid = worker_pid(url)
+        if pid is None:
+            print("❌ الخادم لم يصبح جاهزاً")
+            return 1
+
+        os.kill(pid, signal.SIGUSR2)
+        time.sleep(1.5)
+        profiles = glob.glob(os.path.join(tmp, '.profiles', f'profile_{pid}_*.folded'))
+        print(f"🔬 SIGUSR2 → العامل {pid}: {'حي' if alive(pid) else 'أُنهي'}، {len(profiles)} ملف تحليل")
+        if not alive(pid):
+            failures.append('SIGUSR2 أنهى العامل')
+        if not profiles:
+            failures.append('لم يُكتب ملف التحليل')
+
+        # عامل جديد مكان المُنهى يختبر SIGHUP بنفسه
+        pid = worker_pid(url)
+        os.kill(pid, signal.SIGHUP)
+        time.sleep(0.5)
+        after = worker_pid(url, timeout=5)
+        print(f"🔄 SIGHUP → العامل {pid}: {'حي' if alive(pid) else 'أُنهي'} (يجيب الآن: {after})")
+        if not alive(pid) or after != pid:
+            failures.append('SIGHUP أنهى العامل')
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ العامل يستقبل SIGUSR2 وSIGHUP بدون أن يُنهى")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""اختبار حمل للويب هوك: gunicorn (متزامن) مقابل uvicorn (ASGI)
+
+يرسل طلبات POST /whatsapp عبر اتصالات keep-alive متزامنة، ويقيس عدد الطلبات
+في الثانية وزمن p50/p99 عند 1 و100 و1000 اتصال.
+
+التشغيل (يشغّل الخادمين تلقائياً على منافذ محلية):
+    python benchmarks/load_test.py --spawn --workers 4 --duration 10
+
+يفضّل تثبيت uvicorn[standard] (httptools): بدون httptools ومع عدة عمّال ظهر
+تأخير ~40ms لكل طلب على اتصالات keep-alive بسبب uvicorn نفسه لا التطبيق.
+
+أو ضد خوادم تعمل مسبقاً:
+    python benchmarks/load_test.py --target gunicorn=http://127.0.0.1:8001 --target asgi=http://127.0.0.1:8002
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+import urllib.request
+from urllib.parse import urlsplit, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = ['مرحبا', 'hello', 'help', 'شكرا', 'ما هي حالة الطلب؟', 'random text here']
+
+SERVERS = {
+    'gunicorn-sync': ['gunicorn', 'app:app', '--workers', '{workers}', '--worker-class', 'sync', '--bind', '127.0.0.1:{port}'],
+    'uvicorn-asgi': ['uvicorn', 'asgi:app', '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning'],
+}
+
+
+async def connection_loop(host, port, path, deadline, latencies, errors):
+    """اتصال keep-alive واحد يرسل الطلبات تباعاً حتى انتهاء الوقت
+
+    عمّال gunicorn المتزامنة تغلق الاتصال بعد كل رد، فيُعاد فتحه عند الحاجة.
+    """
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        body = urlencode({'From': f'whatsapp:+9665{i % 1000:08d}', 'Body': MESSAGES[i % len(MESSAGES)]}).encode()
+        request = (
+            f'POST {path} HTTP/1.1\r\nHost: {host}\r\n'
+            f'Content-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'
+        ).encode() + body
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+
+            status = await reader.readline()
+            length, close = 0, False
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                name = name.lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'connection' and value.strip().lower() == 'close':
+                    close = True
+            await reader.readexactly(length)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+
+        # زمن الطلب يشمل فتح الاتصال إن لزم، كما يراه العميل
+        latencies.append(time.perf_counter() - started)
+        if not status.startswith(b'HTTP/1.1 200'):
+            errors.append(status.decode('latin-1').strip())
+        if close:
+            writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(url, concurrency, duration):
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        connection_loop(parts.hostname, parts.port or 80, '/whatsapp', deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'requests': len(latencies),
+        'errors': len(errors),
+    }
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + '/health', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"الخادم لم يصبح جاهزاً: {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', default=[], help='name=url')
+    parser.add_argument('--spawn', action='store_true', help='تشغيل gunicorn وuvicorn محلياً')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--levels', default='1,100,1000')
+    args = parser.parse_args()
+
+    # 1000 اتصال تحتاج حداً أعلى لعدد الملفات المفتوحة
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 8192)), hard))
+
+    targets = [t.split('=', 1) for t in args.target]
+    processes = []
+    try:
+        if args.spawn:
+            for offset, (name, command) in enumerate(SERVERS.items()):
+                port = 18000 + offset
+                cmd = [part.format(workers=args.workers, port=port) for part in command]
+                processes.append(subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+                targets.append((name, f'http://127.0.0.1:{port}'))
+        if not targets:
+            parser.error('حدد --target أو --spawn')
+
+        for _, url in targets:
+            wait_ready(url)
+
+        levels = [int(level) for level in args.levels.split(',')]
+        print(f"{'server':<16} {'conns':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for level in levels:
+            for name, url in targets:
+                result = asyncio.run(run_level(url, level, args.duration))
+                print(f"{name:<16} {level:>6} {result['rps']:>10.0f} {result['p50_ms']:>9.2f} "
+                      f"{result['p99_ms']:>9.2f} {result['errors']:>7}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""اختبار ضغط لأجزاء الأرشيف: 8 عمليات تكتب في نفس اليوم بأقصى سرعة
+
+كل عملية (كعامل gunicorn بعد fork) تكتب عبر كاتب الأرشيف المشترك في جزئها الخاص، ونصف
+العمليات بعقدة ثانية (ARCHIVE_NODE) كنسختين من التطبيق على مجلد مشترك. بعد الانتهاء يُتحقق أن:
+- لا سجل مفقود ولا مكرر
+- القراءة المدموجة مرتبة زمنياً، وسجلات كل عملية بترتيب كتابتها
+- الصفحات العكسية عبر المؤشرات تساوي عكس القراءة الأمامية تماماً
+- القراءة بعد ضغط اليوم مطابقة لما قبله
+- ذاكرة الدمج لا تكبر مع عدد السجلات (tracemalloc)
+يخرج بكود 1 عند فشل أي فحص.
+
+التشغيل:
+    python benchmarks/stress_archive_shards.py [--workers 8] [--records 20000] [--page 500]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+TMP = tempfile.mkdtemp()
+os.environ['ARCHIVE_DIR'] = TMP
+os.environ['ARCHIVE_FSYNC'] = 'never'
+os.environ.pop('ARCHIVE_SQLITE', None)
+
+logging.disable(logging.CRITICAL)
+
+from message_archive import archive, day_shards, read_day, read_day_reverse
+from log_compaction import compact_day
+
+DAY = '2024-01-15'
+
+
+def write_records(worker, count, node):
+    archive.node = node
+    for seq in range(count):
+        archive.append({'sender': f'+9665{worker:08d}', 'message': f'رسالة {seq}', 'worker': worker,
+                        'seq': seq, 'date': DAY})
+    archive.close()
+
+
+def paged_reverse(page_size):
+    records, cursor = [], None
+    while True:
+        page = []
+        for item in read_day_reverse(DAY, cursor, TMP):
+            page.append(item)
+            if len(page) == page_size:
+                break
+        if not page:
+            return records
+        records.extend(record for _, record in page)
+        cursor = page[-1][0]
+
+
+def merge_peak_kb():
+    tracemalloc.start()
+    count = sum(1 for _ in read_day(DAY, TMP))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000, help='عدد السجلات لكل عملية')
+    parser.add_argument('--page', type=int, default=500)
+    parser.add_argument('--max-peak-kb', type=float, default=1024)
+    args = parser.parse_args()
+    total = args.workers * args.records
+    failures = []
+
+    try:
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=write_records,
+                                     args=(worker, args.records, 'node-a' if worker % 2 else 'node-b'))
+                     for worker in range(args.workers)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        live, _ = day_shards(DAY, TMP)
+        print(f"✍️ {total} سجل من {args.workers} عمليات خلال {elapsed:.2f}s "
+              f"({total / elapsed:,.0f} سجل/ث) في {len(live)} جزء")
+
+        started = time.perf_counter()
+        forward = list(read_day(DAY, TMP))
+        print(f"📖 قراءة مدموجة: {len(forward)} سجل خلال {time.perf_counter() - started:.2f}s")
+        ids = {(record['worker'], record['seq']) for record in forward}
+        if len(forward) != total or len(ids) != total:
+            failures.append(f'سجلات مفقودة أو مكررة: {len(forward)} قراءة، {len(ids)} فريد من {total}')
+        if any(a['timestamp'] > b['timestamp'] for a, b in zip(forward, forward[1:])):
+            failures.append('القراءة المدموجة غير مرتبة زمنياً')
+        last_seq = {}
+        for record in forward:
+            if record['seq'] <= last_seq.get(record['worker'], -1):
+                failures.append(f"سجلات العملية {record['worker']} خارج ترتيب كتابتها")
+                break
+            last_seq[record['worker']] = record['seq']
+
+        started = time.perf_counter()
+        reverse = paged_reverse(args.page)
+        print(f"📄 صفحات عكسية ({args.page}): {len(reverse)} سجل خلال {time.perf_counter() - started:.2f}s")
+        if reverse != forward[::-1]:
+            failures.append('الصفحات العكسية لا تساوي عكس القراءة الأمامية')
+
+        count, peak = merge_peak_kb()
+        print(f"🧠 ذروة ذاكرة الدمج: {peak:.0f}KB لـ {count} سجل من {len(live)} جزء")
+        if peak > args.max_peak_kb:
+            failures.append(f'ذاكرة الدمج {peak:.0f}KB تتجاوز {args.max_peak_kb:g}KB')
+
+        compact_day(DAY, TMP)
+        if list(read_day(DAY, TMP)) != forward or paged_reverse(args.page) != forward[::-1]:
+            failures.append('القراءة بعد الضغط تختلف عما قبله')
+        else:
+            print("🗜️ القراءة بعد ضغط اليوم مطابقة")
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ لا فقد ولا تكرار، والترتيب صحيح")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
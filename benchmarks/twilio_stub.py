@@ -0,0 +1,101 @@
+"""خادم محلي بديل لـ Twilio Messages API (للاختبار والقياس بدون إرسال حقيقي)
+
+يقبل POST /2010-04-01/Accounts/<sid>/Messages.json ويرد 201 مع sid، ويدعم
+keep-alive (HTTP/1.1)، وتأخيراً مصطنعاً، ونسبة أخطاء 503 لاختبار إعادة المحاولة.
+
+التشغيل:
+    python benchmarks/twilio_stub.py --port 18080 --delay-ms 50 --fail-rate 0.1
+ثم:
+    TWILIO_API_BASE=http://127.0.0.1:18080 ASYNC_REPLY=1 python app.py
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, delay=0.0, fail_rate=0.0):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.messages = []
+        self.failures = 0
+        self.connections = 0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # الترويسة والجسم في كتابتين منفصلتين: بدون هذا يضيف Nagle ~40ms لكل رد على keep-alive
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            form = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+            if state.delay:
+                time.sleep(state.delay)
+
+            if not self.path.endswith('/Messages.json') or not self.headers.get('Authorization'):
+                return self._reply(404 if not self.path.endswith('/Messages.json') else 401, {'message': 'error'})
+            if state.fail_rate and random.random() < state.fail_rate:
+                with state.lock:
+                    state.failures += 1
+                return self._reply(503, {'message': 'Service Unavailable'})
+
+            with state.lock:
+                sid = f'SM{len(state.messages):032x}'
+                state.messages.append({'sid': sid, 'received': time.perf_counter(), **form})
+            self._reply(201, {'sid': sid, 'status': 'queued', 'to': form.get('To'), 'body': form.get('Body')})
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(port=0, delay=0.0, fail_rate=0.0):
+    """تشغيل الخادم في خيط خلفي؛ (الخادم، الحالة، الرابط)"""
+    state = StubState(delay, fail_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='twilio-stub', daemon=True).start()
+    return server, state, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--delay-ms', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    server, state, url = start_stub(args.port, args.delay_ms / 1000, args.fail_rate)
+    print(f"🧪 Twilio stub على {url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📨 {len(state.messages)} رسالة، {state.failures} خطأ مصطنع، {state.connections} اتصال")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
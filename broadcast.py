@@ -0,0 +1,472 @@
+"""إرسال جماعي (إعلانات) إلى قائمة أرقام عبر Twilio REST
+
+- عمّال محدودون فوق مجمع اتصالات keep-alive (twilio_rest)، بسرعة لا تتجاوز --rate رسالة/ثانية.
+- كل مهمة في مجلد خاص: المستلمون مثبتون في recipients.txt، وسجل تقدم إلحاقي progress.log.
+  يُكتب سطر البدء (مع fdatasync) قبل كل إرسال، فالمهمة المنقطعة تُستأنف بدون إعادة إرسال:
+  الرسائل التي بدأت ولم يُسجل نجاحها تُعد "غير مؤكدة" ولا تُعاد إلا بـ --resend-uncertain.
+- الناقل قابل للاستبدال (REPLY_TRANSPORT أو --transport) والعنوان عبر TWILIO_API_BASE،
+  للاختبار مع benchmarks/twilio_stub.py.
+
+التشغيل:
+    python broadcast.py send --template "عرض خاص اليوم! {number}" --recipients numbers.txt --rate 20
+    python broadcast.py send --template "..." --allowlist
+    python broadcast.py resume <job_id> [--resend-uncertain]
+    python broadcast.py status [<job_id>]
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from allowlist import ALLOWLIST_FILE, canonicalize, read_numbers
+from message_archive import ARCHIVE_DIR
+from twilio_rest import (REPLY_TRANSPORT, TWILIO_WHATSAPP_FROM, TransportError, TwilioRestTransport,
+                         create_transport, send_with_retry)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الإرسال الجماعي ==============
+
+BROADCAST_DIR = os.getenv('BROADCAST_DIR', os.path.join(ARCHIVE_DIR, '.broadcasts'))
+# الحد الأقصى لمعدل الإرسال (رسالة/ثانية) لجميع عمّال المهمة معاً
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 10))
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', 4))
+# حدود rate وworkers المقبولة من واجهة الإدارة وسطر الأوامر (القيم الأكبر تُقلّص إليها)
+BROADCAST_MAX_RATE = float(os.getenv('BROADCAST_MAX_RATE', 200))
+BROADCAST_MAX_WORKERS = int(os.getenv('BROADCAST_MAX_WORKERS', 64))
+# فاصل تحديث status.json الذي تقرؤه نقطة التقدم من أي عملية
+BROADCAST_STATUS_INTERVAL = float(os.getenv('BROADCAST_STATUS_INTERVAL', 1.0))
+
+# fdatasync غير متوفر في كل الأنظمة (macOS وويندوز): fsync بديل أبطأ قليلاً
+_datasync = getattr(os, 'fdatasync', os.fsync)
+
+
+class JobBusy(RuntimeError):
+    """المهمة قيد التشغيل في عملية أخرى"""
+
+
+class Pacer:
+    """توزيع الإرسال على فترات ثابتة (1 / rate) مشتركة بين جميع الخيوط"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def limit_rate(value):
+    """معدل الإرسال كرقم موجب مقلّص إلى BROADCAST_MAX_RATE؛ ValueError لغير ذلك"""
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        rate = math.nan
+    if isinstance(value, bool) or not rate > 0:
+        raise ValueError(f"rate يجب أن يكون رقماً موجباً: {value!r}")
+    return min(rate, BROADCAST_MAX_RATE)
+
+
+def limit_workers(value):
+    """عدد العمّال كعدد صحيح موجب مقلّص إلى BROADCAST_MAX_WORKERS؛ ValueError لغير ذلك"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    try:
+        workers = int(value) if isinstance(value, (int, str)) and not isinstance(value, bool) else 0
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        raise ValueError(f"workers يجب أن يكون عدداً صحيحاً موجباً: {value!r}")
+    return min(workers, BROADCAST_MAX_WORKERS)
+
+
+def render_template(template, number):
+    """نص الرسالة لمستلم واحد (نفس صيغة قوالب القواعد: {number} و{now})"""
+    return template.format(number=number, now=datetime.now())
+
+
+# ============== المهمة ==============
+
+class BroadcastJob:
+    """مهمة إرسال واحدة محفوظة في مجلدها: job.json وrecipients.txt وprogress.log وstatus.json"""
+
+    def __init__(self, job_id, directory=BROADCAST_DIR):
+        self.id = job_id
+        self.path = os.path.join(directory, job_id)
+        with open(os.path.join(self.path, 'job.json'), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self._recipients = None
+        self._stop = threading.Event()
+        self._log_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.counts = {}
+
+    @classmethod
+    def create(cls, template, recipients, from_number=TWILIO_WHATSAPP_FROM, rate=BROADCAST_RATE,
+               workers=BROADCAST_WORKERS, directory=BROADCAST_DIR):
+        """إنشاء مهمة جديدة؛ قائمة المستلمين تُنسخ إلى المجلد حتى تبقى الترتيبات ثابتة عند الاستئناف"""
+        rate, workers = limit_rate(rate), limit_workers(workers)
+        numbers = list(dict.fromkeys(n for n in (canonicalize(r) for r in recipients) if n))
+        if not numbers:
+            raise ValueError("لا يوجد مستلمون")
+        if not from_number:
+            raise ValueError("رقم المرسل مطلوب (TWILIO_WHATSAPP_FROM أو from)")
+        # خطأ في القالب يظهر الآن وليس بعد بدء الإرسال
+        render_template(template, numbers[0])
+
+        job_id = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        path = os.path.join(directory, job_id)
+        os.makedirs(path)
+        with open(os.path.join(path, 'recipients.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(numbers) + '\n')
+        config = {
+            'id': job_id,
+            'template': template,
+            'from': from_number,
+            'rate': rate,
+            'workers': workers,
+            'total': len(numbers),
+            'created_at': datetime.now().isoformat(),
+        }
+        with open(os.path.join(path, 'job.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        job = cls(job_id, directory)
+        job._write_status('pending')
+        logger.info("📣 مهمة إرسال جديدة %s: %s مستلم", job_id, len(numbers))
+        return job
+
+    @property
+    def recipients(self):
+        if self._recipients is None:
+            with open(os.path.join(self.path, 'recipients.txt'), 'r', encoding='utf-8') as f:
+                self._recipients = [line.strip() for line in f if line.strip()]
+        return self._recipients
+
+    # ---------- سجل التقدم ----------
+
+    def read_progress(self):
+        """(المرسلة، الفاشلة، التي بدأت) كمجموعات ترتيب من progress.log
+
+        الأنواع: S بدء، D نجاح، F فشل مؤكد، U انقطاع بعد الإرسال (تبقى ضمن غير المؤكدة)"""
+        done, failed, started = set(), set(), set()
+        try:
+            with open(os.path.join(self.path, 'progress.log'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) < 2 or not parts[1].isdigit():
+                        # سطر غير مكتمل من انقطاع أثناء الكتابة
+                        continue
+                    {'S': started, 'D': done, 'F': failed}.get(parts[0], set()).add(int(parts[1]))
+        except FileNotFoundError:
+            pass
+        return done, failed, started
+
+    def _log(self, fd, kind, index, detail='', sync=False):
+        line = f'{kind}\t{index}\t{detail}'.replace('\n', ' ') + '\n'
+        with self._log_lock:
+            os.write(fd, line.encode('utf-8'))
+            if sync:
+                _datasync(fd)
+
+    # ---------- الحالة ----------
+
+    def _write_status(self, state, **extra):
+        status = {
+            'id': self.id,
+            'state': state,
+            'total': self.config['total'],
+            'rate': self.config['rate'],
+            'workers': self.config['workers'],
+            'updated_at': datetime.now().isoformat(),
+            'pid': os.getpid(),
+            **self.counts,
+            **extra,
+        }
+        path = os.path.join(self.path, 'status.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        return status
+
+    def status(self):
+        """آخر حالة محفوظة؛ running بدون قفل نشط تعني أن العملية انقطعت"""
+        with open(os.path.join(self.path, 'status.json'), 'r', encoding='utf-8') as f:
+            status = json.load(f)
+        if status['state'] == 'running' and fcntl is not None and not self._is_locked():
+            status['state'] = 'interrupted'
+        return status
+
+    def _is_locked(self):
+        if fcntl is None:
+            # بدون fcntl لا يُعرف القفل بين العمليات؛ الحماية داخل العملية فقط (BroadcastManager)
+            return False
+        fd = os.open(os.path.join(self.path, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    # ---------- التشغيل ----------
+
+    def stop(self):
+        """إيقاف أخذ رسائل جديدة؛ المهمة تصبح paused وقابلة للاستئناف"""
+        self._stop.set()
+
+    def run(self, transport=None, resend_uncertain=False):
+        """إرسال جميع الرسائل المتبقية (يحجب حتى الانتهاء أو stop())؛ إرجاع الحالة النهائية"""
+        lock_fd = os.open(os.path.join(self.path, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(lock_fd)
+                raise JobBusy(f"المهمة {self.id} قيد التشغيل بالفعل")
+
+        log_fd = os.open(os.path.join(self.path, 'progress.log'), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if transport is None:
+            # اتصال دائم لكل عامل: لا انتظار على المجمع ولا اتصالات زائدة
+            transport = create_transport() if REPLY_TRANSPORT else TwilioRestTransport(pool_size=self.config['workers'])
+        try:
+            return self._run(transport, log_fd, resend_uncertain)
+        finally:
+            close = getattr(transport, 'close', None)
+            if close is not None:
+                close()
+            os.close(log_fd)
+            os.close(lock_fd)
+
+    def _run(self, transport, log_fd, resend_uncertain):
+        self._stop.clear()
+        done, failed, started = self.read_progress()
+        uncertain = started - done - failed
+        skip = done | failed if resend_uncertain else done | failed | started
+        pending = queue.Queue()
+        for index in range(self.config['total']):
+            if index not in skip:
+                pending.put(index)
+
+        self.counts = {
+            'sent': len(done),
+            'failed': len(failed),
+            'uncertain': 0 if resend_uncertain else len(uncertain),
+            'retries': 0,
+            'pending': pending.qsize(),
+        }
+        started_at = time.monotonic()
+        resumed = len(done) + len(failed) + len(uncertain)
+        self._write_status('running', resumed_from=resumed)
+        if resumed:
+            logger.info("▶️ استئناف المهمة %s: %s مكتملة، %s غير مؤكدة", self.id, resumed, len(uncertain))
+
+        pacer = Pacer(self.config['rate'])
+        threads = [
+            threading.Thread(target=self._worker, args=(pending, pacer, transport, log_fd),
+                             name=f'broadcast-{i}', daemon=True)
+            for i in range(max(1, self.config['workers']))
+        ]
+        for thread in threads:
+            thread.start()
+        sent_before = self.counts['sent']
+        while any(thread.is_alive() for thread in threads):
+            threads[0].join(BROADCAST_STATUS_INTERVAL)
+            self._write_status('running', messages_per_second=self._rate(sent_before, started_at))
+
+        state = 'paused' if self._stop.is_set() and self.counts['pending'] else 'completed'
+        status = self._write_status(state, messages_per_second=self._rate(sent_before, started_at),
+                                    elapsed_seconds=round(time.monotonic() - started_at, 3))
+        logger.info("📣 المهمة %s: %s (%s مرسلة، %s فاشلة)", self.id, state, self.counts['sent'], self.counts['failed'])
+        return status
+
+    def _rate(self, sent_before, started_at):
+        elapsed = time.monotonic() - started_at
+        return round((self.counts['sent'] - sent_before) / elapsed, 2) if elapsed > 0 else 0.0
+
+    def _worker(self, pending, pacer, transport, log_fd):
+        template, from_number = self.config['template'], self.config['from']
+        recipients = self.recipients
+        while not self._stop.is_set():
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            pacer.wait()
+            number = recipients[index]
+            # سطر البدء يصل إلى القرص قبل الإرسال: الانقطاع بعده لا يؤدي إلى إرسال مكرر
+            self._log(log_fd, 'S', index, sync=True)
+            try:
+                sid, retries = send_with_retry(transport, 'whatsapp:' + number, from_number,
+                                               render_template(template, number))
+                self._log(log_fd, 'D', index, sid or '')
+                outcome = 'sent'
+            except (TransportError, ValueError, KeyError) as e:
+                retries = 0
+                if getattr(e, 'uncertain', False):
+                    # ربما وصلت الرسالة: تبقى "غير مؤكدة" (بدء بلا نتيجة) ولا تُعاد عند الاستئناف
+                    self._log(log_fd, 'U', index, str(e))
+                    logger.warning("⚠️ نتيجة الإرسال إلى %s غير معروفة: %s", number, e)
+                    outcome = 'uncertain'
+                else:
+                    self._log(log_fd, 'F', index, str(e))
+                    logger.error("❌ فشل الإرسال إلى %s: %s", number, e)
+                    outcome = 'failed'
+            with self._counts_lock:
+                self.counts[outcome] += 1
+                self.counts['retries'] += retries
+                self.counts['pending'] -= 1
+
+
+# ============== إدارة المهام داخل التطبيق ==============
+
+class BroadcastManager:
+    """تشغيل المهام في خيوط خلفية داخل العملية، وقراءة تقدم أي مهمة من مجلدها"""
+
+    def __init__(self, directory=BROADCAST_DIR):
+        self.directory = directory
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def create(self, template, recipients, **options):
+        return BroadcastJob.create(template, recipients, directory=self.directory, **options)
+
+    def load(self, job_id):
+        if not job_id or os.sep in job_id or job_id.startswith('.'):
+            raise FileNotFoundError(job_id)
+        return BroadcastJob(job_id, self.directory)
+
+    def start(self, job, resend_uncertain=False, transport=None):
+        """تشغيل المهمة في خيط خلفي؛ JobBusy إذا كانت تعمل هنا أو في عملية أخرى"""
+        with self._lock:
+            if job.id in self._running:
+                raise JobBusy(f"المهمة {job.id} قيد التشغيل بالفعل")
+            if job._is_locked():
+                raise JobBusy(f"المهمة {job.id} قيد التشغيل في عملية أخرى")
+            self._running[job.id] = job
+
+        def target():
+            try:
+                job.run(transport, resend_uncertain)
+            except Exception as e:
+                logger.error("❌ خطأ في مهمة الإرسال %s: %s", job.id, e)
+            finally:
+                with self._lock:
+                    self._running.pop(job.id, None)
+
+        threading.Thread(target=target, name=f'broadcast-job-{job.id}', daemon=True).start()
+
+    def stop(self, job_id):
+        """إيقاف مهمة تعمل في هذه العملية؛ False إذا لم تكن هنا"""
+        job = self._running.get(job_id)
+        if job is None:
+            return False
+        job.stop()
+        return True
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for job_id in sorted(os.listdir(self.directory), reverse=True):
+            try:
+                jobs.append(self.load(job_id).status())
+            except (OSError, ValueError):
+                continue
+        return jobs
+
+
+broadcasts = BroadcastManager()
+
+
+def allowlist_numbers(seed=()):
+    """مستلمو القائمة المسموحة: الأرقام الثابتة + ملف ALLOWLIST_FILE إن وُجد"""
+    numbers = list(seed)
+    if ALLOWLIST_FILE:
+        numbers.extend(read_numbers(ALLOWLIST_FILE))
+    return numbers
+
+
+# ============== سطر الأوامر ==============
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    send = sub.add_parser('send', help='إنشاء مهمة وتشغيلها')
+    send.add_argument('--template', required=True)
+    source = send.add_mutually_exclusive_group(required=True)
+    source.add_argument('--recipients', help='ملف أرقام (رقم في كل سطر)')
+    source.add_argument('--allowlist', action='store_true', help='ALLOWED_NUMBERS في app.py + ALLOWLIST_FILE')
+    send.add_argument('--from', dest='from_number', default=TWILIO_WHATSAPP_FROM)
+    send.add_argument('--rate', type=float, default=BROADCAST_RATE)
+    send.add_argument('--workers', type=int, default=BROADCAST_WORKERS)
+
+    resume = sub.add_parser('resume', help='استئناف مهمة منقطعة أو موقوفة')
+    resume.add_argument('job_id')
+    resume.add_argument('--resend-uncertain', action='store_true',
+                        help='إعادة إرسال الرسائل التي بدأت ولم يُسجل نجاحها (قد تتكرر)')
+
+    for command in (send, resume):
+        command.add_argument('--transport', default='', help='ناقل بديل بصيغة module:callable')
+
+    status = sub.add_parser('status', help='تقدم مهمة أو جميع المهام')
+    status.add_argument('job_id', nargs='?')
+
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        result = broadcasts.load(args.job_id).status() if args.job_id else broadcasts.list()
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == 'send':
+        if args.allowlist:
+            from app import ALLOWED_NUMBERS
+            recipients = allowlist_numbers(ALLOWED_NUMBERS)
+        else:
+            recipients = read_numbers(args.recipients)
+        job = broadcasts.create(args.template, recipients, from_number=args.from_number,
+                                rate=args.rate, workers=args.workers)
+        resend = False
+    else:
+        job = broadcasts.load(args.job_id)
+        resend = args.resend_uncertain
+
+    print(f"📣 المهمة {job.id} ({job.config['total']} مستلم)؛ Ctrl+C للإيقاف المؤقت")
+    thread = threading.Thread(target=lambda: print(json.dumps(
+        job.run(create_transport(args.transport) if args.transport else None, resend), ensure_ascii=False, indent=2)))
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        job.stop()
+        thread.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات منع التكرار ==============
+
+# مدة تذكر MessageSid (Twilio يعيد المحاولة خلال دقائق من فشل التسليم)
+DEDUP_TTL = float(os.getenv('DEDUP_TTL', 3600))
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', 50000))
+# ملف مشترك بين عمّال gunicorn؛ عند تركه فارغاً تكون الذاكرة خاصة بكل عملية
+DEDUP_SHARED_PATH = os.getenv('DEDUP_SHARED_PATH', '')
+# مدة حجز MessageSid أثناء معالجة الرسالة الأصلية؛ بعدها يُعد الحجز متروكاً (عامل انتهى) ويُؤخذ من جديد
+DEDUP_PENDING_TTL = float(os.getenv('DEDUP_PENDING_TTL', 60))
+# انتظار إعادة المحاولة للرد المحفوظ من المعالجة الأصلية قبل الاكتفاء باستلام فارغ
+DEDUP_WAIT_SECONDS = float(os.getenv('DEDUP_WAIT_SECONDS', 2.0))
+DEDUP_POLL_INTERVAL = 0.02
+
+# نتيجة claim() عندما تكون الرسالة قيد المعالجة في طلب آخر
+PENDING = object()
+
+
+class DedupCache:
+    """ذاكرة MessageSid ← بايتات الرد، مع انتهاء صلاحية (TTL) وإخراج الأقدم استخداماً (LRU)
+
+    claim() يحجز المعرّف قبل المعالجة (مدخل بدون رد)، فإعادة محاولة تصل أثناء معالجة
+    الأصل لا تُعالج مرة ثانية بل تنتظر الرد المحفوظ (wait)."""
+
+    def __init__(self, ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES, pending_ttl=DEDUP_PENDING_TTL,
+                 wait_seconds=DEDUP_WAIT_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pending_ttl = pending_ttl
+        self.wait_seconds = wait_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+
+    def claim(self, sid):
+        """None: حُجز للمعالجة في هذا الطلب | بايتات: الرد المحفوظ | PENDING: قيد المعالجة في طلب آخر"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(sid)
+                if entry[1] is None:
+                    self.pending += 1
+                    return PENDING
+                self.hits += 1
+                return entry[1]
+            self._store(sid, now + self.pending_ttl, None)
+            self.misses += 1
+            return None
+
+    def get(self, sid):
+        """الرد المحفوظ، أو PENDING إذا كان محجوزاً، أو None"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return PENDING if entry[1] is None else entry[1]
+
+    def put(self, sid, body):
+        with self._lock:
+            self._store(sid, time.monotonic() + self.ttl, body)
+
+    def release(self, sid):
+        """إلغاء الحجز بدون رد (رد لا يُحفظ أو خطأ): إعادة المحاولة تُعالج من جديد"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry[1] is None:
+                del self._entries[sid]
+
+    def _store(self, sid, expires, body):
+        self._entries[sid] = (expires, body)
+        self._entries.move_to_end(sid)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def wait(self, sid):
+        return wait_for_reply(self, sid, self.wait_seconds)
+
+    def stats(self):
+        return {
+            'mode': 'memory',
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'pending': self.pending,
+        }
+
+
+class SharedDedupCache:
+    """نفس الواجهة فوق ملف SQLite مشترك ليرى جميع العمّال نفس المفاتيح"""
+
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS dedup (
+        sid TEXT PRIMARY KEY,
+        expires REAL NOT NULL,
+        touched REAL NOT NULL,
+        body BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_dedup_touched ON dedup (touched);
+    '''
+
+    # تنظيف المنتهي والزائد مرة كل هذا العدد من عمليات الإضافة
+    EVICT_EVERY = 500
+
+    def __init__(self, path, ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES, pending_ttl=DEDUP_PENDING_TTL,
+                 wait_seconds=DEDUP_WAIT_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pending_ttl = pending_ttl
+        self.wait_seconds = wait_seconds
+        self._local = threading.local()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def claim(self, sid):
+        """None: حُجز للمعالجة في هذا الطلب | بايتات: الرد المحفوظ | PENDING: قيد المعالجة في طلب آخر
+
+        الحجز صف بجسم فارغ (لا يوجد رد TwiML فارغ)؛ INSERT OR IGNORE يضمن أن عاملاً واحداً فقط يأخذه"""
+        # الوقت الحقيقي لأن الساعة الرتيبة لا تُقارن بين العمليات
+        now = time.time()
+        conn = self._connection()
+        conn.execute('DELETE FROM dedup WHERE sid = ? AND expires <= ?', (sid, now))
+        claimed = conn.execute('INSERT OR IGNORE INTO dedup (sid, expires, touched, body) VALUES (?, ?, ?, ?)',
+                               (sid, now + self.pending_ttl, now, b'')).rowcount
+        if claimed:
+            self.misses += 1
+            return None
+        body = self.get(sid)
+        if body is None or body is PENDING:
+            # أُلغي الحجز بين العبارتين: يُعامل كقيد المعالجة وينتظر
+            self.pending += 1
+            return PENDING
+        conn.execute('UPDATE dedup SET touched = ? WHERE sid = ?', (now, sid))
+        self.hits += 1
+        return body
+
+    def get(self, sid):
+        """الرد المحفوظ، أو PENDING إذا كان محجوزاً، أو None"""
+        row = self._connection().execute('SELECT body FROM dedup WHERE sid = ? AND expires > ?',
+                                          (sid, time.time())).fetchone()
+        if row is None:
+            return None
+        return row[0] or PENDING
+
+    def put(self, sid, body):
+        now = time.time()
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO dedup (sid, expires, touched, body) VALUES (?, ?, ?, ?)',
+                     (sid, now + self.ttl, now, body))
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self._evict(conn, now)
+
+    def release(self, sid):
+        """إلغاء الحجز بدون رد (رد لا يُحفظ أو خطأ): إعادة المحاولة تُعالج من جديد"""
+        self._connection().execute("DELETE FROM dedup WHERE sid = ? AND body = X''", (sid,))
+
+    def wait(self, sid):
+        return wait_for_reply(self, sid, self.wait_seconds)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM dedup WHERE expires <= ?', (now,))
+        conn.execute(
+            'DELETE FROM dedup WHERE sid IN (SELECT sid FROM dedup ORDER BY touched DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,))
+
+    def stats(self):
+        return {
+            'mode': 'shared',
+            'entries': self._connection().execute('SELECT COUNT(*) FROM dedup').fetchone()[0],
+            'hits': self.hits,
+            'misses': self.misses,
+            'pending': self.pending,
+        }
+
+
+def wait_for_reply(cache, sid, timeout):
+    """انتظار الرد المحفوظ لرسالة قيد المعالجة؛ None عند انتهاء المهلة أو إلغاء الحجز"""
+    deadline = time.monotonic() + timeout
+    while True:
+        body = cache.get(sid)
+        if body is not PENDING:
+            return body
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(DEDUP_POLL_INTERVAL)
+
+
+def create_dedup_cache():
+    """الذاكرة المناسبة حسب DEDUP_SHARED_PATH"""
+    if DEDUP_SHARED_PATH:
+        try:
+            return SharedDedupCache(DEDUP_SHARED_PATH)
+        except sqlite3.Error as e:
+            logger.error("❌ تعذر فتح ذاكرة منع التكرار المشتركة %s: %s", DEDUP_SHARED_PATH, e)
+    return DedupCache()
@@ -0,0 +1,80 @@
+"""إعدادات gunicorn للإنتاج (يقرؤها gunicorn تلقائياً من المجلد الحالي، أو عبر serve.py)
+
+- preload_app: التطبيق يُستورد ويُحمّى (warm_up) مرة واحدة في العملية الرئيسية، والعمّال
+  يرثون الذاكرة بعد fork بنسخ عند الكتابة بدلاً من أن يدفع كل عامل زمن الاستيراد.
+- عدد العمّال والخيوط من عدد المعالجات المتاحة فعلاً (مع حصة cgroup في الحاويات).
+- زمن الإقلاع يُسجل عند الجاهزية ويظهر في /health و/health/ready.
+
+التشغيل:
+    gunicorn app:app
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 gunicorn app:app
+"""
+import os
+import math
+
+# قبل استيراد التطبيق: بداية قياس زمن الإقلاع في العملية الرئيسية
+from readiness import readiness
+
+
+def available_cpus():
+    """المعالجات المتاحة لهذه العملية: affinity ثم حصة cgroup v2 (cpu.max) إن وُجدت"""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            count = min(count, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+CPUS = available_cpus()
+GUNICORN_MAX_WORKERS = int(os.getenv('GUNICORN_MAX_WORKERS', 9))
+
+bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
+# القاعدة المعتادة 2 × المعالجات + 1، بحد أقصى يناسب ذاكرة الخادم
+workers = int(os.getenv('WEB_CONCURRENCY', min(2 * CPUS + 1, GUNICORN_MAX_WORKERS)))
+# gthread: خيوط لكل عامل مع keep-alive؛ الكتابة إلى الأرشيف والشبكة لا تحجز العامل كله
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = True
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 20))
+# إعادة تشغيل العامل بعد عدد من الطلبات (0 = أبداً) مع تفاوت حتى لا يُعاد الجميع معاً
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    # لقطات المقاييس والإحصاءات من تشغيل سابق تخص عمليات لم تعد موجودة
+    from metrics import REGISTRY
+    from live_stats import live_stats
+
+    REGISTRY.clear_snapshots()
+    live_stats.clear_snapshots()
+    server.log.info("⚙️ %s عامل × %s خيط (%s) على %s معالج", workers, threads, worker_class, CPUS)
+
+
+def when_ready(server):
+    server.log.info("🚀 الخادم جاهز: إقلاع %.3fs %s", readiness.cold_start or 0, readiness.phases)
+
+
+def post_fork(server, worker):
+    readiness.worker_forked()
+
+
+def post_worker_init(worker):
+    # init_signals في العامل يعيد SIGHUP وSIGUSR2 إلى الافتراضي (إنهاء العملية)، فتُثبت
+    # معالجات إعادة تحميل القواعد والتحليل من جديد بعد fork
+    from profiler import profiler
+    from rules import registry
+
+    registry.install_signal_handler()
+    profiler.install_signal_handler()
+    readiness.worker_initialized()
+    worker.log.debug("👷 العامل %s جاهز خلال %ss", worker.pid, readiness.worker_boot)
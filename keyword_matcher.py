@@ -0,0 +1,237 @@
+import re
+from collections import deque
+
+# ============== التطبيع ==============
+
+# جدول تحويل واحد يُطبّق في مرور واحد عبر str.translate
+_NORMALIZE_TABLE = {}
+
+# التشكيل (الفتحتان ... السكون) والألف الخنجرية
+for _code in range(0x064B, 0x0653):
+    _NORMALIZE_TABLE[_code] = None
+_NORMALIZE_TABLE[0x0670] = None
+
+# التطويل
+_NORMALIZE_TABLE[0x0640] = None
+
+# أشكال الألف والهمزة
+for _char in 'أإآٱ':
+    _NORMALIZE_TABLE[ord(_char)] = 'ا'
+_NORMALIZE_TABLE[ord('ؤ')] = 'و'
+_NORMALIZE_TABLE[ord('ئ')] = 'ي'
+_NORMALIZE_TABLE[ord('ى')] = 'ي'
+
+# التاء المربوطة
+_NORMALIZE_TABLE[ord('ة')] = 'ه'
+
+# الأرقام العربية الهندية والفارسية
+for _i in range(10):
+    _NORMALIZE_TABLE[0x0660 + _i] = str(_i)
+    _NORMALIZE_TABLE[0x06F0 + _i] = str(_i)
+
+
+def normalize(text):
+    """توحيد النص للمطابقة: أحرف صغيرة، بدون تشكيل أو تطويل، وتوحيد الألف والتاء والأرقام"""
+    return text.lower().translate(_NORMALIZE_TABLE).strip()
+
+
+# ============== المطابقة التقريبية (SymSpell) ==============
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _deletes(word, distance):
+    """جميع الأشكال الناتجة عن حذف حتى distance حرف من الكلمة (بما فيها الكلمة نفسها)"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """مسافة Damerau-Levenshtein (المقيدة) بين a وb، أو limit + 1 إذا تجاوزتها"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            # تبديل حرفين متجاورين (teh ← the) يُحسب خطأً واحداً
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """فهرس أشكال الحذف المحسوب مسبقاً من الكلمات: بحث بمسافة تحرير محدودة بزمن شبه ثابت لكل كلمة
+
+    كل كلمة مفتاحية تُخزَّن تحت جميع أشكالها بعد حذف حتى max_distance حرف. عند البحث
+    تُولَّد أشكال الحذف للكلمة الواردة فقط ويُتحقق من المرشحين بحساب المسافة الفعلية.
+    """
+
+    def __init__(self, keywords, max_distance=2, min_similarity=0.75, min_length=3, max_tokens=8):
+        self.max_distance = max_distance
+        self.max_tokens = max_tokens
+        self.min_similarity = min_similarity
+        self.min_length = min_length
+        self.keywords = []
+        self._index = {}
+        self._max_length = 0
+
+        for index, keyword in enumerate(keywords):
+            word = normalize(keyword)
+            if len(word) < min_length:
+                continue
+            self.keywords.append((word, index))
+            self._max_length = max(self._max_length, len(word))
+            position = len(self.keywords) - 1
+            for variant in _deletes(word, self._allowed(len(word))):
+                self._index.setdefault(variant, []).append(position)
+
+    def _allowed(self, length):
+        """أكبر مسافة تحقق min_similarity لكلمة بهذا الطول"""
+        return min(self.max_distance, int(length * (1 - self.min_similarity) + 1e-9))
+
+    def __len__(self):
+        return len(self._index)
+
+    def lookup(self, token):
+        """(ترتيب الكلمة في القاموس، المسافة) لأقرب كلمة مقبولة، أو None"""
+        length = len(token)
+        if length < self.min_length or length > self._max_length + self.max_distance:
+            return None
+
+        # لا حاجة لحذف أكثر مما تسمح به أطول كلمة ممكنة المطابقة لهذا الطول
+        distance = self._allowed(length + self.max_distance)
+        best = None
+        seen = set()
+        for variant in _deletes(token, distance):
+            for position in self._index.get(variant, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                word, index = self.keywords[position]
+                limit = self._allowed(len(word))
+                distance = edit_distance(token, word, limit)
+                if distance > limit:
+                    continue
+                # الأقرب أولاً، ثم ترتيب القاموس
+                if best is None or (distance, index) < best[::-1]:
+                    best = (index, distance)
+        return best
+
+    def search(self, text):
+        """أقرب كلمة للنص كاملاً (لدعم الكلمات متعددة المقاطع) أو لأي كلمة منه"""
+        # عدد محدود من الكلمات: زمن الرسالة الطويلة لا يتجاوز max_tokens بحثاً
+        tokens = _TOKEN_RE.findall(text)[:self.max_tokens]
+        candidates = tokens if len(tokens) == 1 and tokens[0] == text else [text, *tokens]
+        best = None
+        for candidate in candidates:
+            found = self.lookup(candidate)
+            if found is not None and (best is None or found[::-1] < best[::-1]):
+                best = found
+        return None if best is None else best[0]
+
+
+# ============== Aho-Corasick ==============
+
+class KeywordMatcher:
+    """مطابق كلمات مفتاحية يُبنى مرة واحدة ويبحث عن جميع الكلمات بمرور واحد على الرسالة"""
+
+    def __init__(self, keywords, fuzzy=None):
+        """fuzzy: إعدادات FuzzyIndex (max_distance، min_similarity، min_length) لتفعيل المرحلة التقريبية"""
+        self.keywords = list(keywords)
+        self._exact = {}
+        self._goto = [{}]
+        self._fail = [0]
+        # أصغر ترتيب كلمة تنتهي عند هذه الحالة (مع روابط الفشل)
+        self._best = [None]
+
+        for index, keyword in enumerate(self.keywords):
+            normalized = normalize(keyword)
+            if not normalized:
+                continue
+            # عند تكرار الشكل الموحّد تفوز الكلمة الأولى بترتيب القاموس
+            self._exact.setdefault(normalized, index)
+            self._insert(normalized, index)
+
+        self._build_links()
+        self.fuzzy = FuzzyIndex(self.keywords, **fuzzy) if fuzzy is not None else None
+
+    def _insert(self, word, index):
+        node = 0
+        for char in word:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            node = nxt
+        if self._best[node] is None or index < self._best[node]:
+            self._best[node] = index
+
+    def _build_links(self):
+        goto, fail, best = self._goto, self._fail, self._best
+        pending = deque(goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                inherited = best[fail[child]]
+                if inherited is not None and (best[child] is None or inherited < best[child]):
+                    best[child] = inherited
+                pending.append(child)
+
+    def search(self, text):
+        """ترتيب أول كلمة (بترتيب القاموس) موجودة داخل النص الموحّد، أو None"""
+        goto, fail, best = self._goto, self._fail, self._best
+        node = 0
+        found = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hit = best[node]
+            if hit is not None and (found is None or hit < found):
+                found = hit
+                if found == 0:
+                    break
+        return found
+
+    def match(self, message):
+        """إرجاع (الكلمة، نوع التطابق) حيث النوع 'exact' أو 'partial' أو 'fuzzy'، أو (None, None)"""
+        text = normalize(message)
+
+        # التطابق الكامل أولاً
+        index = self._exact.get(text)
+        if index is not None:
+            return self.keywords[index], 'exact'
+
+        # ثم أول تطابق جزئي بترتيب القاموس
+        index = self.search(text)
+        if index is not None:
+            return self.keywords[index], 'partial'
+
+        # أخيراً أقرب كلمة بمسافة تحرير محدودة (إن كانت المرحلة مفعلة)
+        if self.fuzzy is not None:
+            index = self.fuzzy.search(text)
+            if index is not None:
+                return self.keywords[index], 'fuzzy'
+
+        return None, None
@@ -0,0 +1,232 @@
+import os
+import atexit
+import time
+import math
+import base64
+import hashlib
+import logging
+import threading
+
+from message_archive import ARCHIVE_DIR
+from snapshots import PidSnapshots
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الإحصاءات الحية ==============
+
+# مجلد لقطات العمّال (نفس أسلوب .metrics): كل عملية تكتب ملفها و/stats يجمعها
+STATS_DIR = os.getenv('STATS_DIR', os.path.join(ARCHIVE_DIR, '.stats'))
+STATS_SNAPSHOT_INTERVAL = float(os.getenv('STATS_SNAPSHOT_INTERVAL', 5.0))
+# مدة صلاحية نتيجة /stats المجمعة: ثابتة التكلفة مهما كان عدد الطلبات
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 1.0))
+# عدد الكلمات المتتبعة في قائمة الأكثر طلباً (Space-Saving)
+STATS_TOP_KEYWORDS = int(os.getenv('STATS_TOP_KEYWORDS', 50))
+
+# دقة HyperLogLog: 2^12 سجل (4 KB) بخطأ معياري ~1.6%
+HLL_PRECISION = 12
+
+# نتائج المعالجة: أنواع التطابق + الحالات التي لا تصل إلى المطابقة
+OUTCOMES = ('exact', 'partial', 'fuzzy', 'default', 'empty', 'not_allowed', 'error')
+
+
+# ============== هياكل محدودة الذاكرة ==============
+
+class HyperLogLog:
+    """تقدير عدد العناصر الفريدة بذاكرة ثابتة، قابل للدمج بين العمليات (max لكل سجل)"""
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h >> self._shift
+        # موقع أول بت 1 في البتات المتبقية
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        registers = self.registers
+        for i, rank in enumerate(other):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # تصحيح المدى الصغير (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def dumps(self):
+        return base64.b64encode(self.registers).decode('ascii')
+
+    @staticmethod
+    def loads(data):
+        return base64.b64decode(data)
+
+
+class SpaceSaving:
+    """أكثر العناصر تكراراً بعدد ثابت من العدادات (خوارزمية Space-Saving)"""
+
+    def __init__(self, capacity=STATS_TOP_KEYWORDS):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, key, amount=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += amount
+        elif len(counts) < self.capacity:
+            counts[key] = amount
+        else:
+            # استبدال الأقل: العنصر الجديد يرث عدّه (حد أعلى للخطأ)
+            smallest = min(counts, key=counts.get)
+            counts[key] = counts.pop(smallest) + amount
+
+    def merge(self, counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def top(self, n):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+class Window:
+    """عدّادات دورية: size خانة كل منها span ثانية (مثل آخر 60 دقيقة)"""
+
+    def __init__(self, size, span):
+        self.size = size
+        self.span = span
+        self.slots = [[-1, 0] for _ in range(size)]
+
+    def add(self, now, amount=1):
+        period = int(now // self.span)
+        slot = self.slots[period % self.size]
+        if slot[0] != period:
+            slot[0] = period
+            slot[1] = 0
+        slot[1] += amount
+
+    def snapshot(self):
+        return [list(slot) for slot in self.slots if slot[0] >= 0]
+
+    def series(self, periods, now):
+        """قائمة العدّ من الأقدم إلى الأحدث للفترات الأخيرة (periods: {الفترة: العدد})"""
+        current = int(now // self.span)
+        return [periods.get(p, 0) for p in range(current - self.size + 1, current + 1)]
+
+
+# ============== الإحصاءات ==============
+
+class LiveStats:
+    """عدّادات تُحدّث مع كل رسالة، بلقطة دورية لكل عملية تُدمج عند القراءة"""
+
+    def __init__(self, directory=STATS_DIR, interval=STATS_SNAPSHOT_INTERVAL, cache_ttl=STATS_CACHE_TTL):
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self.snapshots = PidSnapshots(directory, 'stats_', interval, self.snapshot, 'الإحصاءات')
+        self._cached = None
+        self._cached_at = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.outcomes = dict.fromkeys(OUTCOMES, 0)
+            self.senders = HyperLogLog()
+            self.keywords = SpaceSaving()
+            self.minutes = Window(60, 60)
+            self.hours = Window(24, 3600)
+            self._cached = None
+
+    def record(self, sender, outcome, keyword=None):
+        """تسجيل رسالة واحدة؛ outcome أحد OUTCOMES"""
+        now = time.time()
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if sender:
+                self.senders.add(sender)
+            if keyword:
+                self.keywords.add(keyword)
+            self.minutes.add(now)
+            self.hours.add(now)
+
+    # ---------- اللقطات ----------
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'outcomes': dict(self.outcomes),
+                'senders': self.senders.dumps(),
+                'keywords': dict(self.keywords.counts),
+                'minutes': self.minutes.snapshot(),
+                'hours': self.hours.snapshot(),
+            }
+
+    def write_snapshot(self):
+        self.snapshots.write()
+
+    def maybe_write_snapshot(self):
+        self.snapshots.maybe_write()
+
+    def clear_snapshots(self, stale_only=False):
+        """حذف لقطات العمليات السابقة (عند بدء الخادم)"""
+        self.snapshots.clear(stale_only)
+
+    # ---------- القراءة ----------
+
+    def collect(self):
+        """الإحصاءات المجمعة من جميع العمّال (مخزنة cache_ttl ثانية)"""
+        now = time.monotonic()
+        cached = self._cached
+        if cached is not None and now - self._cached_at < self.cache_ttl:
+            return cached
+        result = self._merge([self.snapshot(), *self.snapshots.others()])
+        self._cached, self._cached_at = result, now
+        return result
+
+    def _merge(self, snapshots):
+        outcomes = dict.fromkeys(OUTCOMES, 0)
+        senders = HyperLogLog()
+        keywords = SpaceSaving(capacity=None)
+        minutes, hours = {}, {}
+        for snapshot in snapshots:
+            for outcome, count in snapshot['outcomes'].items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+            senders.merge(HyperLogLog.loads(snapshot['senders']))
+            keywords.merge(snapshot['keywords'])
+            for merged, slots in ((minutes, snapshot['minutes']), (hours, snapshot['hours'])):
+                for period, count in slots:
+                    merged[period] = merged.get(period, 0) + count
+
+        now = time.time()
+        per_minute = self.minutes.series(minutes, now)
+        per_hour = self.hours.series(hours, now)
+        total = sum(outcomes.values())
+        return {
+            'messages': {
+                'total': total,
+                'last_minute': per_minute[-1],
+                'last_hour': sum(per_minute),
+                'last_24h': sum(per_hour),
+            },
+            'per_minute': per_minute,
+            'per_hour': per_hour,
+            'unique_senders': senders.count(),
+            'top_keywords': [{'keyword': k, 'count': c} for k, c in keywords.top(10)],
+            'outcomes': outcomes,
+            'default_rate': round(outcomes['default'] / total, 4) if total else 0.0,
+            'error_rate': round(outcomes['error'] / total, 4) if total else 0.0,
+            'workers': len(snapshots),
+        }
+
+
+live_stats = LiveStats()
+atexit.register(live_stats.snapshots.write_final)
@@ -0,0 +1,279 @@
+"""ضغط سجلات الأيام المغلقة وتطبيق سياسة الاحتفاظ
+
+التشغيل:
+    python log_compaction.py compact [--codec gzip|zstd] [--block-records N]
+    python log_compaction.py retention --days 90
+    python log_compaction.py verify
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import date, timedelta
+from itertools import chain
+
+from message_archive import (
+    ARCHIVE_DIR, legacy_day_path, day_shards, merge_shards,
+    read_day, read_day_reverse, _iter_legacy, _read_lines,
+)
+from segments import (
+    SEGMENT_BLOCK_RECORDS, EXTENSIONS, available_codecs, find_segment,
+    iter_segment, load_index, index_path, write_segment,
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الضغط ==============
+
+COMPACTION_CODEC = os.getenv('COMPACTION_CODEC', 'gzip')
+# الفاصل بالثواني لتشغيل الضغط داخل التطبيق (0 = معطل، ويُشغَّل من سطر الأوامر فقط)
+COMPACTION_INTERVAL = float(os.getenv('COMPACTION_INTERVAL', 0))
+# اليوم يُعتبر مغلقاً إذا مضى على آخر كتابة فيه هذا العدد من الثواني
+COMPACTION_GRACE = float(os.getenv('COMPACTION_GRACE', 3600))
+# حذف أيام أقدم من هذا العدد (0 = الاحتفاظ بكل شيء)
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', 0))
+
+DAY_FILE = re.compile(r'^messages_(\d{4}-\d{2}-\d{2})\.')
+
+
+def list_days(directory=ARCHIVE_DIR):
+    """جميع الأيام التي لها ملفات في مجلد السجلات"""
+    if not os.path.isdir(directory):
+        return []
+    days = set()
+    for name in os.listdir(directory):
+        match = DAY_FILE.match(name)
+        if match:
+            days.add(match.group(1))
+    return sorted(days)
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return {'name': os.path.basename(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _remove_merged_leftovers(segment, directory):
+    """حذف ملفات مصدر بقيت بعد انقطاع سابق وهي مدمجة فعلاً في المقطع"""
+    index = load_index(segment)
+    if not index:
+        return
+    for source in index.get('sources', []):
+        path = os.path.join(directory, source['name'])
+        if os.path.exists(path) and _fingerprint(path) == source:
+            os.remove(path)
+
+
+# ============== الضغط ==============
+
+def compact_day(day, directory=ARCHIVE_DIR, codec=COMPACTION_CODEC, block_records=SEGMENT_BLOCK_RECORDS):
+    """تحويل يوم مغلق إلى مقطع مضغوط مع فهرس؛ إرجاع عدد السجلات أو None إذا لا يوجد ما يُضغط"""
+    existing, existing_codec = find_segment(day, directory)
+    if existing:
+        _remove_merged_leftovers(existing, directory)
+
+    legacy = legacy_day_path(day, directory)
+    live, compacting = day_shards(day, directory)
+
+    # نقل الأجزاء الحية جانباً؛ أي كتابة متأخرة تُنشئ جزءاً حياً جديداً
+    for shard, path in live.items():
+        if shard not in compacting:
+            compacting[shard] = path + '.compacting'
+            os.rename(path, compacting[shard])
+    compacting = dict(sorted(compacting.items()))
+
+    sources = ([legacy] if os.path.exists(legacy) else []) + list(compacting.values())
+    if not sources and (not existing or existing_codec == codec):
+        return None
+
+    # بنفس ترتيب read_day: المقطع السابق، الملف القديم، ثم دمج الأجزاء زمنياً
+    records = chain(
+        iter_segment(existing, existing_codec) if existing else (),
+        _iter_legacy(legacy) if os.path.exists(legacy) else (),
+        merge_shards(_read_lines(path) for path in compacting.values()),
+    )
+    count = write_segment(records, day, directory, codec, block_records,
+                          sources=[_fingerprint(p) for p in sources])
+
+    # بعد الالتزام: حذف المصادر والمقطع القديم إذا تغيّر الترميز
+    for path in sources:
+        os.remove(path)
+    if existing and existing_codec != codec:
+        for path in (existing, index_path(existing)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    logger.info("🗜️ تم ضغط سجلات %s: %s رسالة (%s)", day, count, codec)
+    return count
+
+
+def _last_write(day, directory):
+    live, compacting = day_shards(day, directory)
+    paths = [legacy_day_path(day, directory), *live.values(), *compacting.values()]
+    times = [os.path.getmtime(p) for p in paths if os.path.exists(p)]
+    return max(times) if times else None
+
+
+def compact(directory=ARCHIVE_DIR, codec=COMPACTION_CODEC, block_records=SEGMENT_BLOCK_RECORDS,
+            grace=COMPACTION_GRACE, today=None):
+    """ضغط جميع الأيام المغلقة (قبل اليوم، وبدون كتابة خلال مهلة grace)"""
+    today = today or date.today().isoformat()
+    compacted = []
+    for day in list_days(directory):
+        if day >= today:
+            continue
+        last_write = _last_write(day, directory)
+        if last_write is not None and time.time() - last_write < grace:
+            continue
+        count = compact_day(day, directory, codec, block_records)
+        if count is not None:
+            compacted.append((day, count))
+    return compacted
+
+
+def apply_retention(directory=ARCHIVE_DIR, days=RETENTION_DAYS, today=None):
+    """حذف جميع ملفات الأيام الأقدم من فترة الاحتفاظ؛ إرجاع الأيام المحذوفة"""
+    if days <= 0:
+        return []
+    today = date.fromisoformat(today) if today else date.today()
+    cutoff = (today - timedelta(days=days)).isoformat()
+    removed = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = DAY_FILE.match(name)
+        if match and match.group(1) < cutoff:
+            os.remove(os.path.join(directory, name))
+            if match.group(1) not in removed:
+                removed.append(match.group(1))
+    for day in removed:
+        logger.info("🗑️ تم حذف سجلات %s (أقدم من %s يوماً)", day, days)
+    return removed
+
+
+# ============== القفل والجدولة ==============
+
+def run_exclusive(fn, directory=ARCHIVE_DIR):
+    """تشغيل fn بقفل ملف حتى لا تضغط عدة عمليات نفس المجلد في الوقت ذاته"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.compaction.lock'), 'w') as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+        return fn()
+
+
+def run_maintenance(directory=ARCHIVE_DIR):
+    """الضغط ثم الاحتفاظ (ما يشغله المجدول داخل التطبيق)"""
+    def job():
+        compact(directory)
+        apply_retention(directory)
+    try:
+        run_exclusive(job, directory)
+    except Exception as e:
+        logger.error("❌ خطأ في ضغط السجلات: %s", e)
+
+
+def start_scheduler(interval=COMPACTION_INTERVAL, directory=ARCHIVE_DIR):
+    """تشغيل الضغط دورياً في خيط خلفي (لا شيء إذا كان الفاصل 0)"""
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            run_maintenance(directory)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='log-compaction', daemon=True)
+    thread.start()
+    return thread
+
+
+# ============== التحقق ==============
+
+def verify(directory=ARCHIVE_DIR, codec=COMPACTION_CODEC, block_records=SEGMENT_BLOCK_RECORDS):
+    """التحقق على نسخة مؤقتة أن كل يوم يُقرأ بعد الضغط كما كان قبله تماماً
+
+    يقارن القراءة المتسلسلة والقراءة العكسية المرقّمة (صفحات صغيرة عبر المؤشرات).
+    يفحص سجلات المشغّل الموجودة فقط؛ الفحص الذاتي بسجلات اختبار مولّدة (عدة أجزاء، ملف قديم،
+    كتلة أخيرة ناقصة، gzip وzstd) في benchmarks/check_compaction_roundtrip.py.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, 'logs')
+        shutil.copytree(directory, copy, ignore=shutil.ignore_patterns('.compaction.lock', '.ratelimit', '*.db*'))
+        days = list_days(copy)
+        before = {day: list(read_day(day, copy)) for day in days}
+
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        compact(copy, codec, block_records, grace=0, today=tomorrow)
+
+        for day in days:
+            after = list(read_day(day, copy))
+
+            paged, cursor = [], None
+            while True:
+                page = []
+                for item in read_day_reverse(day, cursor, copy):
+                    page.append(item)
+                    if len(page) == 7:
+                        break
+                if not page:
+                    break
+                paged.extend(record for _, record in page)
+                cursor = page[-1][0]
+
+            if after != before[day] or paged != before[day][::-1]:
+                failures.append(day)
+            print(f"{'✅' if day not in failures else '❌'} {day}: {len(before[day])} رسالة")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compact_cmd = commands.add_parser('compact', help='ضغط الأيام المغلقة')
+    compact_cmd.add_argument('--codec', default=COMPACTION_CODEC, choices=list(EXTENSIONS))
+    compact_cmd.add_argument('--block-records', type=int, default=SEGMENT_BLOCK_RECORDS)
+    compact_cmd.add_argument('--grace', type=float, default=COMPACTION_GRACE)
+
+    retention_cmd = commands.add_parser('retention', help='حذف الأيام الأقدم من فترة الاحتفاظ')
+    retention_cmd.add_argument('--days', type=int, default=RETENTION_DAYS)
+
+    verify_cmd = commands.add_parser('verify', help='التحقق من تطابق القراءة قبل الضغط وبعده')
+    verify_cmd.add_argument('--codec', default=COMPACTION_CODEC, choices=list(EXTENSIONS))
+    verify_cmd.add_argument('--block-records', type=int, default=SEGMENT_BLOCK_RECORDS)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if getattr(args, 'codec', 'gzip') not in available_codecs():
+        parser.error(f"الترميز {args.codec} يتطلب تثبيت zstandard")
+
+    if args.command == 'compact':
+        result = run_exclusive(lambda: compact(args.dir, args.codec, args.block_records, args.grace), args.dir)
+        if result is None:
+            print("⏳ عملية ضغط أخرى قيد التشغيل")
+        else:
+            print(json.dumps(result, ensure_ascii=False))
+    elif args.command == 'retention':
+        print(json.dumps(run_exclusive(lambda: apply_retention(args.dir, args.days), args.dir), ensure_ascii=False))
+    elif args.command == 'verify':
+        sys.exit(1 if verify(args.dir, args.codec, args.block_records) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# ============== إعدادات التسجيل ==============
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# text: السطر المعتاد | json: كائن JSON لكل سطر (للتجميع في منصات السجلات)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# نسبة أسطر INFO الخاصة بكل رسالة التي تُكتب (1 = الكل، 0.01 = سطر من كل مئة)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+# حد الطابور إذا تأخر stdout: أسطر INFO الزائدة تُسقط بدلاً من حجب الطلبات
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# مسجل أسطر كل رسالة واردة؛ وحده يخضع لأخذ العينات
+MESSAGE_LOGGER = 'whatsapp.messages'
+
+TEXT_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+# حقول LogRecord القياسية؛ ما عداها (من extra=) يُضاف إلى سطر JSON
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """سطر JSON واحد لكل سجل"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """إبقاء نسبة rate من أسطر INFO وما دونها لمسجل الرسائل؛ التحذيرات والأخطاء تبقى دائماً"""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE, name=MESSAGE_LOGGER):
+        super().__init__()
+        self.rate = rate
+        self.sampled_name = name
+        self._prefix = name + '.'
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if record.name != self.sampled_name and not record.name.startswith(self._prefix):
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """يضع السجل في الطابور كما هو: التنسيق كله يتم في خيط المستمع
+
+    QueueHandler الأصلي ينسق الرسالة في خيط الطلب قبل وضعها في الطابور.
+    هنا يُنسخ فقط نص الاستثناء (إن وجد) لأن كائن traceback لا يعيش طويلاً.
+    الطابور محدود: عند امتلائه تُسقط أسطر INFO وتُعد في dropped (وتُبلغ on_drop إن وُجد).
+    """
+
+    dropped = 0
+    on_drop = None
+
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            # التحذيرات والأخطاء لا تُسقط أبداً، حتى لو انتظر الطلب
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogPipeline:
+    """QueueHandler على المسجل الجذر + QueueListener يكتب إلى stdout في خيط خلفي"""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def _make_output(self):
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+        return output
+
+    def setup(self):
+        """تركيب المسار مرة واحدة (بدلاً من logging.basicConfig)"""
+        with self._lock:
+            if self.handler is not None:
+                return
+            q = queue.Queue(LOG_QUEUE_SIZE)
+            self.handler = DeferredQueueHandler(q)
+            self.handler.addFilter(SamplingFilter())
+
+            root = logging.getLogger()
+            root.setLevel(LOG_LEVEL)
+            root.addHandler(self.handler)
+
+            self.listener = QueueListener(q, self._make_output(), respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+
+    def count_drops(self, callback):
+        """callback() لكل سطر يُسقط عند امتلاء الطابور (مثل Counter.inc في المقاييس)؛
+        يُستدعى أولاً بعدد ما أُسقط قبل الربط. لا يعتمد هذا الملف على metrics حتى يبقى أول ما يُستورد"""
+        self.setup()
+        if self.handler.dropped:
+            callback(amount=self.handler.dropped)
+        self.handler.on_drop = callback
+
+    def _after_fork(self):
+        # خيط المستمع لا ينتقل إلى العملية الابنة (مثل عمّال gunicorn --preload):
+        # طابور جديد ومستمع جديد بدلاً من طابور لا يفرغه أحد
+        q = queue.Queue(LOG_QUEUE_SIZE)
+        self.handler.queue = q
+        self.listener = QueueListener(q, self._make_output(), respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """تفريغ الطابور وإيقاف خيط المستمع"""
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+
+pipeline = LogPipeline()
+setup_logging = pipeline.setup
+count_dropped_logs = pipeline.count_drops
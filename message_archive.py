@@ -0,0 +1,481 @@
+import os
+import re
+import json
+import time
+import heapq
+import queue
+import atexit
+import socket
+import logging
+import threading
+from datetime import datetime
+
+from sqlite_store import SQLiteStore, ARCHIVE_SQLITE
+from segments import find_segment, load_index, iter_segment, iter_segment_reverse
+from simulate_batch import BatchParser
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الأرشيف ==============
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'message_logs')
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 200))
+ARCHIVE_FLUSH_INTERVAL = float(os.getenv('ARCHIVE_FLUSH_INTERVAL', 1.0))
+ARCHIVE_QUEUE_SIZE = int(os.getenv('ARCHIVE_QUEUE_SIZE', 10000))
+
+# سياسة fsync:
+#   never    - ترك المزامنة لنظام التشغيل
+#   batch    - fsync بعد كل دفعة
+#   interval - fsync مرة واحدة كل ARCHIVE_FSYNC_INTERVAL ثانية على الأكثر
+ARCHIVE_FSYNC = os.getenv('ARCHIVE_FSYNC', 'batch')
+ARCHIVE_FSYNC_INTERVAL = float(os.getenv('ARCHIVE_FSYNC_INTERVAL', 5.0))
+
+FSYNC_POLICIES = ('never', 'batch', 'interval')
+
+# كل عملية تكتب جزءاً خاصاً بها من ملف اليوم (<العقدة>-<pid>) بدون أي تنسيق بين العمليات؛
+# ARCHIVE_NODE يميز نسخ التطبيق التي تكتب إلى مجلد مشترك (افتراضياً اسم المضيف)
+ARCHIVE_NODE = re.sub(r'[^A-Za-z0-9_-]', '_', os.getenv('ARCHIVE_NODE') or socket.gethostname())
+
+# اسم الجزء لملف اليوم غير المجزأ (ما كُتب قبل تقسيم الأرشيف)
+UNSHARDED = '_'
+
+SHARD_FILE = re.compile(r'^messages_(\d{4}-\d{2}-\d{2})(?:\.([A-Za-z0-9_-]+))?\.jsonl(\.compacting)?$')
+
+_STOP = object()
+# ينهي جمع الدفعة الحالية فوراً بدلاً من انتظار المهلة
+_FLUSH = object()
+
+
+def day_path(date, directory=ARCHIVE_DIR, shard=None):
+    """مسار ملف اليوم بصيغة JSON Lines (shard: جزء عملية واحدة)"""
+    if shard and shard != UNSHARDED:
+        return os.path.join(directory, f'messages_{date}.{shard}.jsonl')
+    return os.path.join(directory, f'messages_{date}.jsonl')
+
+
+def day_shards(date, directory=ARCHIVE_DIR):
+    """أجزاء اليوم: ({الجزء: مسار الملف الحي}، {الجزء: مسار ملف قيد الضغط}) مرتبة بالاسم"""
+    live, compacting = {}, {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return live, compacting
+    for name in sorted(names):
+        match = SHARD_FILE.match(name)
+        if match and match.group(1) == date:
+            target = compacting if match.group(3) else live
+            target[match.group(2) or UNSHARDED] = os.path.join(directory, name)
+    return live, compacting
+
+
+def legacy_day_path(date, directory=ARCHIVE_DIR):
+    """مسار ملف اليوم بالصيغة القديمة (مصفوفة JSON واحدة)"""
+    return os.path.join(directory, f'messages_{date}.json')
+
+
+# ============== الكاتب ==============
+
+class ArchiveWriter:
+    """كاتب إلحاقي: سجل JSON واحد لكل سطر، يُكتب على دفعات من خيط خلفي"""
+
+    def __init__(self, directory=ARCHIVE_DIR, batch_size=ARCHIVE_BATCH_SIZE,
+                 flush_interval=ARCHIVE_FLUSH_INTERVAL, fsync=ARCHIVE_FSYNC,
+                 fsync_interval=ARCHIVE_FSYNC_INTERVAL, queue_size=ARCHIVE_QUEUE_SIZE, node=ARCHIVE_NODE):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"سياسة fsync غير معروفة: {fsync}")
+
+        self.directory = directory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.node = node
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stamp_lock = threading.Lock()
+        self._last_stamp = datetime.min
+        self._last_fsync = 0.0
+
+        # مخازن إضافية تستقبل كل دفعة بعد كتابتها (مثل SQLiteStore)
+        self.stores = []
+
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        """تشغيل خيط الكتابة (مرة واحدة لكل عملية، بما في ذلك بعد fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # الخيوط لا تنتقل عبر fork، لذا نبدأ طابوراً جديداً في العملية الابنة
+            if self._pid is not None:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._stamp_lock = threading.Lock()
+            self._thread = threading.Thread(target=self._run, name='archive-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    @property
+    def shard(self):
+        """جزء هذه العملية من ملفات الأيام"""
+        return f'{self.node}-{os.getpid()}'
+
+    def append(self, record, directory=None):
+        """إضافة سجل إلى الطابور (تكلفة ثابتة مهما كبر ملف اليوم)؛ directory لأرشيف مستأجر
+
+        الكاتب يختم السجل (timestamp، وdate وtime إن لم تُحدد) لحظة إضافته وتحت قفل، فترتيب
+        الطابور هو الترتيب الزمني: الجزء مرتب عبر الدفعات كما يفترض الدمج والمؤشرات العكسية"""
+        self._ensure_started()
+        with self._stamp_lock:
+            # لا رجوع للخلف حتى لو عُدلت ساعة النظام
+            now = self._last_stamp = max(datetime.now(), self._last_stamp)
+            record['timestamp'] = now.isoformat()
+            record.setdefault('date', now.strftime("%Y-%m-%d"))
+            record.setdefault('time', now.strftime("%H:%M:%S"))
+            # الضغط العكسي عند امتلاء الطابور يحجز القفل أيضاً: الإضافات التالية تنتظر بالترتيب
+            self._queue.put((directory or self.directory, record))
+
+    def flush(self):
+        """الانتظار حتى تُكتب جميع السجلات الموجودة في الطابور"""
+        if self._pid == os.getpid():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        """تفريغ الطابور وإيقاف خيط الكتابة"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._pid = None
+        self._thread = None
+
+    def _run(self):
+        q = self._queue
+        while True:
+            try:
+                item = q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            if item is _FLUSH:
+                q.task_done()
+                continue
+
+            batch = []
+            markers = 0
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+
+            # جمع دفعة حتى الحجم الأقصى أو انتهاء المهلة أو طلب flush
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                elif item is _FLUSH:
+                    markers += 1
+                    break
+                else:
+                    batch.append(item)
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error("❌ خطأ في كتابة دفعة الأرشيف: %s", e)
+            finally:
+                for _ in range(len(batch) + markers + (1 if stop else 0)):
+                    q.task_done()
+
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        """كتابة دفعة بعملية write واحدة لكل ملف يوم (في جزء هذه العملية)"""
+        by_file = {}
+        for directory, record in batch:
+            by_file.setdefault((directory, record.get('date', 'unknown')), []).append(record)
+
+        for directory in {directory for directory, _ in by_file}:
+            os.makedirs(directory, exist_ok=True)
+        shard = self.shard
+        for (directory, date), records in by_file.items():
+            # السجلات مختومة بترتيب الطابور (append)، فالجزء مرتب زمنياً بدون فرز حتى يدمجه القارئ
+            data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+            fd = os.open(day_path(date, directory, shard), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # كاتب واحد لكل جزء: لا أقفال ولا تداخل حتى على مجلد مشترك بين عدة خوادم
+                os.write(fd, data)
+                if self._should_fsync():
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        self.written += len(batch)
+        self.batches += 1
+
+        # المخازن الإضافية تفهرس الأرشيف الرئيسي فقط؛ سجلات المستأجرين في مجلداتهم
+        records = [record for directory, record in batch if directory == self.directory]
+        for store in self.stores if records else ():
+            try:
+                store.insert_many(records)
+            except Exception as e:
+                # ملف JSON Lines هو المرجع؛ فشل المخزن الإضافي لا يوقف الأرشيف
+                self.errors += 1
+                logger.error("❌ خطأ في الكتابة إلى %s: %s", type(store).__name__, e)
+
+    def _should_fsync(self):
+        if self.fsync == 'batch':
+            return True
+        if self.fsync == 'interval':
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                self._last_fsync = now
+                return True
+        return False
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'errors': self.errors,
+            'fsync': self.fsync,
+        }
+
+
+# ============== القارئ ==============
+#
+# مصادر اليوم من الأقدم إلى الأحدث:
+#   مقطع مضغوط (بعد الضغط)، أو الملف القديم + أجزاء قيد الضغط (.compacting)
+#   ثم أجزاء JSON Lines الحية
+# وجود المقطع يعني أن الملف القديم وأجزاء الضغط قد دُمجت فيه بالفعل.
+# الأجزاء تُدمج بالطابع الزمني عبر heapq: سجل واحد في الذاكرة لكل جزء مهما كبر اليوم.
+
+def compacting_path(date, directory=ARCHIVE_DIR, shard=None):
+    """ملف JSON Lines بعد نقله جانباً أثناء ضغطه"""
+    return day_path(date, directory, shard) + '.compacting'
+
+
+def _timestamp(record):
+    return record.get('timestamp') or ''
+
+
+def merge_shards(streams):
+    """دمج مسارات سجلات مرتبة زمنياً في مسار واحد مرتب (k-way عبر heapq)"""
+    return heapq.merge(*streams, key=_timestamp)
+
+
+def _read_legacy(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return json.loads(content) if content.strip() else []
+    except ValueError as e:
+        logger.error("❌ ملف سجلات تالف %s: %s", path, e)
+        return []
+
+
+def _iter_legacy(path, block_size=64 * 1024):
+    """قراءة الملف القديم سجلاً بسجل بمحلل تدريجي (بدون تحميل المصفوفة كاملة)"""
+    parser = BatchParser()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block_size)
+            yield from parser.feed(data, final=not data)
+            if parser.error:
+                logger.error("❌ ملف سجلات تالف %s: %s", path, parser.error)
+                return
+            if not data:
+                return
+
+
+def _read_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # سطر غير مكتمل (مثلاً أثناء الكتابة)
+                continue
+
+
+def read_day(date, directory=ARCHIVE_DIR):
+    """قراءة سجلات يوم بالترتيب من جميع مصادره"""
+    segment, codec = find_segment(date, directory)
+    live, compacting = day_shards(date, directory)
+    if segment:
+        yield from iter_segment(segment, codec)
+    else:
+        legacy = legacy_day_path(date, directory)
+        if os.path.exists(legacy):
+            yield from _iter_legacy(legacy)
+        yield from merge_shards(_read_lines(path) for path in compacting.values())
+
+    yield from merge_shards(_read_lines(path) for path in live.values())
+
+
+def _reverse_lines(path, end=None, block_size=64 * 1024):
+    """قراءة أسطر الملف من النهاية إلى البداية: (إزاحة بداية السطر، السطر)"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        buf_start = size if end is None else max(0, min(end, size))
+        buf = b''
+        while True:
+            # السطر الأخير في المخزن يبدأ بعد آخر '\n' يسبقه
+            idx = buf.rfind(b'\n', 0, len(buf) - 1) if buf else -1
+            if idx >= 0 or (buf and buf_start == 0):
+                yield buf_start + idx + 1, buf[idx + 1:]
+                buf = buf[:idx + 1]
+                continue
+            if buf_start == 0:
+                return
+            read = min(block_size, buf_start)
+            buf_start -= read
+            f.seek(buf_start)
+            buf = f.read(read) + buf
+
+
+def _reverse_records(path, end=None):
+    for offset, line in _reverse_lines(path, end):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # سطر غير مكتمل (مثلاً أثناء الكتابة)
+            continue
+        yield offset, record
+
+
+def _tagged(shard, records):
+    for offset, record in records:
+        yield offset, record, shard
+
+
+def encode_positions(positions):
+    """مؤشر الأجزاء: الجزء:الإزاحة لكل جزء مفصولة بفواصل"""
+    return ','.join(f'{shard}:{offset}' for shard, offset in positions.items())
+
+
+def decode_positions(text):
+    positions = {}
+    for item in text.split(','):
+        shard, _, offset = item.rpartition(':')
+        positions[shard or UNSHARDED] = int(offset)
+    return positions
+
+
+def _reverse_shards(shards, ends=None):
+    """دمج عكسي لأجزاء اليوم: (مؤشر الأجزاء، السجل)
+
+    ends: {الجزء: إزاحة النهاية} من مؤشر سابق؛ الأجزاء غير الموجودة فيه أحدث منه فتُتخطى.
+    """
+    positions = {}
+    streams = []
+    # بالترتيب العكسي للأسماء: السجلات المتساوية زمنياً تخرج عكس ترتيب القراءة الأمامية تماماً
+    for shard in reversed(list(shards)):
+        if ends is not None and shard not in ends:
+            continue
+        path = shards[shard]
+        # حجم الجزء الآن هو نهايته لهذه الصفحة، فلا تدخل كتابات أحدث في منتصفها
+        end = ends[shard] if ends is not None else os.path.getsize(path)
+        positions[shard] = end
+        streams.append(_tagged(shard, _reverse_records(path, end)))
+    positions = dict(sorted(positions.items()))
+
+    for offset, record, shard in heapq.merge(*streams, key=lambda item: _timestamp(item[1]), reverse=True):
+        positions[shard] = offset
+        yield encode_positions(positions), record
+
+
+def _reverse_list(logs, end=None):
+    start = len(logs) if end is None else min(end, len(logs))
+    for index in range(start - 1, -1, -1):
+        yield index, logs[index]
+
+
+def read_day_reverse(date, before=None, directory=ARCHIVE_DIR):
+    """قراءة سجلات يوم من الأحدث إلى الأقدم بدون مسح الملف كله: (المؤشر، السجل)
+
+    المؤشر نص معتم يُمرر كـ before للحصول على السجلات الأقدم منه: بادئة m لأجزاء
+    JSON Lines الحية وc لأجزاء الضغط (مع إزاحة كل جزء)، وs للمقطع، وl للملف القديم.
+    """
+    live, compacting = day_shards(date, directory)
+    # المصادر من الأحدث إلى الأقدم: (بادئة المؤشر، دالة القراءة العكسية)
+    sources = []
+    if live:
+        sources.append(('m', lambda end: _reverse_shards(live, end)))
+
+    segment, codec = find_segment(date, directory)
+    if segment:
+        index = load_index(segment)
+        if index is None:
+            # مقطع بدون فهرس صالح (لحظة استبداله): قراءة كاملة ثم عكسها
+            records = list(iter_segment(segment, codec))
+            sources.append(('s', lambda end: _reverse_list(records, end)))
+        else:
+            sources.append(('s', lambda end: iter_segment_reverse(segment, index, end)))
+    else:
+        if compacting:
+            sources.append(('c', lambda end: _reverse_shards(compacting, end)))
+        legacy = legacy_day_path(date, directory)
+        if os.path.exists(legacy):
+            sources.append(('l', lambda end: _reverse_list(_read_legacy(legacy), end)))
+
+    before = str(before) if before else ''
+    prefix = before[:1] if before[:1].isalpha() else ''
+    body = before[len(prefix):]
+    if before and prefix in ('', 'm', 'c'):
+        # مؤشر أجزاء؛ المؤشر الرقمي بدون بادئة (من قبل التقسيم) إزاحة في الملف غير المجزأ
+        end = decode_positions(body)
+        prefix = prefix or 'm'
+    else:
+        end = int(body) if before else None
+
+    # تخطي المصادر الأحدث من المصدر الذي ينتمي إليه المؤشر
+    prefixes = [p for p, _ in sources]
+    if before and prefix in prefixes:
+        sources = sources[prefixes.index(prefix):]
+    elif before:
+        # مؤشر لمصدر لم يعد موجوداً (مثلاً بعد ضغط اليوم)
+        return
+
+    for position, (source_prefix, reader) in enumerate(sources):
+        for cursor, record in reader(end if position == 0 else None):
+            yield f'{source_prefix}{cursor}', record
+
+
+def day_exists(date, directory=ARCHIVE_DIR):
+    """هل توجد سجلات لهذا اليوم؟"""
+    return (os.path.exists(legacy_day_path(date, directory))
+            or find_segment(date, directory)[0] is not None
+            or any(day_shards(date, directory)))
+
+
+# الكاتب المشترك للتطبيق
+archive = ArchiveWriter()
+atexit.register(archive.close)
+
+# مخزن SQLite الاختياري للبحث (ARCHIVE_SQLITE=<مسار قاعدة البيانات>)
+message_store = SQLiteStore(ARCHIVE_SQLITE) if ARCHIVE_SQLITE else None
+if message_store is not None:
+    archive.stores.append(message_store)
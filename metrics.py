@@ -0,0 +1,180 @@
+import os
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+from message_archive import ARCHIVE_DIR
+from snapshots import PidSnapshots
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات المقاييس ==============
+
+# مجلد لقطات العمّال: كل عملية تكتب قيمها في ملف خاص بها و/metrics يجمعها
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(ARCHIVE_DIR, '.metrics'))
+# أقل فاصل بالثواني بين كتابتين للقطة العملية
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5.0))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# حدود الزمن بالثواني: من 10 ميكروثانية حتى 2.5 ثانية
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============== أنواع المقاييس ==============
+
+class Counter:
+    """عدّاد تراكمي لكل مجموعة قيم للتسميات"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(into, entries):
+        for labels, value in entries:
+            key = tuple(labels)
+            into[key] = into.get(key, 0) + value
+
+    def render(self, values):
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """توزيع القيم على حدود ثابتة مع المجموع والعدد (بصيغة Prometheus)"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def observe(self, value, *labels):
+        # الحد يُحسب خارج القفل؛ داخله زيادتان فقط
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total] for labels, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def merge(into, entries):
+        for labels, counts, total in entries:
+            key = tuple(labels)
+            entry = into.get(key)
+            if entry is None:
+                into[key] = [list(counts), total]
+                continue
+            for i, count in enumerate(counts):
+                entry[0][i] += count
+            entry[1] += total
+
+    def render(self, values):
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{le} {cumulative}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(total)}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+# ============== السجل والتجميع بين العمليات ==============
+
+class Registry:
+    """جميع المقاييس المسجلة، مع لقطة لكل عملية في METRICS_DIR تُجمع عند العرض"""
+
+    def __init__(self, directory=METRICS_DIR, interval=METRICS_SNAPSHOT_INTERVAL):
+        self._metrics = {}
+        self.snapshots = PidSnapshots(directory, 'metrics_', interval, self.snapshot, 'المقاييس')
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"مقياس مكرر: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def write_snapshot(self):
+        self.snapshots.write()
+
+    def maybe_write_snapshot(self):
+        self.snapshots.maybe_write()
+
+    def collect(self):
+        """القيم المجمعة: القيم الحية لهذه العملية + آخر لقطة لكل عملية أخرى"""
+        merged = {name: {} for name in self._metrics}
+        for snapshot in [self.snapshot(), *self.snapshots.others()]:
+            for name, entries in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], entries)
+        return merged
+
+    def render(self):
+        """نص المقاييس بصيغة Prometheus"""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+    def clear_snapshots(self, stale_only=False):
+        """حذف لقطات العمليات السابقة (عند بدء الخادم)"""
+        self.snapshots.clear(stale_only)
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.snapshots.write_final)
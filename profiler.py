@@ -0,0 +1,161 @@
+"""محلل أداء بالعينات لعملية الخادم الحية
+
+يأخذ عينة من مكدس كل خيط عبر sys._current_frames كل PROFILE_INTERVAL ثانية،
+ويخرج النتيجة بصيغة المكادس المطوية (collapsed stacks) التي تقبلها أدوات
+flamegraph.pl وspeedscope وinferno. لا يعمل أي شيء ما لم يُطلب تحليل.
+
+طرق التشغيل:
+    GET /admin/profile?seconds=10          (مع ترويسة X-Admin-Token)
+    kill -USR2 <pid العامل>                 (يُحفظ الملف في PROFILE_DIR)
+    ترويسة X-Debug-Profile: <ADMIN_TOKEN>   (عينات خيط ذلك الطلب فقط،
+                                            تُقرأ من /admin/profile/requests)
+
+كل عامل في gunicorn عملية مستقلة، فالتحليل يخص العامل الذي استقبل الطلب.
+"""
+import os
+import sys
+import hmac
+import time
+import signal
+import logging
+import threading
+from collections import Counter
+
+from message_archive import ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات التحليل ==============
+
+# بدون رمز تكون نقاط الإدارة وترويسة التحليل معطلة بالكامل
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+PROFILE_SIGNAL_SECONDS = float(os.getenv('PROFILE_SIGNAL_SECONDS', 10))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(ARCHIVE_DIR, '.profiles'))
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+DEBUG_HEADER = 'X-Debug-Profile'
+
+
+def check_token(value):
+    """مقارنة ثابتة الزمن مع ADMIN_TOKEN"""
+    return bool(ADMIN_TOKEN) and bool(value) and hmac.compare_digest(value, ADMIN_TOKEN)
+
+
+def collapse(frame, thread_name):
+    """مكدس الخيط من الجذر إلى الإطار الحالي: thread;file:func;file:func"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    names.append(thread_name.replace(' ', '_'))
+    return ';'.join(reversed(names))
+
+
+def format_collapsed(counts):
+    """سطر لكل مكدس: المكدس ثم عدد العينات"""
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+class Profiler:
+    """خيط أخذ العينات يعمل فقط أثناء تحليل مطلوب"""
+
+    def __init__(self, interval=PROFILE_INTERVAL, directory=PROFILE_DIR):
+        self.interval = interval
+        self.directory = directory
+        self._session_lock = threading.Lock()
+        # خيوط الطلبات التي تحمل ترويسة التحليل، وعيناتها المتراكمة
+        self._debug_threads = set()
+        self._debug_counts = Counter()
+        self._debug_lock = threading.Lock()
+        self._debug_sampler = None
+
+    # ---------- أخذ العينات ----------
+
+    def _sample(self, counts, threads=None):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (threads is not None and ident not in threads):
+                continue
+            counts[collapse(frame, names.get(ident, str(ident)))] += 1
+
+    def profile(self, seconds, interval=None):
+        """تحليل جميع الخيوط لمدة seconds (يحجب المستدعي)؛ None إذا كان هناك تحليل جارٍ"""
+        if not self._session_lock.acquire(blocking=False):
+            return None
+        try:
+            interval = interval or self.interval
+            seconds = min(seconds, PROFILE_MAX_SECONDS)
+            counts = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                self._sample(counts)
+                time.sleep(interval)
+            return format_collapsed(counts)
+        finally:
+            self._session_lock.release()
+
+    def profile_to_file(self, seconds=PROFILE_SIGNAL_SECONDS):
+        """تحليل في خيط خلفي وحفظ النتيجة في PROFILE_DIR (للإشارات)"""
+        def run():
+            result = self.profile(seconds)
+            if result is None:
+                logger.warning("⏳ يوجد تحليل أداء جارٍ بالفعل")
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'profile_{os.getpid()}_{int(time.time())}.folded')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(result)
+            logger.info("🔬 تم حفظ تحليل الأداء في %s", path)
+
+        threading.Thread(target=run, name='profiler', daemon=True).start()
+
+    # ---------- تحليل طلبات محددة ----------
+
+    def begin_request(self):
+        """بدء أخذ عينات خيط الطلب الحالي"""
+        with self._debug_lock:
+            self._debug_threads.add(threading.get_ident())
+            if self._debug_sampler is None:
+                self._debug_sampler = threading.Thread(target=self._run_debug_sampler,
+                                                       name='profiler-requests', daemon=True)
+                self._debug_sampler.start()
+
+    def end_request(self):
+        with self._debug_lock:
+            self._debug_threads.discard(threading.get_ident())
+
+    def _run_debug_sampler(self):
+        # يتوقف الخيط بمجرد عدم وجود طلبات قيد التحليل
+        while True:
+            with self._debug_lock:
+                threads = set(self._debug_threads)
+                if not threads:
+                    self._debug_sampler = None
+                    return
+                self._sample(self._debug_counts, threads)
+            time.sleep(self.interval)
+
+    def request_profile(self, reset=False):
+        """العينات المتراكمة من الطلبات المحللة"""
+        with self._debug_lock:
+            result = format_collapsed(self._debug_counts)
+            if reset:
+                self._debug_counts.clear()
+        return result
+
+    def install_signal_handler(self):
+        """تحليل لمدة PROFILE_SIGNAL_SECONDS عند استقبال SIGUSR2 (من الخيط الرئيسي فقط)"""
+        if not hasattr(signal, 'SIGUSR2'):
+            return
+        try:
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.profile_to_file())
+        except ValueError:
+            pass
+
+
+profiler = Profiler()
+profiler.install_signal_handler()
@@ -0,0 +1,229 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+
+from allowlist import canonicalize
+from message_archive import ARCHIVE_DIR
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات تحديد المعدل ==============
+
+# عدد الرسائل المسموحة لكل مرسل في الدقيقة (0 = معطل)
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', 0))
+# أقصى عدد رسائل متتالية قبل بدء التقييد
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 10))
+# ملف الجدول المشترك بين عمّال gunicorn
+RATE_LIMIT_FILE = os.getenv('RATE_LIMIT_FILE', os.path.join(ARCHIVE_DIR, '.ratelimit'))
+# حدود إضافية لكل فئة أو رقم (JSON)، انظر load_tiers
+RATE_LIMITS_FILE = os.getenv('RATE_LIMITS_FILE', '')
+RATE_LIMIT_SLOTS = int(os.getenv('RATE_LIMIT_SLOTS', 65536))
+# المرسل الخامل أكثر من هذه المدة يُحذف من الجدول عند الحاجة لمكانه
+RATE_LIMIT_IDLE = float(os.getenv('RATE_LIMIT_IDLE', 600))
+
+# ============== شكل الجدول ==============
+#
+# ترويسة ثابتة ثم خانات بحجم ثابت (بصمة الرقم، الرصيد، آخر تحديث). الخانات
+# مقسمة إلى مجموعات من BUCKET_WAYS خانة: الرقم يقع دائماً في نفس المجموعة،
+# فيكفي قفل مدى المجموعة في الملف وقراءتها بعملية unpack واحدة.
+
+MAGIC = b'RLTB0001'
+HEADER = struct.Struct('<8sQ')
+HEADER_SIZE = 64
+SLOT = struct.Struct('<Qdd')
+BUCKET_WAYS = 8
+BUCKET = struct.Struct('<' + 'Qdd' * BUCKET_WAYS)
+
+
+class Limit:
+    """حد دلو الرموز: rate رمز في الثانية وسعة burst"""
+
+    __slots__ = ('rate', 'burst')
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+
+def load_tiers(path):
+    """قراءة ملف الفئات:
+
+    {"default": {"per_minute": 20, "burst": 10},
+     "allowlisted": {"per_minute": 60, "burst": 20},
+     "numbers": {"+966500000000": {"per_minute": 600, "burst": 100}}}
+
+    per_minute = 0 يعني بلا حد لهذه الفئة.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    def limit(entry):
+        return Limit(float(entry.get('per_minute', 0)), float(entry.get('burst', RATE_LIMIT_BURST)))
+
+    tiers = {name: limit(data[name]) for name in ('default', 'allowlisted') if name in data}
+    numbers = {canonicalize(number) or number: limit(entry) for number, entry in data.get('numbers', {}).items()}
+    return tiers, numbers
+
+
+def _key(number):
+    # 0 محجوز للخانة الفارغة
+    return int.from_bytes(hashlib.blake2b(number.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class RateLimiter:
+    """دلو رموز لكل مرسل في جدول mmap مشترك بين العمليات"""
+
+    def __init__(self, path=RATE_LIMIT_FILE, slots=RATE_LIMIT_SLOTS, default=None,
+                 allowlisted=None, numbers=None, idle=RATE_LIMIT_IDLE):
+        self.path = path
+        self.buckets = max(1, slots // BUCKET_WAYS)
+        self.default = default or Limit(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+        self.allowlisted = allowlisted
+        self.numbers = numbers or {}
+        self.idle = idle
+        # قفل الملف لا يمنع خيوط نفس العملية من بعضها
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+        self.evictions = 0
+        self._fd, self._map = self._open()
+
+    def _open(self):
+        size = HEADER_SIZE + self.buckets * BUCKET.size
+        if not self.path:
+            # بدون ملف: جدول خاص بالعملية (مشترك فقط مع العمليات المتفرعة بعد إنشائه)
+            return None, mmap.mmap(-1, size)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            # أول عامل يُنشئ الجدول، أو يعيد تهيئته إذا تغير عدد الخانات
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) < HEADER.size or HEADER.unpack(header) != (MAGIC, self.buckets) or \
+                    os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HEADER.pack(MAGIC, self.buckets), 0)
+        finally:
+            if fcntl is not None:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+        return fd, mmap.mmap(fd, size)
+
+    def limit_for(self, number, is_listed=None):
+        """حد المرسل: الرقم نفسه ثم فئة القائمة المسموحة ثم الافتراضي"""
+        limit = self.numbers.get(number)
+        if limit is not None:
+            return limit
+        if self.allowlisted is not None and is_listed is not None and is_listed(number):
+            return self.allowlisted
+        return self.default
+
+    def allow(self, sender, is_listed=None):
+        """استهلاك رمز للمرسل؛ False إذا تجاوز حده"""
+        # المسار السريع لصيغة Twilio المعتادة (whatsapp:+E.164)
+        number = sender[9:] if sender.startswith('whatsapp:+') and sender[10:].isdigit() else \
+            canonicalize(sender) or sender
+        limit = self.limit_for(number, is_listed)
+        if limit.unlimited:
+            return True
+        if limit.burst < 1:
+            self.throttled += 1
+            return False
+
+        key = _key(number)
+        offset = HEADER_SIZE + (key % self.buckets) * BUCKET.size
+        now = time.time()
+
+        with self._lock:
+            if self._fd is not None and fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET.size, offset)
+            try:
+                allowed = self._take(key, offset, now, limit)
+            finally:
+                if self._fd is not None and fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET.size, offset)
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.throttled += 1
+        return allowed
+
+    def _take(self, key, offset, now, limit):
+        values = BUCKET.unpack_from(self._map, offset)
+        way = free = oldest = None
+        keys = values[0::3]
+        if key in keys:
+            way = keys.index(key)
+        else:
+            stamps = values[2::3]
+            oldest = stamps.index(min(stamps))
+            for i, slot_key in enumerate(keys):
+                if slot_key == 0 or now - stamps[i] > self.idle:
+                    free = i
+                    break
+
+        if way is not None:
+            tokens, last = values[way * 3 + 1], values[way * 3 + 2]
+            tokens = min(limit.burst, tokens + max(0.0, now - last) * limit.rate)
+        else:
+            # مرسل جديد: خانة فارغة أو خاملة، وإلا الأقدم تحديثاً
+            if free is None:
+                free = oldest
+                self.evictions += 1
+            way = free
+            tokens = limit.burst
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        SLOT.pack_into(self._map, offset + way * SLOT.size, key, tokens, now)
+        return allowed
+
+    def stats(self):
+        return {
+            'shared': self._fd is not None,
+            'slots': self.buckets * BUCKET_WAYS,
+            'allowed': self.allowed,
+            'throttled': self.throttled,
+            'evictions': self.evictions,
+        }
+
+
+def create_rate_limiter():
+    """المحدد حسب متغيرات البيئة (لا يُنشأ الجدول إذا كان التحديد معطلاً)"""
+    tiers, numbers = {}, {}
+    if RATE_LIMITS_FILE:
+        try:
+            tiers, numbers = load_tiers(RATE_LIMITS_FILE)
+        except (OSError, ValueError) as e:
+            logger.error("❌ خطأ في قراءة حدود المعدل %s: %s", RATE_LIMITS_FILE, e)
+
+    default = tiers.get('default', Limit(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST))
+    allowlisted = tiers.get('allowlisted')
+    if default.unlimited and not numbers and (allowlisted is None or allowlisted.unlimited):
+        return None
+
+    try:
+        return RateLimiter(default=default, allowlisted=allowlisted, numbers=numbers)
+    except OSError as e:
+        logger.error("❌ تعذر فتح جدول تحديد المعدل %s: %s، سيُستخدم جدول خاص بالعملية", RATE_LIMIT_FILE, e)
+        return RateLimiter(path='', default=default, allowlisted=allowlisted, numbers=numbers)
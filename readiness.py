@@ -0,0 +1,81 @@
+import os
+import time
+import logging
+
+# أول استيراد لهذه الوحدة هو بداية قياس زمن الإقلاع (تُستورد أولاً في app.py وgunicorn.conf.py)
+PROCESS_STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """زمن الإقلاع مقسماً على مراحله، وحالة الجاهزية (منفصلة عن مجرد كون العملية حية)"""
+
+    def __init__(self):
+        self.phases = {}
+        self.ready = False
+        self.draining = False
+        self.cold_start = None
+        self.worker_boot = None
+        self.preloaded = False
+        self._last = PROCESS_STARTED
+        self._forked_at = None
+        self._checks = {}
+
+    def mark(self, phase):
+        """تسجيل مدة المرحلة المنتهية الآن (منذ المرحلة السابقة)"""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last, 4)
+        self._last = now
+
+    def add_check(self, name, check):
+        """فحص إضافي للجاهزية: دالة بدون معاملات تُرجع True/False"""
+        self._checks[name] = check
+
+    def set_ready(self):
+        self.ready = True
+        self.cold_start = round(time.perf_counter() - PROCESS_STARTED, 4)
+        logger.info("🚀 جاهز لاستقبال الطلبات خلال %.3fs %s", self.cold_start, self.phases)
+
+    def set_draining(self):
+        """إيقاف الجاهزية عند الإغلاق حتى يتوقف موزع الحمل عن إرسال طلبات جديدة"""
+        self.draining = True
+
+    # ---------- عمّال gunicorn ----------
+
+    def worker_forked(self):
+        """يُستدعى في العامل بعد fork من عملية رئيسية حمّلت التطبيق مسبقاً"""
+        self.preloaded = self.ready
+        self._forked_at = time.perf_counter()
+
+    def worker_initialized(self):
+        if self._forked_at is not None:
+            self.worker_boot = round(time.perf_counter() - self._forked_at, 4)
+
+    # ---------- التقرير ----------
+
+    def checks(self):
+        results = {'warmup': self.ready, 'accepting': not self.draining}
+        for name, check in self._checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception:
+                results[name] = False
+        return results
+
+    def is_ready(self):
+        return all(self.checks().values())
+
+    def payload(self):
+        return {
+            'ready': self.is_ready(),
+            'checks': self.checks(),
+            'cold_start_seconds': self.cold_start,
+            'phases': self.phases,
+            'preloaded': self.preloaded,
+            'worker_boot_seconds': self.worker_boot,
+            'pid': os.getpid(),
+        }
+
+
+readiness = Readiness()
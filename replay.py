@@ -0,0 +1,311 @@
+"""إعادة تشغيل الرسائل المؤرشفة عبر القواعد الحالية قبل تغيير جدول الكلمات
+
+يقرأ أيام الأرشيف تدفقياً (أجزاء JSON Lines، والمقاطع المضغوطة، والملفات القديمة بمحلل
+تدريجي)، ويطابق كل رسالة بالقواعد عبر مجمع عمليات، ثم يقارن الرد بحقل response المسجل.
+الذاكرة محدودة بعدد الدفعات قيد المعالجة مهما كان عدد الأيام: الفروق تُكتب سطراً سطراً
+في ملف NDJSON، والتقرير يحوي العدادات لكل كلمة وتوزيع الزمن (مدرج تكراري) والإنتاجية.
+
+التشغيل:
+    python replay.py [--from 2024-01-01] [--to 2024-03-31] [--rules responses.json] [--workers 4]
+                     [--report replay_report.json] [--diffs replay_diffs.ndjson] [--fail-on-diff]
+"""
+import os
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+from collections import deque
+from datetime import datetime
+
+from log_compaction import list_days
+from message_archive import ARCHIVE_DIR, read_day
+from rules import RULES_FILE, RuleSet, load_rules_file
+from simulate_batch import create_pool
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات إعادة التشغيل ==============
+
+# عدد الرسائل في كل دفعة تُرسل إلى عامل واحد
+REPLAY_CHUNK = int(os.getenv('REPLAY_CHUNK', 1000))
+# أمثلة الفروق المحفوظة في التقرير لكل كلمة (الفروق كاملة في ملف --diffs)
+REPLAY_SAMPLES = int(os.getenv('REPLAY_SAMPLES', 5))
+
+# اسم الكلمة في التقرير للرسائل التي لم تطابق أي قاعدة
+DEFAULT_KEY = '(default)'
+# سجلات بدون حقل keyword (الصيغة الأولى) وردها المسجل لا يطابق أي رد حالي
+UNKNOWN_KEY = '(unknown)'
+
+
+class LatencyHistogram:
+    """توزيع الزمن بفئات لوغاريتمية (خطأ أقل من 5% في المئين) بذاكرة ثابتة مهما كان عدد العينات"""
+
+    GROWTH = 1.05
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def observe(self, ns):
+        bucket = int(math.log(max(ns, 1), self.GROWTH))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self, p):
+        target = p * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                # منتصف الفئة
+                return self.GROWTH ** (bucket + 0.5) / 1000
+        return 0.0
+
+    def summary(self):
+        if not self.count:
+            return {}
+        return {
+            'p50_us': round(self.percentile(0.50), 2),
+            'p95_us': round(self.percentile(0.95), 2),
+            'p99_us': round(self.percentile(0.99), 2),
+            'max_us': round(self.max_ns / 1000, 2),
+            'mean_us': round(self.total_ns / self.count / 1000, 2),
+        }
+
+
+# ============== العامل ==============
+
+_rules = None
+# الرد الثابت ← كلمته (None للرد الافتراضي) لاستنتاج كلمة السجلات القديمة
+_reply_keywords = {}
+
+
+def load_rules(path):
+    """تحميل القواعد مرة واحدة في كل عامل (نفس ما يبنيه registry لـ process_message)"""
+    global _rules, _reply_keywords
+    _rules = RuleSet(load_rules_file(path), source=path)
+    _reply_keywords = {_rules.default: None}
+    for keyword, reply in reversed(list(_rules.replies.items())):
+        if not callable(reply):
+            # أول قاعدة بنفس الرد هي التي تُطابق أولاً
+            _reply_keywords[reply] = keyword
+
+
+def infer_keyword(recorded, keyword):
+    """كلمة سجل بدون حقل keyword من رده المسجل؛ رد قالب لا يُعكس فيُنسب للقاعدة الديناميكية الحالية"""
+    if recorded in _reply_keywords:
+        return _reply_keywords[recorded]
+    if keyword is not None and callable(_rules.replies[keyword]):
+        return keyword
+    return UNKNOWN_KEY
+
+
+def replay_chunk(records):
+    """مطابقة دفعة: (الفروق، {الكلمة المسجلة: [رسائل، مختلفة، ديناميكية]}، المدرج)"""
+    diffs = []
+    counts = {}
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+    for timestamp, message, recorded_keyword, has_keyword, recorded in records:
+        started = clock()
+        keyword, match_type, response = _rules.resolve(message)
+        histogram.observe(clock() - started)
+
+        if not has_keyword:
+            recorded_keyword = infer_keyword(recorded, keyword)
+        entry = counts.setdefault(recorded_keyword or DEFAULT_KEY, [0, 0, 0])
+        entry[0] += 1
+        if response == recorded:
+            continue
+        # ردود القوالب ({now}) تتغير في كل مرة، فلا تُعد فرقاً في جدول الكلمات
+        if keyword is not None and callable(_rules.replies[keyword]):
+            entry[2] += 1
+            continue
+        entry[1] += 1
+        diffs.append({
+            'timestamp': timestamp,
+            'message': message,
+            'keyword_before': recorded_keyword,
+            'keyword_inferred': not has_keyword,
+            'keyword_after': keyword,
+            'match_type': match_type,
+            'recorded': recorded,
+            'replayed': response,
+        })
+    return diffs, counts, histogram
+
+
+# ============== التشغيل ==============
+
+def iter_records(days, directory):
+    """(الطابع الزمني، الرسالة، الكلمة المسجلة، هل سُجلت الكلمة، الرد المسجل) لكل رسالة لها رد"""
+    for day in days:
+        for record in read_day(day, directory):
+            message, response = record.get('message'), record.get('response')
+            if isinstance(message, str) and message and isinstance(response, str):
+                yield record.get('timestamp'), message, record.get('keyword'), 'keyword' in record, response
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ReplayReport:
+    """تجميع نتائج الدفعات: العدادات لكل كلمة، وانتقالات الكلمات، وأمثلة محدودة"""
+
+    def __init__(self, samples=REPLAY_SAMPLES, diffs_file=None):
+        self.samples = samples
+        self.diffs_file = diffs_file
+        self.messages = 0
+        self.changed = 0
+        self.dynamic = 0
+        self.by_keyword = {}
+        self.transitions = {}
+        self.examples = {}
+        self.latency = LatencyHistogram()
+
+    def add(self, result):
+        diffs, counts, histogram = result
+        self.latency.merge(histogram)
+        for keyword, (messages, changed, dynamic) in counts.items():
+            entry = self.by_keyword.setdefault(keyword, {'messages': 0, 'changed': 0, 'dynamic': 0})
+            entry['messages'] += messages
+            entry['changed'] += changed
+            entry['dynamic'] += dynamic
+            self.messages += messages
+            self.changed += changed
+            self.dynamic += dynamic
+        for diff in diffs:
+            before = diff['keyword_before'] or DEFAULT_KEY
+            transition = f"{before} → {diff['keyword_after'] or DEFAULT_KEY}"
+            self.transitions[transition] = self.transitions.get(transition, 0) + 1
+            examples = self.examples.setdefault(before, [])
+            if len(examples) < self.samples:
+                examples.append(diff)
+            if self.diffs_file is not None:
+                self.diffs_file.write(json.dumps(diff, ensure_ascii=False) + '\n')
+
+    def to_dict(self, **extra):
+        by_keyword = dict(sorted(self.by_keyword.items(), key=lambda item: -item[1]['changed']))
+        for keyword, entry in by_keyword.items():
+            entry['examples'] = self.examples.get(keyword, [])
+        return {
+            **extra,
+            'messages': self.messages,
+            'unchanged': self.messages - self.changed - self.dynamic,
+            'changed': self.changed,
+            'dynamic': self.dynamic,
+            'latency': self.latency.summary(),
+            'transitions': dict(sorted(self.transitions.items(), key=lambda item: -item[1])),
+            'by_keyword': by_keyword,
+        }
+
+
+def replay(days, directory=ARCHIVE_DIR, rules_path=RULES_FILE, workers=0, chunk_size=REPLAY_CHUNK,
+           samples=REPLAY_SAMPLES, diffs_file=None):
+    """إعادة تشغيل الأيام المحددة؛ إرجاع التقرير كقاموس
+
+    الذاكرة: دفعة واحدة بدون مجمع، أو ضعف عدد العمّال من الدفعات مع المجمع.
+    """
+    report = ReplayReport(samples, diffs_file)
+    pool = None
+    if workers > 1:
+        # كل عامل يبني المطابق مرة واحدة عند بدئه (بدون نقل القواعد مع كل دفعة)
+        pool = create_pool(workers, load_rules, (rules_path,))
+    else:
+        load_rules(rules_path)
+
+    in_flight = deque()
+    started = time.perf_counter()
+    try:
+        for chunk in chunked(iter_records(days, directory), chunk_size):
+            if pool is None:
+                report.add(replay_chunk(chunk))
+                continue
+            in_flight.append(pool.submit(replay_chunk, chunk))
+            while len(in_flight) > workers * 2:
+                report.add(in_flight.popleft().result())
+        while in_flight:
+            report.add(in_flight.popleft().result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return report.to_dict(
+        rules=rules_path,
+        directory=directory,
+        days={'from': days[0], 'to': days[-1], 'count': len(days)} if days else {},
+        workers=workers,
+        generated_at=datetime.now().isoformat(),
+        elapsed_seconds=round(elapsed, 3),
+        messages_per_second=round(report.messages / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=ARCHIVE_DIR)
+    parser.add_argument('--from', dest='date_from', help='أول يوم (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', help='آخر يوم (YYYY-MM-DD)')
+    parser.add_argument('--rules', default=RULES_FILE, help='ملف القواعد المراد اختباره')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk', type=int, default=REPLAY_CHUNK)
+    parser.add_argument('--samples', type=int, default=REPLAY_SAMPLES)
+    parser.add_argument('--report', default='replay_report.json')
+    parser.add_argument('--diffs', default='', help='ملف NDJSON لجميع الفروق')
+    parser.add_argument('--fail-on-diff', action='store_true', help='الخروج بكود 1 إذا تغيّر أي رد')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.workers < 0:
+        parser.error("--workers يجب أن يكون 0 أو أكثر")
+    days = [day for day in list_days(args.dir)
+            if (not args.date_from or day >= args.date_from) and (not args.date_to or day <= args.date_to)]
+    if not days:
+        print(f"⚠️ لا توجد أيام في {args.dir} ضمن الفترة المحددة")
+        return 1
+
+    print(f"🔁 إعادة تشغيل {len(days)} يوم ({days[0]} ← {days[-1]}) بقواعد {args.rules}، {args.workers} عامل")
+    diffs_file = open(args.diffs, 'w', encoding='utf-8') if args.diffs else None
+    try:
+        report = replay(days, args.dir, args.rules, args.workers, max(1, args.chunk), args.samples, diffs_file)
+    finally:
+        if diffs_file is not None:
+            diffs_file.close()
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"📊 {report['messages']} رسالة خلال {report['elapsed_seconds']}s "
+          f"({report['messages_per_second']:,} رسالة/ث)، الزمن {report['latency']}")
+    print(f"{'✅' if not report['changed'] else '⚠️'} {report['changed']} رد مختلف، "
+          f"{report['dynamic']} رد ديناميكي، {report['unchanged']} بدون تغيير")
+    for transition, count in list(report['transitions'].items())[:10]:
+        print(f"   {count:>8}  {transition}")
+    print(f"📝 التقرير: {args.report}" + (f"، الفروق: {args.diffs}" if args.diffs else ''))
+    return 1 if args.fail_on_diff and report['changed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import threading
+from datetime import datetime
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات سجل القواعد ==============
+
+RULES_FILE = os.getenv('RULES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'responses.json'))
+RULES_CHECK_INTERVAL = float(os.getenv('RULES_CHECK_INTERVAL', 2.0))
+
+# مرحلة المطابقة التقريبية بعد التطابق الكامل والجزئي (helo ← hello، شكرن ← شكرا)
+FUZZY_MATCH = os.getenv('FUZZY_MATCH', '').lower() in ('1', 'true', 'yes')
+# أكبر مسافة تحرير مقبولة، وأقل تشابه (1 - المسافة / طول الكلمة)، وأقصر كلمة تُطابق تقريبياً
+FUZZY_MAX_DISTANCE = int(os.getenv('FUZZY_MAX_DISTANCE', 2))
+FUZZY_MIN_SIMILARITY = float(os.getenv('FUZZY_MIN_SIMILARITY', 0.75))
+FUZZY_MIN_LENGTH = int(os.getenv('FUZZY_MIN_LENGTH', 3))
+# أقصى عدد كلمات يُبحث عنها تقريبياً في الرسالة الواحدة (يحد زمن الرسائل الطويلة)
+FUZZY_MAX_TOKENS = int(os.getenv('FUZZY_MAX_TOKENS', 8))
+
+
+def fuzzy_settings():
+    """إعدادات FuzzyIndex من متغيرات البيئة، أو None إذا لم تُفعّل"""
+    if not FUZZY_MATCH:
+        return None
+    return {
+        'max_distance': FUZZY_MAX_DISTANCE,
+        'min_similarity': FUZZY_MIN_SIMILARITY,
+        'min_length': FUZZY_MIN_LENGTH,
+        'max_tokens': FUZZY_MAX_TOKENS,
+    }
+
+
+def load_rules_file(path):
+    """قراءة ملف القواعد (JSON، أو YAML إذا كانت مكتبة PyYAML مثبتة)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("ملفات YAML تتطلب تثبيت PyYAML")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _dynamic_reply(template):
+    """رد ديناميكي: يُحسب فقط عند مطابقة كلمته"""
+    def render():
+        return template.format(now=datetime.now())
+    return render
+
+
+# ============== لقطة القواعد ==============
+
+class RuleSet:
+    """لقطة ثابتة من القواعد: الردود والمطابق المبني مسبقاً"""
+
+    def __init__(self, data, source=None, mtime=None):
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+        self.default = sys.intern(data['default'])
+
+        self.replies = {}
+        for rule in data['rules']:
+            keyword = rule['keyword']
+            if 'template' in rule:
+                self.replies[keyword] = _dynamic_reply(rule['template'])
+            else:
+                self.replies[keyword] = sys.intern(rule['reply'])
+
+        self.matcher = KeywordMatcher(self.replies, fuzzy=fuzzy_settings())
+
+    def resolve(self, message):
+        """إرجاع (الكلمة، نوع التطابق، نص الرد) حيث النوع exact أو partial أو fuzzy أو default"""
+        keyword, match_type = self.matcher.match(message)
+        if keyword is None:
+            return None, 'default', self.default
+
+        reply = self.replies[keyword]
+        if callable(reply):
+            reply = reply()
+        return keyword, match_type, reply
+
+    def static_replies(self):
+        """الردود الثابتة فقط (بدون الديناميكية)"""
+        return [reply for reply in self.replies.values() if not callable(reply)] + [self.default]
+
+
+# ============== السجل القابل لإعادة التحميل ==============
+
+class RuleRegistry:
+    """يحمل اللقطة الحالية ويستبدلها بالكامل عند تغيّر الملف أو عند SIGHUP"""
+
+    def __init__(self, path=RULES_FILE, check_interval=RULES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._listeners = []
+        self._snapshot = self._build()
+
+    def _build(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        return RuleSet(load_rules_file(self.path), source=self.path, mtime=mtime)
+
+    @property
+    def current(self):
+        """اللقطة الحالية (قراءة بدون قفل؛ الفحص الدوري لتغيّر الملف رخيص)"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self._check_for_changes()
+        return self._snapshot
+
+    def on_reload(self, callback):
+        """تسجيل دالة تُستدعى بعد تحميل لقطة جديدة"""
+        self._listeners.append(callback)
+
+    def _check_for_changes(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._snapshot.mtime:
+            self.reload()
+
+    def reload(self):
+        """بناء لقطة جديدة واستبدال القديمة بإسناد واحد"""
+        # طلب واحد فقط يعيد البناء؛ البقية تكمل باللقطة القديمة
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            snapshot = self._build()
+            self._snapshot = snapshot
+            logger.info("🔄 تم تحميل القواعد من %s (%s قاعدة)", self.path, len(snapshot.replies))
+            for callback in self._listeners:
+                callback(snapshot)
+            return True
+        except Exception as e:
+            # نحتفظ باللقطة القديمة إذا كان الملف الجديد غير صالح
+            logger.error("❌ خطأ في تحميل القواعد من %s: %s", self.path, e)
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def install_signal_handler(self):
+        """إعادة التحميل عند استقبال SIGHUP (يعمل فقط من الخيط الرئيسي)"""
+        if not hasattr(signal, 'SIGHUP'):
+            return
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        except ValueError:
+            pass
+
+
+registry = RuleRegistry()
+registry.install_signal_handler()
@@ -0,0 +1,169 @@
+import io
+import os
+import gzip
+import json
+from bisect import bisect_right
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ============== ترميز المقاطع ==============
+#
+# المقطع ملف JSON Lines مضغوط على شكل كتل مستقلة (عضو gzip أو إطار zstd لكل
+# SEGMENT_BLOCK_RECORDS سجل). الكتل المتتالية تبقى ملفاً صالحاً لأدوات zcat/zstdcat،
+# والفهرس الجانبي يحفظ إزاحة كل كتلة ليقفز القارئ مباشرة إلى الصفحة المطلوبة.
+
+SEGMENT_BLOCK_RECORDS = int(os.getenv('SEGMENT_BLOCK_RECORDS', 1000))
+
+EXTENSIONS = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+def available_codecs():
+    return ['gzip'] + (['zstd'] if zstandard is not None else [])
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def segment_path(date, directory, codec):
+    return os.path.join(directory, f'messages_{date}{EXTENSIONS[codec]}')
+
+
+def index_path(segment):
+    """الفهرس الجانبي لكل مقطع ملف مستقل بجانبه"""
+    return segment + '.idx'
+
+
+def find_segment(date, directory):
+    """مسار المقطع الموجود لهذا اليوم وترميزه، أو (None, None)"""
+    for codec in EXTENSIONS:
+        path = segment_path(date, directory, codec)
+        if os.path.exists(path):
+            return path, codec
+    return None, None
+
+
+# ============== الكتابة ==============
+
+def write_segment(records, date, directory, codec='gzip', block_records=SEGMENT_BLOCK_RECORDS, sources=()):
+    """كتابة مقطع مضغوط وفهرسه الجانبي بشكل ذري؛ إرجاع عدد السجلات"""
+    if codec not in available_codecs():
+        raise ValueError(f"الترميز غير متاح: {codec}")
+
+    path = segment_path(date, directory, codec)
+    tmp = path + '.tmp'
+    blocks = []
+    total = 0
+    offset = 0
+
+    with open(tmp, 'wb') as f:
+        lines = []
+
+        def flush_block():
+            nonlocal offset
+            data = _compress(codec, ''.join(lines).encode('utf-8'))
+            blocks.append([total - len(lines), offset])
+            f.write(data)
+            offset += len(data)
+            lines.clear()
+
+        for record in records:
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+            total += 1
+            if len(lines) >= block_records:
+                flush_block()
+        if lines:
+            flush_block()
+        f.flush()
+        os.fsync(f.fileno())
+
+    index = {
+        'codec': codec,
+        'size': offset,
+        'records': total,
+        'block_records': block_records,
+        'blocks': blocks,
+        # الملفات التي دُمجت في هذا المقطع (لحذف بقاياها بأمان بعد أي انقطاع)
+        'sources': list(sources),
+    }
+    idx = index_path(path)
+    with open(idx + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(idx + '.tmp', idx)
+    # استبدال المقطع هو نقطة الالتزام
+    os.replace(tmp, path)
+    return total
+
+
+# ============== القراءة ==============
+
+def load_index(segment):
+    """فهرس المقطع، أو None إذا لم يكن موجوداً أو لا يطابق المقطع الحالي"""
+    try:
+        with open(index_path(segment), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        # أثناء استبدال المقطع قد يسبق الفهرسُ الجديد المقطعَ الجديد بلحظة
+        if index.get('size') != os.path.getsize(segment):
+            return None
+        return index
+    except (OSError, ValueError):
+        return None
+
+
+def _parse_lines(data):
+    for line in data.decode('utf-8').splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_segment(path, codec):
+    """قراءة المقطع كاملاً بالترتيب (بث متدفق، كتلة بعد كتلة)"""
+    if codec == 'zstd':
+        with open(path, 'rb') as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            for line in io.TextIOWrapper(reader, encoding='utf-8'):
+                if line.strip():
+                    yield json.loads(line)
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_segment_reverse(path, index, before=None):
+    """قراءة المقطع من الأحدث إلى الأقدم: (رقم السجل، السجل)
+
+    يقفز عبر الفهرس مباشرة إلى الكتلة التي تسبق before بدون فك ضغط ما قبلها.
+    """
+    codec = index['codec']
+    blocks = index['blocks']
+    total = index['records']
+    end = total if before is None else max(0, min(before, total))
+    if end == 0:
+        return
+
+    firsts = [first for first, _ in blocks]
+    size = os.path.getsize(path)
+    block = bisect_right(firsts, end - 1) - 1
+
+    with open(path, 'rb') as f:
+        while block >= 0:
+            first, offset = blocks[block]
+            stop = blocks[block + 1][1] if block + 1 < len(blocks) else size
+            f.seek(offset)
+            records = list(_parse_lines(_decompress(codec, f.read(stop - offset))))
+            for position in range(min(len(records), end - first) - 1, -1, -1):
+                yield first + position, records[position]
+            block -= 1
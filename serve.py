@@ -0,0 +1,32 @@
+"""نقطة تشغيل الإنتاج: gunicorn بإعدادات gunicorn.conf.py
+
+التشغيل:
+    python serve.py                  # Flask (WSGI) بعمّال gthread
+    python serve.py --asgi           # واجهة ASGI بعمّال uvicorn
+    python serve.py --print-config   # أي خيارات إضافية تُمرر إلى gunicorn كما هي
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(BASE_DIR, 'gunicorn.conf.py')
+
+
+def main():
+    args = sys.argv[1:]
+    target = 'app:app'
+    if '--asgi' in args:
+        args.remove('--asgi')
+        target = 'asgi:app'
+        os.environ.setdefault('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    from gunicorn.app.wsgiapp import run
+
+    sys.argv = ['gunicorn', '--config', CONFIG_FILE, *args, target]
+    return run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
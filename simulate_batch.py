@@ -0,0 +1,246 @@
+import os
+import json
+import codecs
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# ============== إعدادات المحاكاة الجماعية ==============
+
+# عدد الرسائل في كل دفعة تُعالج معاً (وتُرسل لعامل واحد في وضع التوزيع)
+SIMULATE_BATCH_CHUNK = int(os.getenv('SIMULATE_BATCH_CHUNK', 500))
+# أقصى عدد عمليات يمكن طلبه عبر ?workers=
+SIMULATE_BATCH_MAX_WORKERS = int(os.getenv('SIMULATE_BATCH_MAX_WORKERS', os.cpu_count() or 1))
+# أقصى حجم لعنصر واحد (رسالة أو سطر) قبل اعتبار المدخل غير صالح
+MAX_ITEM_SIZE = 64 * 1024
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+_WHITESPACE = ' \t\r\n'
+
+
+class BatchParser:
+    """تحليل تدريجي لمصفوفة JSON أو NDJSON دون تحميل الجسم كاملاً في الذاكرة
+
+    النوع يُحدد من أول حرف: '[' مصفوفة، وغير ذلك سطر JSON لكل رسالة.
+    كل عنصر نص الرسالة أو كائن {"message": ..., "id": ...}.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._mode = None
+        self._done = False
+        # خطأ يوقف التحليل؛ العناصر السابقة له تُرجع وتُعالج أولاً
+        self.error = None
+
+    def feed(self, data, final=False):
+        """إضافة جزء من الجسم؛ إرجاع العناصر المكتملة حتى الآن"""
+        self._buffer += self._decoder.decode(data, final)
+        if self._mode is None:
+            stripped = self._buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                return []
+            self._mode = 'array' if stripped[0] == '[' else 'ndjson'
+            self._buffer = stripped[1:] if self._mode == 'array' else stripped
+        if self._mode == 'array':
+            items = self._feed_array(final)
+        else:
+            items = self._feed_lines(final)
+        if not final and len(self._buffer) > MAX_ITEM_SIZE:
+            self.error = 'عنصر أكبر من الحد المسموح'
+        return items
+
+    def _feed_array(self, final):
+        items = []
+        pos = 0
+        buffer = self._buffer
+        while not self._done:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE + ',':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                self._done = True
+                pos += 1
+                break
+            try:
+                item, pos = self._json.raw_decode(buffer, pos)
+            except ValueError:
+                # عنصر غير مكتمل: ننتظر بقية الجسم
+                if final:
+                    self.error = 'مصفوفة JSON غير صالحة'
+                break
+            items.append(item)
+        self._buffer = buffer[pos:]
+        if final and not self._done and self.error is None:
+            self.error = 'مصفوفة JSON غير مكتملة'
+        if self._done and self._buffer.strip(_WHITESPACE):
+            self.error = 'بيانات بعد نهاية المصفوفة'
+        return items
+
+    def _feed_lines(self, final):
+        lines = self._buffer.split('\n')
+        self._buffer = '' if final else lines.pop()
+        items = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            # سطر غير صالح يصبح سطر خطأ في مكانه ولا يوقف بقية الدفعة
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(InvalidItem(f'سطر JSON غير صالح: {e}'))
+        return items
+
+
+class InvalidItem:
+    def __init__(self, error):
+        self.error = error
+
+
+def normalize_item(item):
+    """(المعرف، الرسالة) من عنصر المدخل"""
+    if isinstance(item, InvalidItem):
+        raise ValueError(item.error)
+    if isinstance(item, str):
+        return None, item
+    if isinstance(item, dict) and isinstance(item.get('message'), str):
+        return item.get('id'), item['message']
+    raise ValueError('كل عنصر يجب أن يكون نصاً أو كائناً فيه message')
+
+
+def resolve_chunk(resolve, messages):
+    """مطابقة دفعة رسائل (يُستدعى في العملية الحالية أو في عامل من المجمع)"""
+    return [resolve(message) for message in messages]
+
+
+class BatchRun:
+    """تجميع العناصر في دفعات وتحويل النتائج إلى أسطر NDJSON مع ملخص في النهاية"""
+
+    def __init__(self, chunk_size=SIMULATE_BATCH_CHUNK):
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.errors = 0
+        self.match_types = {'exact': 0, 'partial': 0, 'default': 0}
+        self._pending = []
+
+    def add(self, items):
+        """إضافة عناصر؛ إرجاع الدفعات التي امتلأت: (المدخلات، الرسائل الصالحة)"""
+        chunks = []
+        for item in items:
+            self._pending.append(item)
+            if len(self._pending) >= self.chunk_size:
+                chunks.append(self._take())
+        return chunks
+
+    def finish(self):
+        return [self._take()] if self._pending else []
+
+    def _take(self):
+        entries, messages = [], []
+        for item in self._pending:
+            index = self.count
+            self.count += 1
+            try:
+                item_id, message = normalize_item(item)
+                if not message.strip():
+                    raise ValueError('الرسالة مطلوبة')
+            except ValueError as e:
+                self.errors += 1
+                entries.append((index, None, None, str(e)))
+                continue
+            entries.append((index, item_id, message, None))
+            messages.append(message)
+        self._pending = []
+        return entries, messages
+
+    def format(self, entries, results):
+        """أسطر NDJSON بترتيب المدخل (العناصر غير الصالحة سطر خطأ في مكانها)"""
+        results = iter(results)
+        lines = []
+        for index, item_id, message, error in entries:
+            if error is not None:
+                lines.append(dumps_line({'index': index, 'error': error}))
+                continue
+            keyword, match_type, response = next(results)
+            self.match_types[match_type] = self.match_types.get(match_type, 0) + 1
+            result = {'index': index}
+            if item_id is not None:
+                result['id'] = item_id
+            result.update({
+                'message': message,
+                'keyword': keyword,
+                'match_type': match_type,
+                'response': response,
+            })
+            lines.append(dumps_line(result))
+        return b''.join(lines)
+
+    def summary(self, error=None):
+        summary = {'count': self.count, 'errors': self.errors, 'match_types': self.match_types}
+        if error:
+            summary['error'] = error
+        return dumps_line({'summary': summary})
+
+
+def dumps_line(obj):
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def parse_workers(value):
+    """عدد العمّال من ?workers= (0 أو 1 = في نفس العملية)"""
+    workers = int(value or 0)
+    if not 0 <= workers <= SIMULATE_BATCH_MAX_WORKERS:
+        raise ValueError(f"workers يجب أن يكون بين 0 و{SIMULATE_BATCH_MAX_WORKERS}")
+    return workers
+
+
+def create_pool(workers, initializer=None, initargs=()):
+    """مجمع عمليات للدفعات الكبيرة (fork حيث يتوفر ليرث العمّال القواعد المحملة)"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=initializer, initargs=initargs)
+    return ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+
+
+def stream_batch(chunks, resolve, workers=0, chunk_size=SIMULATE_BATCH_CHUNK):
+    """بث نتائج NDJSON لجسم يُقرأ على أجزاء (بايتات)
+
+    الذاكرة محدودة بعدد الدفعات قيد المعالجة: دفعة واحدة بدون مجمع، أو
+    ضعف عدد العمّال مع المجمع، والنتائج تخرج بنفس ترتيب المدخل.
+    """
+    parser = BatchParser()
+    run = BatchRun(chunk_size)
+    pool = create_pool(workers) if workers > 1 else None
+    in_flight = deque()
+
+    def drain(limit):
+        while len(in_flight) > limit:
+            entries, future = in_flight.popleft()
+            yield run.format(entries, future.result())
+
+    def submit(batches):
+        for entries, messages in batches:
+            if pool is None:
+                yield run.format(entries, resolve_chunk(resolve, messages))
+            else:
+                in_flight.append((entries, pool.submit(resolve_chunk, resolve, messages)))
+                yield from drain(workers * 2)
+
+    try:
+        for data in chunks:
+            yield from submit(run.add(parser.feed(data)))
+            if parser.error:
+                break
+        else:
+            yield from submit(run.add(parser.feed(b'', final=True)))
+        yield from submit(run.finish())
+        yield from drain(0)
+        # الاستجابة بدأت بالفعل، فيُبلّغ أي خطأ في سطر الملخص
+        yield run.summary(parser.error)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def pid_alive(pid):
+    """هل العملية pid ما زالت موجودة (على هذا الجهاز)"""
+    if os.name == 'nt':
+        # os.kill في ويندوز يُنهي العملية بدل فحصها: تُعد حية (لا يُحذف شيء)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # موجودة لكن بدون صلاحية إرسال إشارة إليها، أو نظام لا يدعم الإشارة 0
+        return True
+    return True
+
+
+class PidSnapshots:
+    """لقطة JSON لكل عملية في مجلد مشترك (prefix<pid>.json): تكتبها كل عملية دورياً
+    ويجمع العرض لقطات جميع العمليات. source دالة تُرجع بيانات لقطة هذه العملية."""
+
+    def __init__(self, directory, prefix, interval, source, label):
+        self.directory = directory
+        self.prefix = prefix
+        self.interval = interval
+        self.source = source
+        self.label = label
+        self._next_write = 0.0
+        self._write_lock = threading.Lock()
+
+    def path(self, pid=None):
+        return os.path.join(self.directory, f'{self.prefix}{pid or os.getpid()}.json')
+
+    def write(self):
+        """كتابة لقطة هذه العملية بشكل ذري"""
+        if not self.directory:
+            return
+        path = self.path()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.source(), f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def due(self):
+        """هل حان موعد كتابة اللقطة (فحص رخيص قبل نقل الكتابة إلى خيط)"""
+        return time.monotonic() >= self._next_write
+
+    def maybe_write(self):
+        """يُستدعى بعد كل طلب: كتابة اللقطة مرة كل interval ثانية على الأكثر"""
+        now = time.monotonic()
+        if now < self._next_write or not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_write = now + self.interval
+            self.write()
+        except OSError as e:
+            logger.error("❌ خطأ في كتابة لقطة %s: %s", self.label, e)
+        finally:
+            self._write_lock.release()
+
+    def write_final(self):
+        """عند الخروج: فقط العمليات التي خدمت طلبات (لا أدوات سطر الأوامر التي تستورد التطبيق)"""
+        if not self._next_write:
+            return
+        try:
+            self.write()
+        except OSError:
+            pass
+
+    def _pids(self):
+        """(pid، اسم الملف) لكل لقطة في المجلد"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not (name.startswith(self.prefix) and name.endswith('.json')):
+                continue
+            pid = name[len(self.prefix):-len('.json')]
+            if pid.isdigit():
+                yield int(pid), name
+
+    def others(self):
+        """لقطات العمليات الأخرى"""
+        own = os.getpid()
+        for pid, name in self._pids():
+            if pid == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                # لقطة قيد الاستبدال أو تالفة: تُتجاهل في هذا العرض فقط
+                continue
+
+    def clear(self, stale_only=False):
+        """حذف لقطات العمليات السابقة؛ stale_only: فقط لقطات العمليات المنتهية
+        (آمن عند بدء عامل بجوار عمّال أحياء، كعمّال uvicorn بدون خطاف للعملية الرئيسية)"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.startswith(self.prefix):
+                continue
+            if stale_only:
+                pid = name[len(self.prefix):].split('.', 1)[0]
+                if not pid.isdigit() or pid_alive(int(pid)):
+                    continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
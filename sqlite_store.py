@@ -0,0 +1,159 @@
+import os
+import csv
+import io
+import json
+import sqlite3
+import logging
+import threading
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات مخزن SQLite ==============
+
+# مسار قاعدة البيانات؛ عند تركه فارغاً يبقى الأرشيف بصيغة JSON Lines فقط
+ARCHIVE_SQLITE = os.getenv('ARCHIVE_SQLITE', '')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    message TEXT NOT NULL,
+    response TEXT NOT NULL,
+    keyword TEXT,
+    match_type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS idx_messages_sender_ts ON messages (sender, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_keyword_ts ON messages (keyword, ts);
+'''
+
+COLUMNS = ('id', 'ts', 'sender', 'message', 'response', 'keyword', 'match_type')
+
+
+def _day_after(value):
+    return (date.fromisoformat(value) + timedelta(days=1)).isoformat()
+
+
+def parse_cursor(before):
+    """(ts، id) من مؤشر الصفحة 'ts|id'؛ ValueError لمؤشر غير صالح"""
+    ts, sep, row_id = before.rpartition('|')
+    if not sep or not ts or not row_id.isdigit():
+        raise ValueError(f"مؤشر غير صالح: {before!r}")
+    return ts, int(row_id)
+
+
+def _time_range(date_from=None, date_to=None):
+    """تحويل حدود التاريخ إلى شروط على ts (التاريخ وحده يشمل اليوم كاملاً)"""
+    clauses, params = [], []
+    if date_from:
+        clauses.append('ts >= ?')
+        params.append(date_from)
+    if date_to:
+        if len(date_to) == 10:
+            clauses.append('ts < ?')
+            params.append(_day_after(date_to))
+        else:
+            clauses.append('ts <= ?')
+            params.append(date_to)
+    return clauses, params
+
+
+class SQLiteStore:
+    """مخزن رسائل مفهرس: اتصال لكل عملية/خيط، ووضع WAL، وإدراج على دفعات"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        """اتصال خاص بالعملية والخيط الحاليين (الاتصالات لا تُشارك عبر fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def insert_many(self, records):
+        """إدراج دفعة سجلات داخل معاملة واحدة"""
+        rows = [
+            (r.get('timestamp', ''), r.get('sender', ''), r.get('message', ''),
+             r.get('response', ''), r.get('keyword'), r.get('match_type'))
+            for r in records
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO messages (ts, sender, message, response, keyword, match_type) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def search(self, sender=None, text=None, date_from=None, date_to=None,
+               keyword=None, before=None, limit=50):
+        """بحث مرقّم بالأحدث أولاً؛ المؤشر before بصيغة 'ts|id' من الصفحة السابقة"""
+        clauses, params = _time_range(date_from, date_to)
+        if sender:
+            clauses.append('sender IN (?, ?)')
+            bare = sender[len('whatsapp:'):] if sender.startswith('whatsapp:') else sender
+            params += [bare, 'whatsapp:' + bare]
+        if keyword:
+            clauses.append('keyword = ?')
+            params.append(keyword)
+        if text:
+            clauses.append("message LIKE ? ESCAPE '\\'")
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if before:
+            ts, row_id = parse_cursor(before)
+            clauses.append('(ts < ? OR (ts = ? AND id < ?))')
+            params += [ts, ts, row_id]
+
+        where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        query = f'SELECT * FROM messages {where} ORDER BY ts DESC, id DESC LIMIT ?'
+        rows = self._connection().execute(query, params + [limit + 1]).fetchall()
+
+        results = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = results[-1]
+            next_cursor = f"{last['ts']}|{last['id']}"
+        return results, next_cursor
+
+    def export(self, date_from=None, date_to=None, fmt='ndjson', chunk_size=1000):
+        """تصدير متدفق لنطاق زمني بصيغة NDJSON أو CSV (بدون تحميل النتائج كاملة)"""
+        clauses, params = _time_range(date_from, date_to)
+        where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        # اتصال مستقل لأن المولّد قد يُستهلك بعد انتهاء الطلب
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(f'SELECT {", ".join(COLUMNS)} FROM messages {where} ORDER BY ts, id', params)
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(COLUMNS)
+                yield buffer.getvalue()
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                else:
+                    yield ''.join(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+        finally:
+            conn.close()
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM messages').fetchone()[0]
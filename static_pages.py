@@ -0,0 +1,170 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+try:
+    import brotli
+except ImportError:  # اختياري: بدونه تُقدَّم نسخ gzip فقط
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات الصفحات الثابتة ==============
+
+TEMPLATES_DIR = os.getenv('TEMPLATES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
+# مدة التخزين في المتصفح؛ بعدها يعيد التحقق بـ If-None-Match ويأخذ 304
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 300))
+# أقل فاصل بين فحصين لتعديل القالب (stat) أثناء الطلبات
+TEMPLATE_CHECK_INTERVAL = float(os.getenv('TEMPLATE_CHECK_INTERVAL', 2))
+
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+
+def json_body(payload):
+    """نفس مخرجات jsonify (مفاتيح مرتبة ومضغوطة) كبايتات جاهزة"""
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+# أجسام الأخطاء ثابتة: تُبنى مرة واحدة بدلاً من كل طلب
+NOT_FOUND_BODY = json_body({'error': 'Not found', 'message': 'الصفحة غير موجودة'})
+INTERNAL_ERROR_BODY = json_body({'error': 'Internal server error', 'message': 'حدث خطأ داخلي'})
+
+
+def parse_accept_encoding(header):
+    """{الترميز: q} من ترويسة Accept-Encoding"""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate(header, available):
+    """أفضل ترميز متاح يقبله العميل (available مرتبة حسب الأفضلية)، أو 'identity'"""
+    if not header:
+        return 'identity'
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    for encoding in available:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return 'identity'
+
+
+def etag_matches(if_none_match, etag):
+    """هل تطابق If-None-Match الوسم etag؟ (مقارنة ضعيفة كما يقتضي RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class StaticPage:
+    """قالب HTML مبني مسبقاً كبايتات مع نسخ gzip/br ووسم ETag لكل نسخة"""
+
+    def __init__(self, path, content_type=HTML_CONTENT_TYPE):
+        self.path = path
+        self.content_type = content_type
+        self.variants = {}
+        self.encodings = ()
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.build()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def build(self):
+        """قراءة القالب وضغطه؛ يُستدعى عند البدء وعند تعديل الملف"""
+        signature = self._stat()
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+
+        digest = hashlib.sha256(raw).hexdigest()[:32]
+        variants = {'identity': (raw, f'"{digest}"')}
+        # mtime=0 حتى تكون النسخة المضغوطة (ووسمها) ثابتة بين العمليات
+        compressed = [('gzip', gzip.compress(raw, 9, mtime=0))]
+        if brotli is not None:
+            compressed.insert(0, ('br', brotli.compress(raw, quality=11)))
+        for encoding, body in compressed:
+            if len(body) < len(raw):
+                variants[encoding] = (body, f'"{digest}-{encoding}"')
+
+        self.variants = variants
+        self.encodings = tuple(e for e, _ in compressed if e in variants)
+        self._signature = signature
+        self._checked = time.monotonic()
+        logger.debug("📄 تم بناء %s (%s)", self.path,
+                     ', '.join(f'{e}={len(b)}' for e, (b, _) in variants.items()))
+
+    def refresh(self):
+        """إعادة البناء إذا تغير القالب على القرص (فحص stat كل TEMPLATE_CHECK_INTERVAL على الأكثر)"""
+        now = time.monotonic()
+        if now - self._checked < TEMPLATE_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked < TEMPLATE_CHECK_INTERVAL:
+                return
+            self._checked = now
+            try:
+                if self._stat() != self._signature:
+                    self.build()
+                    logger.info("🔄 تم تحديث القالب: %s", self.path)
+            except OSError as e:
+                # نستمر بالنسخة المبنية سابقاً
+                logger.error("❌ خطأ في قراءة القالب %s: %s", self.path, e)
+
+    def serve(self, accept_encoding='', if_none_match=''):
+        """(الحالة، الترويسات، الجسم) مع التفاوض على الترميز و304"""
+        self.refresh()
+        encoding = negotiate(accept_encoding, self.encodings)
+        body, etag = self.variants[encoding]
+        headers = [
+            ('ETag', etag),
+            ('Cache-Control', f'public, max-age={STATIC_MAX_AGE}'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        # وسم النسخة المختارة فقط: نسخة مخزنة بترميز آخر لا تصلح لهذا الطلب
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b''
+        headers.append(('Content-Type', self.content_type))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, body
+
+
+class StaticPages:
+    """صفحات الواجهة حسب الاسم، مبنية عند الاستيراد"""
+
+    def __init__(self, templates_dir=TEMPLATES_DIR, names=('home', 'send_test')):
+        self.pages = {name: StaticPage(os.path.join(templates_dir, f'{name}.html')) for name in names}
+
+    def serve(self, name, accept_encoding='', if_none_match=''):
+        return self.pages[name].serve(accept_encoding, if_none_match)
+
+
+pages = StaticPages()
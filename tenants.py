@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from allowlist import Allowlist, canonicalize
+from message_archive import ARCHIVE_DIR
+from rules import RuleRegistry
+from twiml import TwimlCache
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات المستأجرين ==============
+
+# ملف المستأجرين (رقم مرسل لكل علامة تجارية)؛ بدونه يعمل التطبيق برقم واحد كالسابق
+TENANTS_FILE = os.getenv('TENANTS_FILE', '')
+# تفريغ جداول المستأجر من الذاكرة بعد هذه المدة بدون رسائل (0 = أبداً)
+TENANT_IDLE_SECONDS = float(os.getenv('TENANT_IDLE_SECONDS', 3600))
+TENANT_SWEEP_INTERVAL = float(os.getenv('TENANT_SWEEP_INTERVAL', 60))
+# بعد فشل تحميل ملفات المستأجر لا يُعاد التحميل قبل هذه المدة (الرسائل تأخذ رد الخطأ)
+TENANT_RETRY_SECONDS = float(os.getenv('TENANT_RETRY_SECONDS', 60))
+
+
+class TenantUnavailable(RuntimeError):
+    """تعذر تحميل قواعد المستأجر أو قائمته المسموحة"""
+
+
+class TenantTables:
+    """جداول المستأجر المحمّلة معاً: لقطة ثابتة يستخدمها الطلب كاملاً، فتفريغ المستأجر
+    أثناء الطلب لا يجعل القائمة المسموحة أو القواعد None (فيرجع إلى القائمة العامة)"""
+
+    __slots__ = ('rules', 'allowlist', 'twiml')
+
+    def __init__(self, rules, allowlist, twiml):
+        self.rules = rules
+        # القائمة المسموحة الخاصة بالمستأجر، أو None لاستخدام القائمة العامة
+        self.allowlist = allowlist
+        self.twiml = twiml
+
+
+class Tenant:
+    """رقم مرسل واحد بقواعده وقائمته المسموحة ومجلد أرشيفه؛ الجداول تُبنى عند أول رسالة
+
+    مثال في TENANTS_FILE:
+        {"tenants": [{"name": "brand-a", "number": "+14155238886",
+                      "rules": "brand-a/responses.json", "allowlist": "brand-a/allowlist.txt",
+                      "allowlist_enforce": true, "archive_dir": "message_logs/tenants/brand-a"}]}
+    المسارات النسبية تُحسب من مجلد ملف المستأجرين.
+    """
+
+    def __init__(self, name, number, rules, allowlist=None, allowlist_enforce=False, archive_dir=None):
+        self.name = name
+        self.number = canonicalize(number, country_code='')
+        self.rules_path = rules
+        self.allowlist_path = allowlist
+        self.allowlist_enforce = allowlist_enforce
+        self.archive_dir = archive_dir or os.path.join(ARCHIVE_DIR, 'tenants', name)
+        self.last_used = 0.0
+        self.error = None
+        self._retry_at = 0.0
+        self._tables = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._tables is not None
+
+    def load(self):
+        """بناء المطابق والردود الجاهزة والقائمة المسموحة (مرة واحدة حتى التفريغ)؛ إرجاع TenantTables
+
+        يرفع TenantUnavailable إذا فشل التحميل؛ الفشل يُسجل مرة واحدة ولا يُعاد
+        قراءة الملفات قبل TENANT_RETRY_SECONDS.
+        """
+        tables = self._tables
+        if tables is not None:
+            return tables
+        with self._lock:
+            if self._tables is not None:
+                return self._tables
+            if self.error is not None and time.monotonic() < self._retry_at:
+                raise TenantUnavailable(self.error)
+            started = time.perf_counter()
+            try:
+                rules = RuleRegistry(self.rules_path)
+                twiml = TwimlCache()
+                twiml.rebuild(rules.current.static_replies())
+                rules.on_reload(lambda snapshot: twiml.rebuild(snapshot.static_replies()))
+                allowlist = None
+                if self.allowlist_path:
+                    allowlist = Allowlist(path=self.allowlist_path, enforce=self.allowlist_enforce)
+            except Exception as e:
+                self.error = f'{type(e).__name__}: {e}'
+                self._retry_at = time.monotonic() + TENANT_RETRY_SECONDS
+                logger.error("❌ تعذر تحميل المستأجر %s: %s (إعادة المحاولة بعد %ss)",
+                             self.name, self.error, TENANT_RETRY_SECONDS)
+                raise TenantUnavailable(self.error) from e
+            self.error = None
+            # إسناد واحد: الجداول الثلاثة تظهر وتختفي معاً
+            self._tables = TenantTables(rules, allowlist, twiml)
+            logger.info("🏷️ تم تحميل المستأجر %s (%s قاعدة) خلال %.1fms", self.name,
+                        len(rules.current.replies), (time.perf_counter() - started) * 1000)
+            return self._tables
+
+    def unload(self):
+        # الطلبات الجارية تحتفظ بلقطتها من load() حتى تنتهي
+        with self._lock:
+            self._tables = None
+
+    @property
+    def rules(self):
+        return self.load().rules
+
+    @property
+    def allowlist(self):
+        """القائمة المسموحة الخاصة بالمستأجر، أو None لاستخدام القائمة العامة"""
+        return self.load().allowlist
+
+    @property
+    def twiml(self):
+        return self.load().twiml
+
+
+class TenantRouter:
+    """توجيه الرسالة إلى المستأجر حسب رقم To ببحث واحد في قاموس"""
+
+    def __init__(self, tenants, idle_seconds=TENANT_IDLE_SECONDS, sweep_interval=TENANT_SWEEP_INTERVAL):
+        self.tenants = {}
+        # Twilio يرسل To بصيغة whatsapp:+رقم دائماً، فتُحسب المفاتيح الخام مسبقاً
+        self._by_raw = {}
+        for tenant in tenants:
+            if not tenant.number or tenant.number in self.tenants:
+                raise ValueError(f"رقم مستأجر غير صالح أو مكرر: {tenant.name}")
+            self.tenants[tenant.number] = tenant
+            self._by_raw[tenant.number] = tenant
+            self._by_raw['whatsapp:' + tenant.number] = tenant
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self.routed = 0
+        self.unmatched = 0
+        self.unloads = 0
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+
+        def resolve(value):
+            return os.path.join(base, value) if value and not os.path.isabs(value) else value
+
+        tenants = []
+        for entry in data['tenants']:
+            entry = dict(entry)
+            for key in ('rules', 'allowlist', 'archive_dir'):
+                entry[key] = resolve(entry.get(key))
+            tenants.append(Tenant(**entry))
+        return cls(tenants)
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def route(self, to):
+        """المستأجر صاحب الرقم، أو None (الرسالة تُعالج بالقواعد العامة)"""
+        tenant = self._by_raw.get(to)
+        if tenant is None:
+            tenant = self.tenants.get(canonicalize(to, country_code='')) if to else None
+            if tenant is None:
+                self.unmatched += 1
+                return None
+        self.routed += 1
+        now = time.monotonic()
+        tenant.last_used = now
+        if self.idle_seconds and now >= self._next_sweep:
+            self._sweep(now)
+        return tenant
+
+    def _sweep(self, now):
+        """تفريغ المستأجرين الخاملين (طلب واحد فقط يقوم بالفحص)"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.sweep_interval
+            for tenant in self.tenants.values():
+                if tenant.loaded and now - tenant.last_used > self.idle_seconds:
+                    tenant.unload()
+                    self.unloads += 1
+                    logger.info("💤 تم تفريغ المستأجر الخامل %s", tenant.name)
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self):
+        return {
+            'tenants': len(self.tenants),
+            'loaded': sum(1 for tenant in self.tenants.values() if tenant.loaded),
+            'failed': sorted(tenant.name for tenant in self.tenants.values() if tenant.error is not None),
+            'routed': self.routed,
+            'unmatched': self.unmatched,
+            'unloads': self.unloads,
+        }
+
+
+def create_tenant_router(path=TENANTS_FILE):
+    """الموجه من TENANTS_FILE، أو None بدون ملف"""
+    if not path:
+        return None
+    router = TenantRouter.from_file(path)
+    logger.info("🏷️ %s مستأجر من %s (تحميل عند أول رسالة)", len(router), path)
+    return router
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import base64
+import queue
+import random
+import select
+import logging
+import importlib
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+logger = logging.getLogger(__name__)
+
+# ============== إعدادات Twilio REST ==============
+
+TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
+TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
+# يمكن توجيهه إلى خادم محلي بديل للاختبار (benchmarks/twilio_stub.py)
+TWILIO_API_BASE = os.getenv('TWILIO_API_BASE', 'https://api.twilio.com')
+# رقم البوت المرسل (whatsapp:+...)؛ بدونه يُستخدم رقم To من الرسالة الواردة
+TWILIO_WHATSAPP_FROM = os.getenv('TWILIO_WHATSAPP_FROM', '')
+TWILIO_POOL_SIZE = int(os.getenv('TWILIO_POOL_SIZE', 8))
+TWILIO_TIMEOUT = float(os.getenv('TWILIO_TIMEOUT', 10))
+TWILIO_RETRIES = int(os.getenv('TWILIO_RETRIES', 3))
+TWILIO_BACKOFF = float(os.getenv('TWILIO_BACKOFF', 0.5))
+# ناقل بديل بصيغة module:callable يُرجع كائناً فيه send(to, from_, body)
+REPLY_TRANSPORT = os.getenv('REPLY_TRANSPORT', '')
+
+# حالات تستحق إعادة المحاولة: تجاوز المعدل وأخطاء الخادم (رد صريح من الخادم)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TransportError(Exception):
+    """فشل الإرسال؛ retryable يحدد إن كانت إعادة المحاولة مفيدة وآمنة، وuncertain أن الطلب
+    أُرسل كاملاً ثم انقطع الاتصال قبل الرد: ربما وصلت الرسالة، فإعادتها قد تكررها"""
+
+    def __init__(self, message, retryable=True, uncertain=False):
+        super().__init__(message)
+        self.retryable = retryable and not uncertain
+        self.uncertain = uncertain
+
+
+class ConnectionPool:
+    """اتصالات HTTP(S) دائمة (keep-alive) لمضيف واحد، يُعاد استخدامها بين الخيوط"""
+
+    def __init__(self, base_url, size=TWILIO_POOL_SIZE, timeout=TWILIO_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        """(اتصال، مُعاد استخدامه)؛ الاتصالات الخاملة التي أغلقها الخادم تُستبعد قبل الإرسال"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+            if not _dropped(conn):
+                return conn, True
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """(الحالة، البايتات)؛ TransportError إذا فشل الإرسال (قابل للإعادة) أو انقطع الاتصال
+        بعد إرسال الطلب كاملاً (uncertain: لا يُعاد حتى لا تتكرر الرسالة)"""
+        conn, reused = self._acquire()
+        try:
+            conn.request(method, path, body, headers or {})
+        except (http.client.HTTPException, OSError) as e:
+            # لم يكتمل إرسال الطلب: الخادم لم يعالجه، فإعادة فتح الاتصال مرة واحدة آمنة
+            conn.close()
+            if not reused:
+                raise TransportError(f'connection error: {e}') from e
+            conn = self._connect()
+            try:
+                conn.request(method, path, body, headers or {})
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                raise TransportError(f'connection error: {e}') from e
+
+        try:
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise TransportError(f'no response after request was sent: {e}', uncertain=True) from e
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _dropped(conn):
+    """اتصال خامل قابل للقراءة بدون طلب = أغلقه الخادم (أو أرسل ما لا يُنتظر)"""
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class TwilioRestTransport:
+    """إرسال الرسائل عبر Twilio Messages API فوق مجمع اتصالات دائمة"""
+
+    def __init__(self, account_sid=TWILIO_ACCOUNT_SID, auth_token=TWILIO_AUTH_TOKEN,
+                 base_url=TWILIO_API_BASE, pool_size=TWILIO_POOL_SIZE, timeout=TWILIO_TIMEOUT):
+        self.account_sid = account_sid
+        self.path = f'/2010-04-01/Accounts/{account_sid}/Messages.json'
+        credentials = base64.b64encode(f'{account_sid}:{auth_token}'.encode('utf-8')).decode('ascii')
+        self.headers = {
+            'Authorization': f'Basic {credentials}',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Accept': 'application/json',
+        }
+        self.pool = ConnectionPool(base_url, pool_size, timeout)
+
+    def send(self, to, from_, body):
+        """إرسال رسالة واحدة؛ إرجاع MessageSid أو رفع TransportError"""
+        # بايتات لا نص: http.client يدمجها مع الترويسة في send واحد فيتجنب تأخير Nagle/delayed-ACK
+        form = urlencode({'To': to, 'From': from_, 'Body': body}).encode('ascii')
+        status, data = self.pool.request('POST', self.path, form, self.headers)
+        if status >= 400:
+            raise TransportError(f'HTTP {status}: {data[:200]!r}', retryable=status in RETRYABLE_STATUS)
+        try:
+            return json.loads(data).get('sid')
+        except ValueError:
+            return None
+
+    def close(self):
+        self.pool.close()
+
+
+def send_with_retry(transport, to, from_, body, retries=TWILIO_RETRIES, backoff=TWILIO_BACKOFF):
+    """الإرسال مع إعادة المحاولة بتأخير أُسّي وعشوائية؛ (sid، عدد المحاولات الإضافية)
+
+    تُعاد فقط الأخطاء الآمنة: فشل قبل إرسال الطلب، أو رد صريح 429/5xx. الأخطاء uncertain
+    تُرفع فوراً ليسجلها المستدعي كـ "غير مؤكدة" بدل إرسال مكرر."""
+    for attempt in range(retries + 1):
+        try:
+            return transport.send(to, from_, body), attempt
+        except TransportError as e:
+            if not e.retryable or attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning("🔁 فشل الإرسال إلى %s (%s)، إعادة المحاولة بعد %.2fs", to, e, delay)
+            time.sleep(delay)
+
+
+def create_transport(spec=REPLY_TRANSPORT):
+    """الناقل المحدد في REPLY_TRANSPORT، أو Twilio REST افتراضياً"""
+    if spec:
+        module_name, _, attr = spec.partition(':')
+        return getattr(importlib.import_module(module_name), attr or 'create_transport')()
+    return TwilioRestTransport()
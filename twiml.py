@@ -0,0 +1,72 @@
+# ============== توليد TwiML ==============
+
+TWIML_CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+# نفس المخرجات التي ينتجها MessagingResponse().message(text) ثم str()
+_PREFIX = b'<?xml version="1.0" encoding="UTF-8"?><Response><Message>'
+_SUFFIX = b'</Message></Response>'
+_EMPTY = b'<?xml version="1.0" encoding="UTF-8"?><Response><Message /></Response>'
+# رد بدون رسائل (str(MessagingResponse())): استلام فقط، والرد يُرسل لاحقاً عبر REST
+EMPTY_RESPONSE = b'<?xml version="1.0" encoding="UTF-8"?><Response />'
+
+
+def escape_text(text):
+    """تهريب نص عنصر XML كما يفعل ElementTree (& و < و > فقط)"""
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def render_message(text):
+    """تحويل نص الرد إلى بايتات TwiML (المسار السريع للردود الديناميكية)"""
+    if not text:
+        return _EMPTY
+    return _PREFIX + escape_text(text).encode('utf-8') + _SUFFIX
+
+
+class TwimlCache:
+    """ذاكرة بايتات TwiML الجاهزة للردود الثابتة"""
+
+    def __init__(self):
+        self._rendered = {}
+
+    def rebuild(self, texts):
+        """إعادة توليد جميع الردود الثابتة ثم استبدال الذاكرة بإسناد واحد"""
+        self._rendered = {text: render_message(text) for text in texts}
+
+    def render(self, text):
+        body = self._rendered.get(text)
+        if body is None:
+            body = render_message(text)
+        return body
+
+    def __len__(self):
+        return len(self._rendered)
+
+    def __iter__(self):
+        return iter(self._rendered)
+
+
+twiml_cache = TwimlCache()
+
+
+# ============== التحقق ==============
+
+def verify(texts, cache=twiml_cache):
+    """مقارنة المخرجات بايتاً ببايت مع MessagingResponse؛ إرجاع قائمة النصوص المختلفة
+
+    الفحص الكامل (نصوص عادية وخاصة بـ XML وعربية وردود التطبيق): benchmarks/check_twiml_identity.py"""
+    from twilio.twiml.messaging_response import MessagingResponse
+
+    mismatches = []
+    for text in texts:
+        resp = MessagingResponse()
+        resp.message(text)
+        if str(resp).encode('utf-8') != cache.render(text):
+            mismatches.append(text)
+    return mismatches
+